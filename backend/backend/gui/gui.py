@@ -16,6 +16,7 @@ from backend.gui.tabs import (
     top_100_longest_rides_tab,
     top_100_longest_runs_tab,
 )
+from backend.tabs.engine import TabProcessingEngine
 from backend.tabs.tab_group import TabGroup
 from backend.tabs.tabs import Tab
 
@@ -78,3 +79,11 @@ def get_all_tabs() -> list[Tab]:
         return flattened_tabs
 
     return flatten(tab_tree)
+
+
+def get_tab_processing_engine() -> TabProcessingEngine:
+    """
+    Return an engine which does the backend processing for every tab in the
+    tab tree with a single pass over the activities.
+    """
+    return TabProcessingEngine(get_all_tabs())
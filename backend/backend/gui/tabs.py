@@ -80,19 +80,24 @@ average_hr_by_average_speed_tab = PlotTab(
     name="Average HR by Average Speed",
     description="This plot shows your average heartrate by your average speed for all running activities. It needs activities with an average heartrate to work, so if you don't record your heartrate with your activities, then this plot will be blank.",
     plot_function=average_heartrate_by_average_speed.plot,
+    window_function=average_heartrate_by_average_speed.plot_window,
     detailed=False,
 )
 
 pace_timeline_tab = PlotTab(
     name="Pace Timeline",
-    description="This plot shows the pace of your runs on a timeline. Overlaid, there is a 30 day moving average line. At any point on this line, the value is the average pace of all runs 15 days in front and behind it.",
+    description="This plot shows the pace of your runs on a timeline. Overlaid, there is a 30 day moving average line. At any point on this line, the value is the average pace of all runs 15 days in front and behind it. 7 and 90 day moving averages can be turned on from the legend.",
     plot_function=pace_timeline.plot,
+    window_function=pace_timeline.plot_window,
     detailed=False,
 )
 
 histogram_of_activity_times_tab = PlotTab(
     name="Histogram of Activity Times",
-    description="This is a histogram of all your activity start times.",
+    description=(
+        "This is a histogram of all your activity start times. Hover over a bar "
+        "to see which days of the week they started on."
+    ),
     plot_function=histogram_of_activity_time.plot,
     detailed=False,
 )
@@ -5,9 +5,8 @@ import os
 import logging
 import json
 from typing import Any
-from stravalib.model import SummaryActivity
 from stravalib.util.limiter import RateLimiter
-from fastapi import Request, Depends
+from fastapi import BackgroundTasks, Request, Depends
 from fastapi.responses import RedirectResponse
 from stravalib.client import Client
 from stravalib.exc import RateLimitExceeded
@@ -15,9 +14,11 @@ from stravalib.model import DetailedAthlete
 from backend.utils.environment_variables import evm
 from backend.utils.s3 import (
     is_there_any_data_for_athlete,
-    get_age_of_data_for_athlete,
-    delete_athlete_data,
-    save_summary_activities_to_s3,
+    is_there_any_tab_data_for_athlete,
+    save_summary_activity_pages_to_s3,
+    append_summary_activity_pages_to_s3,
+    get_activity_columns_from_s3,
+    put_dataset_version,
 )
 from typing import Type
 import secrets
@@ -33,10 +34,14 @@ import httpx
 from requests.exceptions import HTTPError
 from backend.communication_schema import DataStatusMessage
 import dataclasses
-from backend.gui.gui import get_all_tabs, tab_tree
+from backend.gui.gui import get_all_tabs, get_tab_processing_engine, tab_tree
+from backend.tabs.result_cache import tab_result_cache
 from backend.tabs.tab_group import TabGroup
 from backend.tabs.tabs import Tab
+from backend.utils.compression import CompressionMiddleware
 from backend.utils.routes import unauthorized_if_no_session_token
+from backend.utils.strava import iter_summary_activity_pages
+from backend.statistics.utils.activity_frame import ActivityFrame
 import datetime as dt
 
 # Check if the app is running in development mode
@@ -51,6 +56,15 @@ is_dev = os.getenv("ENVIRONMENT", "production") == "development"
 
 logger = logging.getLogger(__name__)
 
+# Strava filters activities by their start time, but activities often get
+# uploaded a while after they start (think of a watch that syncs the next day).
+# Re-fetch this far before the last sync to catch those, since any duplicates
+# are dropped when the data is read.
+INCREMENTAL_SYNC_OVERLAP = dt.timedelta(days=3)
+
+# Returning athletes get anything new from Strava once their data is this old.
+MAX_DATA_AGE = dt.timedelta(days=7)
+
 app = FastAPI(debug=True)
 handler = Mangum(app)
 
@@ -77,6 +91,11 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# The chart and table JSON is big and repetitive, so compress it.
+app.add_middleware(
+    CompressionMiddleware, paths=["/api/data/", "/api/example_chart_data"]
+)
+
 
 @app.get("/api/example_chart_data")
 def chart_data(request: Request) -> Any:
@@ -151,29 +170,34 @@ def authenticate(request: Request) -> Any:
 
 
 @app.get("/api/data_status", dependencies=[Depends(unauthorized_if_no_session_token)])
-async def get_data_status(request: Request) -> Any:
+async def get_data_status(request: Request, background_tasks: BackgroundTasks) -> Any:
     session_token = request.cookies.get("session_token")
     athlete_id = get_athlete_id_from_session_token(session_token)
 
     # Check if there is data at all.
     if is_there_any_data_for_athlete(athlete_id):
-        # Check how old the data is.
-        data_age = get_age_of_data_for_athlete(athlete_id)
-
-        # If it's over a week old, delete and re-download.
-        if data_age > dt.timedelta(days=7):
-            # Delete the data
-            delete_athlete_data(athlete_id)
-
-            # Trigger re-download
-            print("Help me 2")
-            # Return message to say to continue polling.
-            return DataStatusMessage(message="Downloading data", stop_polling=False)
+        # Check how old the data is. This is when we last asked Strava for
+        # activities, rather than when any were last saved, since a sync which
+        # finds nothing new doesn't save anything. It's a naive local time, so
+        # it's compared with a naive local now.
+        last_download_time = get_last_downloaded_time_from_dynamo(athlete_id)
+
+        # If it's over a week old, fetch anything new. We don't delete the old data
+        # because the download only asks Strava for activities since the last sync,
+        # so the user can keep looking at their existing data in the meantime.
+        if (
+            last_download_time is None
+            or dt.datetime.now() - last_download_time > MAX_DATA_AGE
+        ):
+            # Record the download before starting it, so the polls while it's
+            # running don't start it again. The download is still given the
+            # old time, so it asks Strava for everything since then.
+            save_download_status_to_dynamo(athlete_id, dt.datetime.now(dt.timezone.utc))
+            background_tasks.add_task(
+                download_and_save_summary_statistics, athlete_id, last_download_time
+            )
 
-        # If it's more recent that a week, well, the data is downloaded, so just return
-        # that we already have the data. :)
-        else:
-            return DataStatusMessage(message="Data Downloaded", stop_polling=True)
+        return DataStatusMessage(message="Data Downloaded", stop_polling=True)
     else:
         # We have no data, lets see if another lambda is currently downloading data,
         # because this can take a few seconds.
@@ -198,7 +222,7 @@ async def trigger_user_data_download(cookies):
     async with httpx.AsyncClient() as client:
         try:
             # Replace with the full URL when deployed (e.g., API Gateway URL)
-            response = await client.post(
+            response = await client.get(
                 f"{get_backend_base_url()}/api/download_data", cookies=cookies
             )
             print(f"Triggered data download task: {response.status_code}")
@@ -216,20 +240,73 @@ def download_data(request: Request) -> Any:
     session_token = request.cookies.get("session_token")
     athlete_id = get_athlete_id_from_session_token(session_token)
     download_and_save_summary_statistics(
-        athlete_id,
+        athlete_id, get_last_downloaded_time_from_dynamo(athlete_id)
     )
 
 
-def download_and_save_summary_statistics(athlete_id: int) -> None:
+def download_and_save_summary_statistics(
+    athlete_id: int, last_download_time: dt.datetime | None
+) -> None:
+    """
+    Gets the athlete's activities from Strava and regenerates their tabs.
+    `last_download_time` is when we last asked Strava for activities, so only
+    what's new since then is downloaded. If it's None, everything is.
+    """
     logger.info(f"Getting Summary Statistics for {athlete_id}")
 
     client = get_client_for_athlete(athlete_id)
 
-    summary_activities: list[SummaryActivity] = get_summary_activities(
-        client, athlete_id
-    )
+    # Record the time before we start downloading, so that anything uploaded
+    # during the download is picked up by the next sync.
+    download_time = dt.datetime.now(dt.timezone.utc)
+
+    # Activities are written to s3 page by page as they arrive from Strava,
+    # so we never hold an athlete's whole history in memory at once.
+    if last_download_time is not None and is_there_any_data_for_athlete(athlete_id):
+        # We already have this athlete's history, so only ask Strava for what's
+        # new and add it to what we have.
+        pages = iter_summary_activity_pages(
+            client,
+            after=last_download_time.astimezone(dt.timezone.utc)
+            - INCREMENTAL_SYNC_OVERLAP,
+        )
+        num_activities = append_summary_activity_pages_to_s3(athlete_id, pages)
+        # Nothing new since the last sync, so the tabs we already have are
+        # still right. Regenerating them would only bump the dataset version,
+        # and throw away every cached tab for no reason.
+        are_tabs_up_to_date = num_activities == 0 and is_there_any_tab_data_for_athlete(
+            athlete_id
+        )
+    else:
+        pages = iter_summary_activity_pages(client)
+        num_activities = save_summary_activity_pages_to_s3(athlete_id, pages)
+        # A full download replaces whatever we had, so always regenerate.
+        are_tabs_up_to_date = False
+
+    logger.info(f"Received {num_activities} activities for athlete: {athlete_id}")
+
+    save_download_status_to_dynamo(athlete_id, download_time)
+
+    if are_tabs_up_to_date:
+        return
 
-    save_summary_activities_to_s3(athlete_id, summary_activities)
+    precompute_tab_data(athlete_id)
+
+
+def precompute_tab_data(athlete_id: int) -> None:
+    """
+    Does the backend processing for every tab over the athlete's activities, so
+    that each tab's data is saved in S3 and viewing a tab is just reading it.
+    One tab failing doesn't stop the others from being generated.
+    """
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(athlete_id))
+    get_tab_processing_engine().run(activities, evm, athlete_id)
+
+    # Saving the activities already gave the data a new version, but a tab
+    # could have been viewed while this was running, and cached what it had
+    # saved from the old data. Bump the version again so that's never served.
+    put_dataset_version(athlete_id)
+    tab_result_cache.invalidate(athlete_id)
 
 
 def get_client_for_athlete(
@@ -246,19 +323,6 @@ def get_client_for_athlete(
     return client
 
 
-def get_summary_activities(client: Client, athlete_id: int) -> list[SummaryActivity]:
-    """
-    Gets all the summary activities and adds some logging around it.
-    """
-    logger.info(f"Getting summary activities for athlete: {athlete_id}")
-    summary_activities: list[SummaryActivity] = list(client.get_activities())
-
-    logger.info(
-        f"Received {len(summary_activities)} activities for athlete: {athlete_id}"
-    )
-    return summary_activities
-
-
 @dataclasses.dataclass
 class SideMenuTabs:
     name: str
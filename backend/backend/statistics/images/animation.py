@@ -0,0 +1,126 @@
+"""
+The canvas the polyline images are drawn on, and saving the animations.
+
+The images are only ever black lines on white, so rather than RGB they're drawn
+on a palette image with just those two colours. That's a third of the memory
+for every frame, and there's nothing to quantise when saving a GIF, which used
+to be most of the time spent saving.
+
+Lines are only ever added, so each frame of an animation is the frame before
+plus a few new pixels. GIFs and APNGs are saved with every frame after the
+first only holding the pixels that changed, and everything else transparent, so
+the unchanged parts compress down to almost nothing. Pillow also crops each of
+those frames to the box around the changes. libwebp works out the changes
+between frames itself, so WebPs are just given the full frames.
+
+GIF is the default since, for two colour images like these, it came out the
+smallest and the quickest to save (see `benchmarks/animation_formats.py`), and
+everything can show it.
+"""
+
+import os
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+WHITE = 0
+BLACK = 1
+# Never drawn, only used for the pixels of a frame that haven't changed.
+TRANSPARENT = 2
+PALETTE = [255, 255, 255, 0, 0, 0, 255, 255, 255]
+
+GIF = "gif"
+APNG = "apng"
+WEBP = "webp"
+FORMATS = (GIF, APNG, WEBP)
+DEFAULT_FORMAT = GIF
+
+FILE_EXTENSIONS = {GIF: "gif", APNG: "png", WEBP: "webp"}
+
+
+def new_canvas(image_size: int) -> Image.Image:
+    """
+    A white square to draw on, in `BLACK`.
+    """
+    image = Image.new("P", (image_size, image_size), WHITE)
+    image.putpalette(PALETTE)
+    return image
+
+
+def save_animation(
+    frames: list[Image.Image],
+    path: str,
+    name: str,
+    frame_duration_ms: float,
+    animation_format: str = DEFAULT_FORMAT,
+) -> str:
+    """
+    Saves frames drawn on `new_canvas` into `path` as a looping animation,
+    returning its file name, which is `name` with the extension of the format.
+    """
+    if animation_format not in FORMATS:
+        raise ValueError(
+            f"Can't save an animation as unknown format: {animation_format}"
+        )
+
+    file_name = f"{name}.{FILE_EXTENSIONS[animation_format]}"
+    path = os.path.join(path, file_name)
+
+    if animation_format == GIF:
+        frames[0].save(
+            path,
+            "GIF",
+            save_all=True,
+            append_images=get_difference_frames(frames),
+            duration=frame_duration_ms,
+            loop=0,
+            transparency=TRANSPARENT,
+            # Draw each frame on top of the last.
+            disposal=1,
+            # The difference frames are already as small as they can get, and
+            # Pillow trying to make them smaller takes most of the time.
+            optimize=False,
+        )
+    elif animation_format == APNG:
+        frames[0].save(
+            path,
+            "PNG",
+            save_all=True,
+            append_images=get_difference_frames(frames),
+            duration=frame_duration_ms,
+            loop=0,
+            transparency=TRANSPARENT,
+            disposal=PngImagePlugin.Disposal.OP_NONE,
+            blend=PngImagePlugin.Blend.OP_OVER,
+        )
+    else:
+        frames[0].save(
+            path,
+            "WEBP",
+            save_all=True,
+            append_images=frames[1:],
+            duration=frame_duration_ms,
+            loop=0,
+            lossless=True,
+        )
+
+    return file_name
+
+
+def get_difference_frames(frames: list[Image.Image]) -> list[Image.Image]:
+    """
+    Returns every frame after the first, with only the pixels that changed
+    since the frame before, and the rest `TRANSPARENT`. This is a list rather
+    than a generator, since Pillow goes through the frames more than once when
+    saving an APNG.
+    """
+    pixels = [np.asarray(frame) for frame in frames]
+
+    difference_frames = []
+    for previous, current in zip(pixels, pixels[1:]):
+        difference = Image.fromarray(
+            np.where(current != previous, current, TRANSPARENT).astype(np.uint8), "P"
+        )
+        difference.putpalette(PALETTE)
+        difference_frames.append(difference)
+    return difference_frames
@@ -0,0 +1,232 @@
+"""
+Decodes and transforms lots of polylines at once with numpy, for the images.
+
+Every polyline is decoded into one flat array of points, with an array of
+offsets saying where each polyline starts and ends, so projecting, scaling and
+moving them is a handful of array operations over every point of every
+activity, rather than a Python loop over each point.
+
+Decoding is vectorised too. An encoded polyline is just a run of 5 bit chunks
+(one per character), where any chunk without its 0x20 bit set is the last chunk
+of a number, so all the characters of all the polylines can be turned into
+numbers at once, and the points are the running totals of those numbers.
+"""
+
+import dataclasses
+from typing import Iterable, Optional
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+@dataclasses.dataclass
+class Polylines:
+    """
+    Many polylines stored in one array. The points of polyline i are
+    `points[offsets[i] : offsets[i + 1]]`.
+    """
+
+    # (number of points, 2) floats. Straight after decoding these are (lat,
+    # long) pairs, and after projecting they're (x, y).
+    points: np.ndarray
+    # (number of polylines + 1) ints, starting at 0 and ending at the number
+    # of points.
+    offsets: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.points[self.offsets[i] : self.offsets[i + 1]]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def with_points(self, points: np.ndarray) -> "Polylines":
+        return Polylines(points=points, offsets=self.offsets)
+
+    def repeat(self, values: np.ndarray) -> np.ndarray:
+        """
+        Repeats a value for each polyline once for each of its points.
+        """
+        return np.repeat(values, self.lengths, axis=0)
+
+    def reduce(self, ufunc: np.ufunc, values: np.ndarray) -> np.ndarray:
+        """
+        Reduces `values` (one per point) to one value per polyline, like
+        `np.minimum` for the smallest value in each polyline. Every polyline
+        has to have at least one point.
+        """
+        return ufunc.reduceat(values, self.offsets[:-1], axis=0)
+
+    def take(self, mask: np.ndarray) -> "Polylines":
+        """
+        Returns only the polylines where `mask` is True.
+        """
+        lengths = self.lengths[mask]
+        return Polylines(
+            points=self.points[self.repeat(mask)],
+            offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        )
+
+
+def decode_polylines(
+    encoded_polylines: Iterable[Optional[str]], precision: int = 5
+) -> Polylines:
+    """
+    Decodes many polylines at once into (lat, long) points, giving exactly the
+    same floats as the `polyline` package. None and empty polylines have no
+    points.
+    """
+    encoded = [
+        (encoded_polyline or "").encode("ascii")
+        for encoded_polyline in encoded_polylines
+    ]
+    chunks = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.int64) - 63
+    byte_offsets = np.concatenate(
+        [[0], np.cumsum([len(e) for e in encoded], dtype=np.int64)]
+    )
+
+    # Every number ends on the first chunk without the continuation bit.
+    is_last_chunk = chunks < 0x20
+    last_bytes = byte_offsets[1:][np.diff(byte_offsets) > 0] - 1
+    if not is_last_chunk[last_bytes].all():
+        raise ValueError(
+            "Can't decode a polyline which ends part way through a number."
+        )
+
+    number_starts = np.flatnonzero(np.concatenate([[True], is_last_chunk[:-1]]))
+    number_of_chunk = np.cumsum(is_last_chunk) - is_last_chunk
+    shifts = 5 * (np.arange(len(chunks)) - number_starts[number_of_chunk])
+
+    numbers = np.zeros(0, dtype=np.int64)
+    if len(chunks):
+        numbers = np.bitwise_or.reduceat((chunks & 0x1F) << shifts, number_starts)
+    # The sign is stored in the lowest bit.
+    numbers = np.where(numbers & 1, ~(numbers >> 1), numbers >> 1)
+
+    # Each point is a change in latitude, then a change in longitude.
+    numbers_per_polyline = np.diff(
+        np.concatenate([[0], np.cumsum(is_last_chunk)])[byte_offsets]
+    )
+    if np.any(numbers_per_polyline % 2):
+        raise ValueError("Can't decode a polyline with half a point.")
+
+    offsets = np.concatenate([[0], np.cumsum(numbers_per_polyline // 2)]).astype(
+        np.int64
+    )
+    changes = numbers.reshape(-1, 2)
+
+    # Add up the changes within each polyline. The totals are all whole
+    # numbers, so taking away the total before each polyline is exact.
+    totals = np.cumsum(changes, axis=0)
+    totals_before = np.concatenate([np.zeros((1, 2), dtype=np.int64), totals])
+    totals -= np.repeat(totals_before[offsets[:-1]], np.diff(offsets), axis=0)
+
+    return Polylines(points=totals / float(10**precision), offsets=offsets)
+
+
+def without_single_points(polylines: Polylines) -> Polylines:
+    """
+    Drops any polylines with fewer than two points, since there's no line to
+    draw.
+    """
+    return polylines.take(polylines.lengths > 1)
+
+
+def apply_equirectangular_approximation(polylines: Polylines) -> Polylines:
+    """
+    Projects (lat, long) points into (x, y) kilometres, using the latitude of
+    the first point of each polyline as its reference.
+    """
+    lats = polylines.points[:, 0]
+    longs = polylines.points[:, 1]
+    reference_lats = polylines.repeat(lats[polylines.offsets[:-1]])
+
+    x = EARTH_RADIUS_KM * longs * np.pi / 180 * np.cos(np.radians(reference_lats))
+    y = EARTH_RADIUS_KM * lats * np.pi / 180
+    return polylines.with_points(np.column_stack([x, y]))
+
+
+def transform_to_start_at_zero(polylines: Polylines) -> Polylines:
+    starts = polylines.repeat(polylines.points[polylines.offsets[:-1]])
+    return polylines.with_points(polylines.points - starts)
+
+
+def scale_into_unit_squares(polylines: Polylines) -> Polylines:
+    """
+    Scales each polyline to fill the width or height of a unit square (whichever
+    is larger), with its top left at (0, 0), and y going down like it does in
+    Pillow. Polylines with every point in the same spot can't be scaled, so
+    they're dropped.
+    """
+    if not len(polylines):
+        return polylines
+
+    points = polylines.points * [1, -1]
+    mins = polylines.reduce(np.minimum, points)
+    maxes = polylines.reduce(np.maximum, points)
+    sizes = (maxes - mins).max(axis=1)
+
+    scaling_factors = 1 / np.where(sizes == 0, np.nan, sizes)
+    scaled = polylines.with_points(
+        polylines.repeat(scaling_factors)[:, None] * (points - polylines.repeat(mins))
+    )
+    return scaled.take(sizes != 0)
+
+
+def get_max_chebyshev_distance(polylines: Polylines) -> float:
+    """
+    The furthest any point is from (0, 0), in either x or y.
+    """
+    if not len(polylines.points):
+        return 0.0
+    return float(np.abs(polylines.points).max())
+
+
+def scale_into_square(
+    polylines: Polylines, max_chebyshev_distance: float, size: float
+) -> Polylines:
+    """
+    Scales polylines centred on (0, 0) by the same amount, so the point
+    `max_chebyshev_distance` away from the centre lands just inside the edge of
+    a `size` by `size` square, then moves them into the middle of it. y is
+    flipped to go down, like it does in Pillow.
+    """
+    # 0.5 is because the max chebychev distance in x means that that distance
+    # must fit from the center to the edge, not edge to edge. 0.95 is because
+    # we don't want to hit the edge of the image for aesthetic purposes.
+    scaling_factor = (0.95 * 0.5 * size) / max_chebyshev_distance
+    points = polylines.points * scaling_factor * [1, -1] + size / 2
+    return polylines.with_points(points)
+
+
+def place_in_grid(
+    polylines: Polylines, square_size: int, border_size_px: int, grid_size: int
+) -> Polylines:
+    """
+    Moves each polyline (in a unit square) into its own `square_size` square of
+    a `grid_size` by `grid_size` grid, left to right then top to bottom, with a
+    border around every square.
+    """
+    indices = np.arange(len(polylines))
+    cols = indices % grid_size
+    rows = indices // grid_size
+    starting_points = np.column_stack(
+        [
+            ((cols + 1) * border_size_px) + (square_size * cols),
+            ((rows + 1) * border_size_px) + (square_size * rows),
+        ]
+    )
+    return polylines.with_points(
+        polylines.points * square_size + polylines.repeat(starting_points)
+    )
+
+
+def get_drawable_points(points: np.ndarray) -> list[float]:
+    """
+    Flattens some points into the [x0, y0, x1, y1, ...] list Pillow draws.
+    """
+    return points.ravel().tolist()
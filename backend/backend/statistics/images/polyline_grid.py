@@ -1,90 +1,61 @@
-import dataclasses
-import datetime as dt
+import functools
 import json
 import math
 import os
-from typing import Iterable
+from typing import Iterable, Iterator, Optional
 
-import polyline as pl
-from PIL import Image as img
+import numpy as np
+from backend.statistics.images import animation, geometry, rendering
+from backend.statistics.images.geometry import Polylines
+from backend.statistics.utils.activity_frame import ActivityFrame
 from PIL import ImageDraw
 from PIL.Image import Image
-from stravalib.model import DetailedActivity
 
-Polyline = list[tuple[float, float]]
 
+PROPOSED_IMAGE_SIZE = 1200
+BORDER_SIZE_PX = 6
+LINE_THICKNESS = 1
+ANIMATION_DURATION_MS = 2000
+ANIMATION_FPS = 40
 
-def create_images(activity_iterator: Iterable[DetailedActivity], path: str) -> None:
-    captions: dict[str, str] = {}
 
-    compact_activities = [
-        CompactActivity(
-            type=activity.type,
-            summary_polyline=activity.map.summary_polyline,
-            start_date_local=activity.start_date_local,
-        )
-        for activity in activity_iterator
-        if activity.start_date_local is not None
-        and activity.map.summary_polyline is not None
-    ]
-    compact_activities.sort(key=lambda x: x.start_date_local)
-
-    activity_types = set(
-        compact_activity.type for compact_activity in compact_activities
+def create_images(
+    activities: ActivityFrame,
+    path: str,
+    max_workers: Optional[int] = None,
+    animation_format: str = animation.DEFAULT_FORMAT,
+) -> None:
+    """
+    Saves a grid image and animation for each activity type into `path`, with
+    their captions in captions.json. The images are rendered in parallel, in up
+    to `max_workers` processes (by default one per vCPU).
+    """
+    activities = (
+        activities.where(activities.df["summary_polyline"] != "")
+        .with_values("start_date_local")
+        .sorted_by("start_date_local")
     )
 
-    PROPOSED_IMAGE_SIZE = 1200
-    BORDER_SIZE_PX = 6
-    LINE_THICKNESS = 1
-
-    for activity_type in activity_types:
-        image = create_image(
-            (
-                activity.summary_polyline
-                for activity in compact_activities
-                if activity.type == activity_type
-            ),
-            1.0,
-            PROPOSED_IMAGE_SIZE,
-            BORDER_SIZE_PX,
-            LINE_THICKNESS,
+    grids: dict[str, tuple[int, Polylines]] = {}
+    for activity_type in activities.get_activity_types():
+        encoded_polylines: list[str] = (
+            activities.of_type(activity_type).df["summary_polyline"].to_list()
         )
 
-        if image is None:
+        polylines = get_scaled_polylines(encoded_polylines)
+        if not len(polylines):
             continue
 
-        image_name = f"{activity_type}_grid.png"
-        image_path = os.path.join(path, image_name)
-        image.save(image_path, "PNG")
-        image.close()
-
-        captions[image_name] = f"A grid of all {activity_type} activities."
-
-        gif_duration_ms = 2000
-        gif_fps = 40
-        images = create_gif_image(
-            [
-                activity.summary_polyline
-                for activity in compact_activities
-                if activity.type == activity_type
-            ],
-            gif_duration_ms,
-            gif_fps,
-            PROPOSED_IMAGE_SIZE,
-            BORDER_SIZE_PX,
-            LINE_THICKNESS,
-        )
-        gif_name = f"{activity_type}_grid_animation.gif"
-        gif_path = os.path.join(path, gif_name)
-        images[0].save(
-            gif_path,
-            save_all=True,
-            append_images=images[1:],
-            duration=gif_duration_ms / gif_fps,
-            loop=0,
+        grids[activity_type] = get_grid_polylines(
+            polylines, PROPOSED_IMAGE_SIZE, BORDER_SIZE_PX
         )
 
-        captions[gif_name] = f"An animation of all {activity_type} activities."
+    captions = rendering.render_all(
+        functools.partial(render_artifact, animation_format=animation_format),
+        grids,
+        path,
+        max_workers,
+    )
 
     # Create captions
     # Dump the dictionary to a JSON file
@@ -92,6 +63,41 @@ def create_images(activity_iterator: Iterable[DetailedActivity], path: str) -> N
         json.dump(captions, json_file)
 
 
+def render_artifact(
+    grid: tuple[int, Polylines],
+    activity_type: str,
+    artifact: str,
+    path: str,
+    animation_format: str = animation.DEFAULT_FORMAT,
+) -> dict[str, str]:
+    """
+    Saves either the image or the animation of one activity type's grid,
+    returning its caption.
+    """
+    image_size, grid_polylines = grid
+
+    if artifact == rendering.IMAGE:
+        image = draw_image(image_size, grid_polylines, 1.0, LINE_THICKNESS)
+
+        image_name = f"{activity_type}_grid.png"
+        image.save(os.path.join(path, image_name), "PNG")
+        return {image_name: f"A grid of all {activity_type} activities."}
+
+    num_frames = int((ANIMATION_DURATION_MS / 1000) * ANIMATION_FPS)
+    images = list(
+        iter_animation_frames(image_size, grid_polylines, num_frames, LINE_THICKNESS)
+    )
+
+    animation_name = animation.save_animation(
+        images,
+        path,
+        f"{activity_type}_grid_animation",
+        ANIMATION_DURATION_MS / ANIMATION_FPS,
+        animation_format,
+    )
+    return {animation_name: f"An animation of all {activity_type} activities."}
+
+
 def create_image(
     encoded_polylines: Iterable[str],
     polyline_fraction: float = 1.0,
@@ -115,143 +121,80 @@ def create_image(
 
     line_thickness: The thickness of the line which draws the routes in px.
     """
-    polylines: list[Polyline] = []
-    for encoded_polyline in encoded_polylines:
-        polyline: Polyline = pl.decode(encoded_polyline)
-
-        if len(polyline) <= 1:
-            # I think we have ran into instances where people have ONLY activities with a single
-            # lat-long pair here, which means that the max cheby distance is 0, and then we do a
-            # divide by zero. So lets just continue if there is a single point, because lets be
-            # real, a single point is silly to plot.
-            continue
-
-        polyline = apply_equirectangular_approximation(polyline)
-        optional_polyline = custom_scale_polyline(polyline)
-
-        if optional_polyline is not None:
-            polylines.append(optional_polyline)
-
-    if not polylines:
+    polylines = get_scaled_polylines(encoded_polylines)
+    if not len(polylines):
         return None
 
-    # To calculate the number of cells in the grid, get the square root of the
-    # number of polylines, then round up. If that number is x, we make an x by
-    # x grid.
-    grid_size = math.ceil(math.sqrt(len(polylines)))
+    image_size, grid_polylines = get_grid_polylines(
+        polylines, proposed_image_size, border_size_px
+    )
 
-    # Now to calculate the image dimensions, find the largest whole pixel size
-    # square, such that a grid of x by x squares (where x was calculated above)
-    # including borders.
-    square_size = (
-        proposed_image_size - ((grid_size + 1) * border_size_px)
-    ) // grid_size
-    image_size = ((grid_size + 1) * border_size_px) + (grid_size * square_size)
+    return draw_image(image_size, grid_polylines, polyline_fraction, line_thickness)
 
+
+def draw_image(
+    image_size: int,
+    polylines: Polylines,
+    polyline_fraction: float,
+    line_thickness: int,
+) -> Image:
     # Create a white canvas
-    width, height = image_size, image_size
-    image = img.new("RGB", (width, height), "white")
+    image = animation.new_canvas(image_size)
     draw = ImageDraw.Draw(image)
 
-    for i, polyline in enumerate(polylines):
-        # Calculate col and row from i, then calculate starting position.
-        col = i % grid_size
-        row = i // grid_size
-
-        starting_x = ((col + 1) * border_size_px) + (square_size * col)
-        starting_y = ((row + 1) * border_size_px) + (square_size * row)
-
-        # Scale by the square size
-        polyline = [(x * square_size, y * square_size) for (x, y) in polyline]
-
-        # Translate by the starting position.
-        polyline = [(x + starting_x, y + starting_y) for (x, y) in polyline]
-
+    for points in polylines:
         # Draw the polylines
         draw.line(
-            polyline[0 : int(polyline_fraction * len(polyline))],
-            fill="black",
+            geometry.get_drawable_points(
+                points[0 : int(polyline_fraction * len(points))]
+            ),
+            fill=animation.BLACK,
             width=line_thickness,
         )
 
     return image
 
 
-def apply_equirectangular_approximation(polyline: Polyline) -> Polyline:
-    def equirectangular_approximation(lat, lon, reference_lat):
-        R = 6371  # Radius of the Earth in kilometers
-
-        x = R * lon * math.pi / 180 * math.cos(math.radians(reference_lat))
-        y = R * lat * math.pi / 180
-
-        return x, y
-
-    polyline = [
-        equirectangular_approximation(lat, long, polyline[0][0])
-        for (lat, long) in polyline
-    ]
-
-    return polyline
-
-
-def custom_scale_polyline(polyline: Polyline) -> None | Polyline:
+def get_scaled_polylines(encoded_polylines: Iterable[str]) -> Polylines:
     """
-    The goal here is to scale some arbitrary polyline into the center of a unit
-    square. This will make it easier to place them all in the future.
+    Decodes every polyline, and scales each of them into the unit square,
+    skipping any that can't be drawn.
     """
-    # Before we do any scaling, we are going to negate the y axis. This is
-    # because Pillow treats the top left at 0,0, and not the bottom left.
-    polyline = [(x, -y) for (x, y) in polyline]
-
-    min_x = min(x for (x, y) in polyline)
-    min_y = min(y for (x, y) in polyline)
-    max_x = max(x for (x, y) in polyline)
-    max_y = max(y for (x, y) in polyline)
-
-    # Calculate the dimensions of the bounding box
-    width = max_x - min_x
-    height = max_y - min_y
-
-    # Handle the case where all points are in the same spot. To avoid a div/0
-    # error here, just return None because we can't scale this.
-    if max([height, width]) == 0:
-        return None
+    polylines = geometry.decode_polylines(encoded_polylines)
 
-    # Calculate the scaling factors for x and y to fit the polyline into a unit square
-    if width > height:
-        scaling_factor = 1 / width
-    else:
-        scaling_factor = 1 / height
+    # I think we have ran into instances where people have ONLY activities with a single
+    # lat-long pair here, which means that the max cheby distance is 0, and then we do a
+    # divide by zero. So lets just skip any with a single point, because lets be
+    # real, a single point is silly to plot.
+    polylines = geometry.without_single_points(polylines)
 
-    translated_polyline = [(x - min_x, y - min_y) for (x, y) in polyline]
+    polylines = geometry.apply_equirectangular_approximation(polylines)
+    return geometry.scale_into_unit_squares(polylines)
 
-    # Apply the scaling and translation to each point in the polyline
-    scaled_polyline = [
-        (
-            scaling_factor * x,
-            scaling_factor * y,
-        )
-        for (x, y) in translated_polyline
-    ]
-    return scaled_polyline
 
-
-def translate_polyline(polyline: Polyline, min_canvas_dimension: int) -> Polyline:
+def get_grid_polylines(
+    polylines: Polylines, proposed_image_size: int, border_size_px: int
+) -> tuple[int, Polylines]:
     """
-    At this point, the polyline is centered around (0, 0). We want to center it
-    in the center of the canvas.
+    Places each of the (unit square) polylines in its own square of a grid,
+    returning the size of the image, and the polylines in pixels.
     """
-    return [
-        (x + (min_canvas_dimension / 2), y + (min_canvas_dimension / 2))
-        for (x, y) in polyline
-    ]
+    # To calculate the number of cells in the grid, get the square root of the
+    # number of polylines, then round up. If that number is x, we make an x by
+    # x grid.
+    grid_size = math.ceil(math.sqrt(len(polylines)))
 
+    # Now to calculate the image dimensions, find the largest whole pixel size
+    # square, such that a grid of x by x squares (where x was calculated above)
+    # including borders.
+    square_size = (
+        proposed_image_size - ((grid_size + 1) * border_size_px)
+    ) // grid_size
+    image_size = ((grid_size + 1) * border_size_px) + (grid_size * square_size)
 
-@dataclasses.dataclass
-class CompactActivity:
-    type: str
-    summary_polyline: str
-    start_date_local: dt.datetime
+    return image_size, geometry.place_in_grid(
+        polylines, square_size, border_size_px, grid_size
+    )
 
 
 def create_gif_image(
@@ -262,28 +205,68 @@ def create_gif_image(
     border_size_px: int = 1,
     line_thickness: int = 2,
 ) -> list[Image]:
+    """
+    Returns the frames of an animation of the polylines being drawn, where
+    frame i of n has the first i/n of every polyline drawn. The last frame is
+    the same as `create_image`.
+
+    The polylines are only decoded and placed once, and each frame just draws
+    the new part of every polyline on top of the frame before it, so this
+    costs about the same as drawing one image, plus copying the frames.
+    """
     num_frames = int((gif_duration_ms / 1000) * gif_fps)
 
+    polylines = get_scaled_polylines(encoded_polylines)
+    if not len(polylines):
+        return []
+
+    image_size, grid_polylines = get_grid_polylines(
+        polylines, proposed_image_size, border_size_px
+    )
     return list(
-        filter(
-            lambda x: x is not None,  # type: ignore
-            (
-                create_image(
-                    encoded_polylines,
-                    frame / num_frames,
-                    proposed_image_size=proposed_image_size,
-                    border_size_px=border_size_px,
-                    line_thickness=line_thickness,
-                )
-                for frame in range(1, num_frames + 1)
-            ),
+        iter_animation_frames(
+            image_size, grid_polylines, num_frames, line_thickness=line_thickness
         )
     )
 
 
+def iter_animation_frames(
+    image_size: int,
+    polylines: Polylines,
+    num_frames: int,
+    line_thickness: int,
+) -> Iterator[Image]:
+    """
+    Yields a copy of a single canvas after each frame's new segments have been
+    drawn on it. Every line is the same colour, so drawing a polyline in
+    pieces gives exactly the same pixels as drawing it all at once.
+    """
+    image = animation.new_canvas(image_size)
+    draw = ImageDraw.Draw(image)
+    polyline_lengths = polylines.lengths
+    drawn_lengths = np.zeros(len(polylines), dtype=np.int64)
+
+    for frame in range(1, num_frames + 1):
+        lengths = (frame / num_frames * polyline_lengths).astype(np.int64)
+        for i in np.flatnonzero(lengths > drawn_lengths):
+            # Start from the last point that was drawn, so the new segments
+            # join onto the old ones.
+            start = polylines.offsets[i] + max(drawn_lengths[i] - 1, 0)
+            draw.line(
+                geometry.get_drawable_points(
+                    polylines.points[start : polylines.offsets[i] + lengths[i]]
+                ),
+                fill=animation.BLACK,
+                width=line_thickness,
+            )
+        drawn_lengths = np.maximum(drawn_lengths, lengths)
+
+        yield image.copy()
+
+
 # For testing
 if __name__ == "__main__":
-    from backend.utils import local_storage
+    from backend.utils.s3 import get_activity_columns_from_s3
 
-    activity_iterator = local_storage.get_summary_activity_iterator(94896104)
-    create_images(activity_iterator, "")
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(94896104))
+    create_images(activities, "")
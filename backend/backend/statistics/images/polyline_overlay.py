@@ -1,80 +1,90 @@
-import dataclasses
+import functools
 import json
-import math
 import os
-from typing import Iterator
+from typing import Iterable, Iterator, Optional
 
-import polyline
-from PIL import Image as img
+import numpy as np
+from backend.statistics.images import animation, geometry, rendering
+from backend.statistics.images.geometry import Polylines
+from backend.statistics.utils.activity_frame import ActivityFrame
 from PIL import ImageDraw
 from PIL.Image import Image
-from stravalib.model import DetailedActivity
 
-Polyline = list[tuple[float, float]]
 
+IMAGE_SIZE = 1000
+ANIMATION_DURATION_MS = 3000
+ANIMATION_FPS = 20
 
-def create_images(activity_iterator: Iterator[DetailedActivity], path: str) -> None:
-    captions: dict[str, str] = {}
 
-    compact_activities = [
-        CompactActivity(
-            type=activity.type, summary_polyline=activity.map.summary_polyline
-        )
-        for activity in activity_iterator
-    ]
-    activity_types = set(
-        compact_activity.type for compact_activity in compact_activities
-    )
+def create_images(
+    activities: ActivityFrame,
+    path: str,
+    max_workers: Optional[int] = None,
+    animation_format: str = animation.DEFAULT_FORMAT,
+) -> None:
+    """
+    Saves an overlaid image and animation for each activity type into `path`,
+    with their captions in captions.json. The images are rendered in parallel,
+    in up to `max_workers` processes (by default one per vCPU), and the
+    animations are saved as `animation_format` (one of `animation.FORMATS`).
+    """
+    activities = activities.where(activities.df["summary_polyline"] != "")
 
-    for activity_type in activity_types:
-        image = create_image(
-            (
-                activity.summary_polyline
-                for activity in compact_activities
-                if activity.type == activity_type
-            ),
-            1000,
+    overlays: dict[str, Polylines] = {}
+    for activity_type in activities.get_activity_types():
+        encoded_polylines: list[str] = (
+            activities.of_type(activity_type).df["summary_polyline"].to_list()
         )
 
-        if image is None:
-            continue
+        polylines = get_overlay_polylines(encoded_polylines, IMAGE_SIZE)
+        if polylines is not None:
+            overlays[activity_type] = polylines
 
-        image_name = f"{activity_type}.png"
-        image_path = os.path.join(path, image_name)
-        image.save(image_path, "PNG")
-        image.close()
+    captions = rendering.render_all(
+        functools.partial(render_artifact, animation_format=animation_format),
+        overlays,
+        path,
+        max_workers,
+    )
 
-        captions[image_name] = (
-            f"All {activity_type} activities overlaid as if they have the same starting point."
-        )
+    # Create captions
+    # Dump the dictionary to a JSON file
+    with open(os.path.join(path, "captions.json"), "w") as json_file:
+        json.dump(captions, json_file)
 
-        gif_duration_ms = 3000
-        gif_fps = 20
-        images = create_gif_image(
-            [
-                activity.summary_polyline
-                for activity in compact_activities
-                if activity.type == activity_type
-            ],
-            gif_duration_ms,
-            gif_fps,
-        )
 
-        gif_name = f"{activity_type}_animation.gif"
-        gif_path = os.path.join(path, gif_name)
-        images[0].save(
-            gif_path,
-            save_all=True,
-            append_images=images[1:],
-            duration=gif_duration_ms / gif_fps,
-            loop=0,
-        )
-        captions[gif_name] = f"An animation of overlaid {activity_type} activities."
+def render_artifact(
+    polylines: Polylines,
+    activity_type: str,
+    artifact: str,
+    path: str,
+    animation_format: str = animation.DEFAULT_FORMAT,
+) -> dict[str, str]:
+    """
+    Saves either the image or the animation of one activity type's overlaid
+    polylines, returning its caption.
+    """
+    if artifact == rendering.IMAGE:
+        image = draw_image(IMAGE_SIZE, polylines, 1.0)
 
-        # Create captions
-        # Dump the dictionary to a JSON file
-        with open(os.path.join(path, "captions.json"), "w") as json_file:
-            json.dump(captions, json_file)
+        image_name = f"{activity_type}.png"
+        image.save(os.path.join(path, image_name), "PNG")
+        return {
+            image_name: f"All {activity_type} activities overlaid as if they "
+            "have the same starting point."
+        }
+
+    num_frames = int((ANIMATION_DURATION_MS / 1000) * ANIMATION_FPS)
+    images = list(iter_animation_frames(IMAGE_SIZE, polylines, num_frames))
+
+    animation_name = animation.save_animation(
+        images,
+        path,
+        f"{activity_type}_animation",
+        ANIMATION_DURATION_MS / ANIMATION_FPS,
+        animation_format,
+    )
+    return {animation_name: f"An animation of overlaid {activity_type} activities."}
 
 
 def create_image(
@@ -93,162 +103,130 @@ def create_image(
     * the total number of segments in the polyline with the maximimum number
     of segments. This facilitates the creation of animations.
     """
-    polylines: list[Polyline] = []
-    for encoded_polyline in encoded_polylines:
-        # If the polyline has nothing in it, just return.
-        polyline = decode_polyline(encoded_polyline)
-
-        if len(polyline) <= 1:
-            # I think we have ran into instances where people have ONLY activities with a single
-            # lat-long pair here, which means that the max cheby distance is 0, and then we do a
-            # divide by zero. So lets just continue if there is a single point, because lets be
-            # real, a single point is silly to plot.
-            continue
-
-        polyline = apply_equirectangular_approximation(polyline)
-        polyline = transform_to_start_and_end_at_zero(polyline)
-        polylines.append(polyline)
-
-    if not polylines:
+    polylines = get_overlay_polylines(encoded_polylines, image_size)
+    if polylines is None:
         return None
 
-    # Create a white canvas
-    width = height = image_size
-    image = img.new("RGB", (width, height), "white")
-    draw = ImageDraw.Draw(image)
-
-    max_all_max_chebychev_distances = max(
-        max_chebychev_distance(polyline) for polyline in polylines
-    )
-
-    if max_all_max_chebychev_distances == 0:
-        # This can occur if a polyline is any number of points all at the exact
-        # same location, and that polyline if the only polyline that that
-        # activity (or possible all polylines for that activity have identical
-        # points.)  We just want to return if that's the case.
-        return None
+    return draw_image(image_size, polylines, max_segments_fraction)
 
-    scaled_polylines = [
-        aesthetically_scale_polyline(
-            polyline, max_all_max_chebychev_distances, min([height, width])
-        )
-        for polyline in polylines
-    ]
 
-    translated_polylines = [
-        translate_polyline(polyline, min([width, height]))
-        for polyline in scaled_polylines
-    ]
+def draw_image(
+    image_size: int, polylines: Polylines, max_segments_fraction: float
+) -> Image:
+    # Create a white canvas
+    image = animation.new_canvas(image_size)
+    draw = ImageDraw.Draw(image)
 
     # Get the number of segments in the polyline with the most segments.
-    max_num_polylines = max(len(polyline) for polyline in polylines)
+    max_num_polylines = polylines.lengths.max()
 
     # Draw the polylines
-    for polyline in translated_polylines:
+    for points in polylines:
         draw.line(
-            polyline[0 : int(max_num_polylines * max_segments_fraction)],
-            fill="black",
+            geometry.get_drawable_points(
+                points[0 : int(max_num_polylines * max_segments_fraction)]
+            ),
+            fill=animation.BLACK,
             width=1,
         )
 
     return image
 
 
-def decode_polyline(encoded_polyline: str | None) -> Polyline:
-    if encoded_polyline is None:
-        return []
-
-    decoded_polyline: Polyline = polyline.decode(encoded_polyline)
-    return decoded_polyline
-
-
-def apply_equirectangular_approximation(polyline: Polyline) -> Polyline:
-    def equirectangular_approximation(lat, lon, reference_lat):
-        R = 6371  # Radius of the Earth in kilometers
-
-        x = R * lon * math.pi / 180 * math.cos(math.radians(reference_lat))
-        y = R * lat * math.pi / 180
-
-        return x, y
-
-    polyline = [
-        equirectangular_approximation(lat, long, polyline[0][0])
-        for (lat, long) in polyline
-    ]
-
-    return polyline
+def get_overlay_polylines(
+    encoded_polylines: Iterable[str | None], image_size: int
+) -> Polylines | None:
+    """
+    Decodes every polyline, moves them all to start at the same point, and
+    scales them all by the same amount so they fit in the image, returning
+    them in pixels. Returns None if there's nothing to draw.
+    """
+    polylines = geometry.decode_polylines(encoded_polylines)
+
+    # I think we have ran into instances where people have ONLY activities with a single
+    # lat-long pair here, which means that the max cheby distance is 0, and then we do a
+    # divide by zero. So lets just skip any with a single point, because lets be
+    # real, a single point is silly to plot.
+    polylines = geometry.without_single_points(polylines)
+    if not len(polylines):
+        return None
 
+    polylines = geometry.apply_equirectangular_approximation(polylines)
+    polylines = geometry.transform_to_start_at_zero(polylines)
 
-def transform_to_start_and_end_at_zero(polyline: Polyline) -> Polyline:
-    return [(x - polyline[0][0], y - polyline[0][1]) for (x, y) in polyline]
+    max_all_max_chebychev_distances = geometry.get_max_chebyshev_distance(polylines)
 
+    if max_all_max_chebychev_distances == 0:
+        # This can occur if a polyline is any number of points all at the exact
+        # same location, and that polyline if the only polyline that that
+        # activity (or possible all polylines for that activity have identical
+        # points.)  We just want to return if that's the case.
+        return None
 
-def max_chebychev_distance(polyline: Polyline) -> float:
-    max_x = max(abs(point[0]) for point in polyline)
-    max_y = max(abs(point[1]) for point in polyline)
-    return max([max_x, max_y])
+    return geometry.scale_into_square(
+        polylines, max_all_max_chebychev_distances, image_size
+    )
 
 
-def aesthetically_scale_polyline(
-    polyline: Polyline, max_chebychev_distance: float, min_canvas_dimension: float
-) -> Polyline:
+def create_gif_image(
+    encoded_polylines: list[str], gif_duration_ms: int, gif_fps: int
+) -> list[Image]:
     """
-    Normalizes the polyline so that all points lie between -1 and 1, while starting at
-    Can be multiplied by some scale.
+    Returns the frames of an animation of the polylines being drawn, where
+    frame i of n has the first i/n of the longest polyline's points drawn (and
+    the same number of points of every other polyline). The last frame is the
+    same as `create_image`.
+
+    The polylines are only decoded and scaled once, and each frame just draws
+    the new part of every polyline on top of the frame before it.
     """
+    num_frames = int((gif_duration_ms / 1000) * gif_fps)
 
-    # 0.5 is because the max chebychev distance in x means that that distance must fit from the center to the edge, not edge to edge.
-    # 0.95 is because we don't want to hit the edge of the image for aesthetic purposes.
-    polyline = [
-        (
-            x * ((0.95 * 0.5 * min_canvas_dimension) / max_chebychev_distance),
-            y * ((0.95 * 0.5 * min_canvas_dimension) / max_chebychev_distance),
-        )
-        for (x, y) in polyline
-    ]
+    polylines = get_overlay_polylines(encoded_polylines, IMAGE_SIZE)
+    if polylines is None:
+        return []
 
-    # Annoyingly the coordinates of Pillow start at the top left of the screen,
-    # so we need to negate y to have things make sense.
-    polyline = [(x, -y) for (x, y) in polyline]
-    return polyline
+    return list(iter_animation_frames(IMAGE_SIZE, polylines, num_frames))
 
 
-def translate_polyline(polyline: Polyline, min_canvas_dimension: int) -> Polyline:
+def iter_animation_frames(
+    image_size: int, polylines: Polylines, num_frames: int
+) -> Iterator[Image]:
     """
-    At this point, the polyline is centered around (0, 0). We want to center it
-    in the center of the canvas.
+    Yields a copy of a single canvas after each frame's new segments have been
+    drawn on it. Every line is the same colour, so drawing a polyline in
+    pieces gives exactly the same pixels as drawing it all at once.
     """
-    return [
-        (x + (min_canvas_dimension / 2), y + (min_canvas_dimension / 2))
-        for (x, y) in polyline
-    ]
-
-
-@dataclasses.dataclass
-class CompactActivity:
-    type: str
-    summary_polyline: str
-
+    image = animation.new_canvas(image_size)
+    draw = ImageDraw.Draw(image)
 
-def create_gif_image(
-    encoded_polylines: list[str], gif_duration_ms: int, gif_fps: int
-) -> list[Image]:
-    num_frames = int((gif_duration_ms / 1000) * gif_fps)
+    polyline_lengths = polylines.lengths
+    max_num_polylines = int(polyline_lengths.max())
+    drawn_lengths = np.zeros(len(polylines), dtype=np.int64)
 
-    return list(
-        filter(
-            (lambda x: x is not None),  # type: ignore
-            (
-                create_image((_ for _ in encoded_polylines), 1000, frame / num_frames)
-                for frame in range(1, num_frames + 1)
-            ),
+    for frame in range(1, num_frames + 1):
+        lengths = np.minimum(
+            int(max_num_polylines * frame / num_frames), polyline_lengths
         )
-    )
+        for i in np.flatnonzero(lengths > drawn_lengths):
+            # Start from the last point that was drawn, so the new segments
+            # join onto the old ones.
+            start = polylines.offsets[i] + max(drawn_lengths[i] - 1, 0)
+            draw.line(
+                geometry.get_drawable_points(
+                    polylines.points[start : polylines.offsets[i] + lengths[i]]
+                ),
+                fill=animation.BLACK,
+                width=1,
+            )
+        drawn_lengths = np.maximum(drawn_lengths, lengths)
+
+        yield image.copy()
 
 
 # For testing
 if __name__ == "__main__":
-    from backend.utils import local_storage
+    from backend.utils.s3 import get_activity_columns_from_s3
 
-    activity_iterator = local_storage.get_summary_activity_iterator(94896104)
-    create_images(activity_iterator, "")
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(94896104))
+    create_images(activities, "")
@@ -0,0 +1,117 @@
+"""
+Renders the images for each activity type in parallel.
+
+Every activity type gets a still image and an animation, which are completely
+independent of each other, and are pure Pillow work which holds the GIL, so
+they're rendered as separate jobs in a pool of processes, one per vCPU.
+
+The geometry for every activity type is worked out once up front (which is
+quick, see `geometry`), and handed to each worker as it starts, rather than
+with every job. With the fork start method the workers just inherit it,
+otherwise it's pickled once per worker, which is cheap since it's a few flat
+numpy arrays.
+
+Each job saves its own files, and only sends the captions back.
+
+If processes can't be started (Lambda has no /dev/shm, which multiprocessing
+needs for its locks), or there's only one vCPU, everything is rendered in this
+process instead.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Mapping, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Renders one artifact of one activity type into a directory from the
+# geometry for that activity type, returning the captions of the files saved.
+RenderFunction = Callable[[T, str, str, str], dict[str, str]]
+
+IMAGE = "image"
+ANIMATION = "animation"
+ARTIFACTS = (IMAGE, ANIMATION)
+
+# The geometry each worker was started with, keyed by activity type.
+worker_geometries: Mapping[str, Any] = {}
+
+
+def get_num_vcpus() -> int:
+    """
+    The number of CPUs this process is allowed to run on. Lambda gives a
+    function more vCPUs the more memory it has.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # sched_getaffinity isn't available everywhere, like on macOS.
+        return os.cpu_count() or 1
+
+
+def render_all(
+    render_function: RenderFunction[T],
+    geometries: Mapping[str, T],
+    path: str,
+    max_workers: Optional[int] = None,
+) -> dict[str, str]:
+    """
+    Renders every artifact of every activity type in `geometries` into `path`,
+    using up to `max_workers` processes (by default one per vCPU). Returns
+    all the captions, in the same order as rendering them one at a time would.
+
+    `render_function` has to be a module level function, so the workers can
+    find it.
+    """
+    jobs = [
+        (activity_type, artifact)
+        for activity_type in geometries
+        for artifact in ARTIFACTS
+    ]
+
+    num_workers = min(max_workers or get_num_vcpus(), len(jobs))
+    if num_workers > 1:
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=set_worker_geometries,
+                initargs=(geometries,),
+            )
+        except OSError as e:
+            logger.warning(f"Can't render images in parallel, rendering serially: {e}")
+        else:
+            with executor:
+                results = executor.map(
+                    render_with_worker_geometry,
+                    [render_function] * len(jobs),
+                    *zip(*jobs),
+                    [path] * len(jobs),
+                )
+                return merge_captions(results)
+
+    return merge_captions(
+        render_function(geometries[activity_type], activity_type, artifact, path)
+        for activity_type, artifact in jobs
+    )
+
+
+def set_worker_geometries(geometries: Mapping[str, Any]) -> None:
+    global worker_geometries
+    worker_geometries = geometries
+
+
+def render_with_worker_geometry(
+    render_function: RenderFunction[Any], activity_type: str, artifact: str, path: str
+) -> dict[str, str]:
+    return render_function(
+        worker_geometries[activity_type], activity_type, artifact, path
+    )
+
+
+def merge_captions(results: Iterable[dict[str, str]]) -> dict[str, str]:
+    captions: dict[str, str] = {}
+    for result in results:
+        captions.update(result)
+    return captions
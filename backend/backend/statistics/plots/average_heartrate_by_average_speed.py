@@ -1,57 +1,36 @@
-import dataclasses
 import datetime as dt
-from typing import Any, Callable, Iterator, Optional
+from typing import Any, Callable
 
+import pandas as pd
 import plotly.graph_objects as go
 from backend.exceptions import UserVisibleException
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.statistics.utils.average_speed_utils import (
     average_speed_to_kmph,
     average_speed_to_mins_per_km,
 )
-from stravalib import unit_helper as uh
-from stravalib.model import DetailedActivity, ActivityType
+from backend.statistics.utils.downsampling import MAX_PLOT_POINTS, get_density_bins
+from backend.tabs.plot_tabs import PlotWindow
 
 
-@dataclasses.dataclass
-class CompactActivity:
-    type: ActivityType
-    start_date: dt.datetime
-    average_heartrate: float
-    average_speed: float
-    distance: uh._Quantity
+def plot(activities: ActivityFrame, max_points: int = MAX_PLOT_POINTS) -> go.Figure:
+    activities = get_activities_to_plot(activities)
 
+    runs = activities.of_type("Run")
+    rides = activities.of_type("Ride")
 
-def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
-    compact_activities: list[CompactActivity] = get_compact_activities(
-        activity_iterator
-    )
-    # Sort activities by start date.
-    compact_activities.sort(key=lambda activity: activity.start_date)
-
-    runs: list[CompactActivity] = [
-        activity
-        for activity in compact_activities
-        if activity.type == "Run" and activity.average_heartrate is not None
-    ]
-
-    rides: list[CompactActivity] = [
-        activity
-        for activity in compact_activities
-        if activity.type == "Ride" and activity.average_heartrate is not None
-    ]
-
-    if not runs and not rides:
+    if not len(runs) and not len(rides):
         raise UserVisibleException(
             "There are no runs and no rides with heartrate, so this plot can not be generated."
         )
 
     scatters = []
-    if runs:
-        run_scatter = get_scatter_plot("Run", runs)
+    if len(runs):
+        run_scatter = get_scatter_plot("Run", runs, max_points)
         scatters.append(run_scatter)
 
-    if rides:
-        ride_scatter = get_scatter_plot("Ride", rides)
+    if len(rides):
+        ride_scatter = get_scatter_plot("Ride", rides, max_points)
         scatters.append(ride_scatter)
 
     example_layout = {
@@ -74,15 +53,15 @@ def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
                 "xanchor": "center",
                 "y": 1.02,
                 "yanchor": "bottom",
-                "buttons": get_buttons(bool(runs), bool(rides)),
+                "buttons": get_buttons(bool(len(runs)), bool(len(rides))),
             }
         ],
     }
 
     # Set default
     for scatter in scatters:
-        scatter.update(dict(visible=False))
-    scatters[0].update(dict(visible=True))
+        scatter.update({"visible": False})
+    scatters[0].update({"visible": True})
 
     fig = go.Figure(data=scatters, layout=example_layout)
 
@@ -90,52 +69,70 @@ def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
     return fig
 
 
-def get_compact_activities(
-    activity_iterator: Iterator[DetailedActivity],
-) -> list[CompactActivity]:
-    compact_activities: list[CompactActivity] = []
-
-    for activity in activity_iterator:
-        # If the activity is missing any of:
-        #   * start date
-        #   * average heartrate
-        #   * average speed, we can't color, or plot it, so discard these activities.
-        if (
-            activity.start_date is None
-            or activity.average_heartrate is None
-            or activity.average_speed is None
-        ):
-            continue
-
-        compact_activities.append(
-            CompactActivity(
-                type=activity.type,
-                start_date=activity.start_date,
-                average_heartrate=activity.average_heartrate,
-                average_speed=activity.average_speed,
-                distance=activity.distance,
-            )
-        )
-    return compact_activities
+def get_activities_to_plot(activities: ActivityFrame) -> ActivityFrame:
+    # If the activity is missing any of:
+    #   * start date
+    #   * average heartrate
+    #   * average speed, we can't color, or plot it, so discard these activities.
+    return activities.with_values(
+        "start_date", "average_heartrate", "average_speed"
+    ).sorted_by("start_date")
 
 
-def get_scatter_plot(
-    activity_type: ActivityType,
-    activities: list[CompactActivity],
+def plot_window(
+    activities: ActivityFrame, window: PlotWindow, max_points: int = MAX_PLOT_POINTS
 ) -> go.Figure:
+    """
+    Returns a figure with just the trace for one activity type, with only the
+    activities in a range of average heartrates, for when the plot has been
+    zoomed in. It's only a density plot if there are still more than
+    `max_points` of them.
+    """
+    activities = get_activities_to_plot(activities).of_type(window.activity_type)
+    average_heartrates = activities.df["average_heartrate"]
+    activities = activities.where(
+        (average_heartrates >= float(window.x_min))
+        & (average_heartrates <= float(window.x_max))
+    )
+
+    if not len(activities):
+        return go.Figure(data=[go.Scatter(x=[], y=[], mode="markers")])
+    return go.Figure(
+        data=[get_scatter_plot(window.activity_type, activities, max_points)]
+    )
+
+
+def get_scatter_plot(
+    activity_type: str,
+    activities: ActivityFrame,
+    max_points: int = MAX_PLOT_POINTS,
+) -> go.Scatter | go.Heatmap:
+    """
+    Returns a scatter with a marker for every activity, unless there are more
+    than `max_points` of them, in which case it's a heatmap of how many
+    activities there are around each heartrate and pace instead.
+    """
     speed_conversion_function = get_speed_conversion_function(activity_type)
 
-    average_heartrates: list[float] = []
-    average_paces: list[float] = []
-    for activity in activities:
-        speed = speed_conversion_function(activity.average_speed)
-        if speed is not None:
-            average_heartrates.append(activity.average_heartrate)
-            average_paces.append(speed)
+    # Activities which didn't move (like a treadmill run with no distance)
+    # don't have a pace, so drop them once here, so every array below lines up.
+    activities = activities.where(
+        speed_conversion_function(activities.df["average_speed"]).notna()
+    )
+    if not len(activities):
+        return go.Scatter(x=[], y=[], mode="markers")
+
+    if len(activities) > max_points:
+        return get_density_plot(activity_type, activities)
 
-    start_times = [activity.start_date for activity in activities]
-    start_timestamps = [int(start_time.timestamp()) for start_time in start_times]
-    distances_in_km = [activity.distance.m / 1000 for activity in activities]
+    average_heartrates = activities.df["average_heartrate"].to_list()
+    average_paces = speed_conversion_function(activities.df["average_speed"]).to_list()
+
+    start_times = activities.df["start_date"].to_list()
+    start_timestamps = (
+        activities.df["start_date"].to_numpy(dtype="datetime64[s]").astype(int).tolist()
+    )
+    distances_in_km = (activities.df["distance"] / 1000).to_list()
 
     # Scale by an arbitrary number to make this look better.
     scaled_distances_for_size = [d * 20 for d in distances_in_km]
@@ -156,18 +153,18 @@ def get_scatter_plot(
         y=average_paces,
         customdata=list(zip(distances_in_km, start_times)),
         mode="markers",
-        marker=dict(
-            size=scaled_distances_for_size,
-            color=start_timestamps,
-            showscale=True,  # Shows the colorbar
-            sizemode="area",
-            colorbar=dict(
-                title="Date of Activity",
-                tickmode="array",
-                ticktext=ticktext,
-                tickvals=tickvals,
-            ),
-        ),
+        marker={
+            "size": scaled_distances_for_size,
+            "color": start_timestamps,
+            "showscale": True,  # Shows the colorbar
+            "sizemode": "area",
+            "colorbar": {
+                "title": "Date of Activity",
+                "tickmode": "array",
+                "ticktext": ticktext,
+                "tickvals": tickvals,
+            },
+        },
         hovertemplate="Average Heartrate: %{x} bpm<br>"
         + get_hovertemplate_pace_formatting(activity_type)
         + "Distance: %{customdata[0]:.2f}km<br>"
@@ -176,16 +173,40 @@ def get_scatter_plot(
     )
 
 
+def get_density_plot(activity_type: str, activities: ActivityFrame) -> go.Heatmap:
+    """
+    The heatmap is marked as downsampled in its `meta`, so the frontend knows
+    to ask `plot_window` for the individual activities when it's zoomed in.
+    """
+    average_paces = get_speed_conversion_function(activity_type)(
+        activities.df["average_speed"]
+    )
+    density_bins = get_density_bins(activities.df["average_heartrate"], average_paces)
+
+    return go.Heatmap(
+        x=density_bins.x,
+        y=density_bins.y,
+        z=density_bins.counts,
+        colorscale="Viridis",
+        colorbar={"title": "Number of Activities"},
+        hovertemplate="Average Heartrate: %{x:.0f} bpm<br>"
+        + get_hovertemplate_pace_formatting(activity_type)
+        + "Number of Activities: %{z}<br>"
+        + "<extra></extra>",
+        meta={"activity_type": activity_type, "downsampled": True},
+    )
+
+
 def get_speed_conversion_function(
-    activity_type: ActivityType,
-) -> Callable[[float], Optional[Any]]:
+    activity_type: str,
+) -> Callable[[pd.Series], pd.Series]:
     if activity_type == "Run":
         return average_speed_to_mins_per_km
     else:
         return average_speed_to_kmph
 
 
-def get_hovertemplate_pace_formatting(activity_type: ActivityType) -> str:
+def get_hovertemplate_pace_formatting(activity_type: str) -> str:
     if activity_type == "Run":
         return "Average Pace: %{y|%-M:%S}/km<br>"
     else:
@@ -197,10 +218,10 @@ def get_buttons(runs: bool, rides: bool) -> list[Any]:
     buttons: list[dict[str, Any]] = []
     if runs:
         buttons.append(
-            dict(
-                label="Run",
-                method="update",
-                args=[
+            {
+                "label": "Run",
+                "method": "update",
+                "args": [
                     {"visible": [False] * num_activities_to_make_buttons_for},
                     {
                         "yaxis": {
@@ -209,15 +230,15 @@ def get_buttons(runs: bool, rides: bool) -> list[Any]:
                         }
                     },
                 ],
-            ),
+            },
         )
 
     if rides:
         buttons.append(
-            dict(
-                label="Ride",
-                method="update",
-                args=[
+            {
+                "label": "Ride",
+                "method": "update",
+                "args": [
                     {"visible": [False] * num_activities_to_make_buttons_for},
                     {
                         "yaxis": {
@@ -226,7 +247,7 @@ def get_buttons(runs: bool, rides: bool) -> list[Any]:
                         }
                     },
                 ],
-            ),
+            },
         )
 
     for i, button in enumerate(buttons):
@@ -237,8 +258,8 @@ def get_buttons(runs: bool, rides: bool) -> list[Any]:
 
 # For testing
 if __name__ == "__main__":
-    from backend.utils import local_storage
+    from backend.utils.s3 import get_activity_columns_from_s3
 
-    activity_iterator = local_storage.get_activity_iterator(94896104)
-    f = plot(activity_iterator)
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(94896104))
+    f = plot(activities)
     f.show()
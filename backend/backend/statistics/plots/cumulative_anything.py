@@ -1,56 +1,81 @@
 import dataclasses
 import datetime as dt
-import itertools
-from typing import Any, Callable, Iterator, Optional
+from typing import Any, Callable, Optional
 
+import numpy as np
 import plotly.graph_objects as go
-from stravalib import unit_helper as uh
-from stravalib.model import DetailedActivity, ActivityType
+from backend.statistics.utils.activity_frame import ActivityFrame
 
 ALL_ACTIVITIES = "All"
 
+# The attributes the cumulative tabs plot. They're all totalled together in one
+# go, and the result is shared between the tabs.
+CUMULATIVE_ATTRIBUTE_NAMES = (
+    "moving_time",
+    "distance",
+    "total_elevation_gain",
+    "kudos_count",
+)
+
+DAYS_IN_LEAP_YEAR = 366
+
 
 @dataclasses.dataclass
-class CompactActivity:
-    type: ActivityType
-    start_date_local: dt.datetime
-    activity_attribute: Any
+class CumulativeTotals:
+    """
+    The running total of some attributes over each year, for all activities and
+    for each activity type.
+
+    `activity_types` is ALL_ACTIVITIES followed by every activity type, and
+    `years` is every year with an activity, oldest first. For each attribute:
+        * totals[attribute][i, j, d] is the total of the attribute for
+          activity_types[i] from the start of years[j] up to and including
+          day d of that year.
+        * has_data[attribute][i, j] is whether any activities of
+          activity_types[i] in years[j] have a value for the attribute.
+    """
+
+    activity_types: list[str]
+    years: np.ndarray
+    totals: dict[str, np.ndarray]
+    has_data: dict[str, np.ndarray]
 
 
 def get_plot_function(
     activity_attribute_name: str,
-    conversion_function: Callable[[Any], Any],
+    conversion_function: Callable[[np.ndarray], np.ndarray],
     yaxis_title: str,
     plot_title_creator: Callable[[str], str],
-) -> Callable[[Iterator[DetailedActivity]], go.Figure]:
+) -> Callable[[ActivityFrame], go.Figure]:
     """
     Takes a few values to customize a tab, and returns a function that when
-    called with an iterator of activities, returns a plotly figure of a
-    cumulative plot about the attribute of interest.
+    called with the activities, returns a plotly figure of a cumulative plot
+    about the attribute of interest.
+
+    The conversion function is applied to the running totals, so it needs to be
+    a simple scaling, like converting meters to kilometers.
     """
+    attribute_names = (
+        CUMULATIVE_ATTRIBUTE_NAMES
+        if activity_attribute_name in CUMULATIVE_ATTRIBUTE_NAMES
+        else (activity_attribute_name,)
+    )
 
-    def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
-        compact_activities: list[CompactActivity] = get_compact_activities(
-            activity_attribute_name, activity_iterator, conversion_function
+    def plot(activities: ActivityFrame) -> go.Figure:
+        cumulative_totals = activities.get_shared_result(
+            ("cumulative_totals", attribute_names),
+            lambda: get_cumulative_totals(activities, attribute_names),
         )
+        totals = conversion_function(cumulative_totals.totals[activity_attribute_name])
+        has_data = cumulative_totals.has_data[activity_attribute_name]
 
-        # Get set of all the different types of activities this person has logged.
-        activity_types = set(activity.type for activity in compact_activities)
-
-        all_plots: dict[ActivityType, dict[int, go.Scatter]] = {}
-
-        # Make plots for all activities
-        all_plots[ALL_ACTIVITIES] = plot_graph(compact_activities, yaxis_title)
-
-        # Make plots for specific activities
-        for activity_type in activity_types:
+        all_plots: dict[str, dict[int, go.Scatter]] = {}
+        for i, activity_type in enumerate(cumulative_totals.activity_types):
+            if activity_type != ALL_ACTIVITIES and not has_data[i].any():
+                continue
             all_plots[activity_type] = plot_graph(
-                list(
-                    filter(
-                        lambda activity: activity.type == activity_type,
-                        compact_activities,
-                    )
-                ),
+                cumulative_totals.years[has_data[i]],
+                totals[i][has_data[i]],
                 yaxis_title,
             )
 
@@ -67,59 +92,95 @@ def get_plot_function(
     return plot
 
 
-def get_compact_activities(
-    activity_attribute_name: str,
-    activity_iterator: Iterator[DetailedActivity],
-    conversion_function: Callable[[Any], Any],
-) -> list[CompactActivity]:
-    return [
-        CompactActivity(
-            type=activity.type,
-            start_date_local=activity.start_date_local,
-            activity_attribute=conversion_function(
-                getattr(activity, activity_attribute_name)
-            ),
+def get_cumulative_totals(
+    activities: ActivityFrame,
+    attribute_names: tuple[str, ...] = CUMULATIVE_ATTRIBUTE_NAMES,
+) -> CumulativeTotals:
+    """
+    Calculates the running totals of every attribute, for every activity type
+    and every year, all at once.
+
+    Each activity is given a bin for its (activity type, year, day of year),
+    and a single `np.bincount` per attribute adds up the activities in every
+    bin. Then a `np.cumsum` along the days turns the daily totals into running
+    totals. Activities are counted once under their own type, and once under
+    ALL_ACTIVITIES.
+    """
+    df = activities.with_values("start_date_local").df
+
+    activity_types = list(df["type"].cat.remove_unused_categories().cat.categories)
+    # Codes are -1 for activities without a type, which only count towards
+    # ALL_ACTIVITIES.
+    type_codes = df["type"].cat.remove_unused_categories().cat.codes.to_numpy()
+
+    years = df["start_date_local"].dt.year.to_numpy()
+    unique_years, year_indices = np.unique(years, return_inverse=True)
+    days = df["start_date_local"].dt.dayofyear.to_numpy() - 1
+
+    num_types = len(activity_types) + 1
+    num_years = len(unique_years)
+
+    # Put every activity in two (type, year) groups: ALL_ACTIVITIES (index 0),
+    # and its own type (index code + 1), if it has one.
+    has_type = type_codes >= 0
+    group_indices = np.concatenate(
+        [year_indices, (type_codes[has_type] + 1) * num_years + year_indices[has_type]]
+    )
+    group_days = np.concatenate([days, days[has_type]])
+    bin_indices = group_indices * DAYS_IN_LEAP_YEAR + group_days
+
+    totals: dict[str, np.ndarray] = {}
+    has_data: dict[str, np.ndarray] = {}
+    for attribute_name in attribute_names:
+        values = df[attribute_name].to_numpy(dtype=np.float64)
+        values = np.concatenate([values, values[has_type]])
+        has_value = ~np.isnan(values)
+
+        daily_totals = np.bincount(
+            bin_indices[has_value],
+            weights=values[has_value],
+            minlength=num_types * num_years * DAYS_IN_LEAP_YEAR,
+        )
+        totals[attribute_name] = np.cumsum(
+            daily_totals.reshape(num_types, num_years, DAYS_IN_LEAP_YEAR), axis=2
+        )
+        has_data[attribute_name] = (
+            np.bincount(
+                group_indices[has_value], minlength=num_types * num_years
+            ).reshape(num_types, num_years)
+            > 0
         )
-        for activity in activity_iterator
-        if activity.start_date_local is not None
-        and getattr(activity, activity_attribute_name) is not None
-    ]
+
+    return CumulativeTotals(
+        activity_types=[ALL_ACTIVITIES] + activity_types,
+        years=unique_years,
+        totals=totals,
+        has_data=has_data,
+    )
 
 
 def plot_graph(
-    activities: list[CompactActivity], yaxis_title: str
+    years: np.ndarray, year_totals: np.ndarray, yaxis_title: str
 ) -> dict[int, go.Scatter]:
-    graph_data: dict[int, list[float]] = {}
-    for activity in activities:
-        activity_datetime = activity.start_date_local
-        year = activity_datetime.year
-        year_data = graph_data.get(year, [0.0] * 366)
-        year_data[
-            activity_datetime.timetuple().tm_yday - 1
-        ] += activity.activity_attribute
-        graph_data[year] = year_data
-
-    for year, year_data in graph_data.items():
-        graph_data[year] = list(itertools.accumulate(year_data))
-
+    """
+    Makes a scatter for each year, given the running totals for each year.
+    """
     # Remove additional zeros from end of data if year is the current year
     current_year = dt.datetime.now().year
     current_day = dt.datetime.now().timetuple().tm_yday - 1
-    if current_year in graph_data:
-        graph_data[current_year] = graph_data[current_year][0:current_day]
 
     dd = {}
 
     # We want to iterate through the data by year, in reverse chronological order.
     # This ensures the scatter plots are generated in order.
-    for year, year_data in sorted(graph_data.items(), key=lambda t: t[0], reverse=True):
+    for year, year_data in zip(years[::-1].tolist(), year_totals[::-1]):
+        if year == current_year:
+            year_data = year_data[0:current_day]
+
         dd[year] = go.Scatter(
-            x=list(range(1, len(year_data) + 1)),
+            x=np.arange(1, len(year_data) + 1),
             y=year_data,
-            customdata=tuple(
-                dt.datetime(year, 1, 1) + dt.timedelta(days=i)
-                for i in range(len(year_data))
-            ),
+            customdata=np.datetime64(f"{year:04d}-01-01") + np.arange(len(year_data)),
             hovertemplate="<b>Date: %{customdata|%d %b %Y}</b><br>"
             + f"<b>{yaxis_title}</b>: %{{y:.0f}}<br>",
         )
@@ -135,7 +196,7 @@ def get_title_for_activity_type(activity_type: Optional[str]) -> str:
 
 
 def get_figure_data_from_all_activity_data(
-    all_data: dict[ActivityType, dict[int, go.Scatter]]
+    all_data: dict[str, dict[int, go.Scatter]],
 ) -> list[go.Scatter]:
     figure_data: list[go.Scatter] = []
 
@@ -149,7 +210,7 @@ def get_figure_data_from_all_activity_data(
 
 
 def get_layout_from_all_activity_data(
-    all_data: dict[ActivityType, dict[int, go.Scatter]],
+    all_data: dict[str, dict[int, go.Scatter]],
     yaxis_title: str,
     plot_title_creator: Callable[[str], str],
 ) -> dict[str, Any]:
@@ -212,8 +273,8 @@ def get_layout_from_all_activity_data(
 
 
 def get_visible_array(
-    all_data: dict[ActivityType, dict[int, go.Scatter]],
-    activity_type_button: ActivityType,
+    all_data: dict[str, dict[int, go.Scatter]],
+    activity_type_button: str,
 ) -> list[bool]:
     visibility_list = []
 
@@ -224,35 +285,33 @@ def get_visible_array(
     return visibility_list
 
 
-def conversion_function_for_timedeltas(attribute_value: dt.timedelta) -> float:
+def conversion_function_for_timedeltas(attribute_values: np.ndarray) -> np.ndarray:
     """
-    Takes the moving_time timedelta and converts it to a float that represents
-    hours.
+    Takes the moving times in seconds and converts them to floats that
+    represent hours.
     """
-    return attribute_value.total_seconds() / 3600
+    return attribute_values / 3600
 
 
-def conversion_function_for_distance_to_km(attribute_value: uh._Quantity) -> uh._Quantity:
+def conversion_function_for_distance_to_km(attribute_values: np.ndarray) -> np.ndarray:
     """
-    Converts a uh._Quantity representing meters into a float representing
-    kilometers.
+    Converts distances in meters into kilometers.
     """
-    return uh.kilometers(attribute_value)
+    return attribute_values / 1000
 
 
-def conversion_function_for_distance_to_m(attribute_value: uh._Quantity) -> uh._Quantity:
+def conversion_function_for_distance_to_m(attribute_values: np.ndarray) -> np.ndarray:
     """
-    Converts a uh._Quantity representing meters into a float representing
-    meters.
+    Distances are already in meters, so this does nothing.
     """
-    return uh.meters(attribute_value)
+    return attribute_values
 
 
-def conversion_function_for_int(attribute_value: int) -> float:
+def conversion_function_for_int(attribute_values: np.ndarray) -> np.ndarray:
     """
     The most boring conversion function. It does nothing.
     """
-    return float(attribute_value)
+    return attribute_values.astype(float)
 
 
 def get_title_for_cumulative_time_plot(activity_type: str) -> str:
@@ -273,14 +332,14 @@ def get_title_for_cumulative_kudos_plot(activity_type: str) -> str:
 
 # For testing
 if __name__ == "__main__":
-    from backend.utils import local_storage
+    from backend.utils.s3 import get_activity_columns_from_s3
 
-    activity_iterator = local_storage.get_activity_iterator(94896104)
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(94896104))
     plot_function = get_plot_function(
         "moving_time",
         conversion_function_for_timedeltas,
         "Hours",
         get_title_for_cumulative_time_plot,
     )
-    fig = plot_function(activity_iterator)
+    fig = plot_function(activities)
     fig.show()
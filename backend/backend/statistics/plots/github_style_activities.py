@@ -1,57 +1,104 @@
-import datetime as dt
-from collections import Counter
-from pathlib import Path
-from typing import Iterator
+"""
+A GitHub style calendar heatmap, with one square for every day of every year
+you've been active.
 
+The value for every day is added up in one go with `np.bincount` over how many
+days each activity is after the 1st of January of the first year, straight
+into an array with a slot for every day, so there's no per-day Python at all.
+"""
+
+import dataclasses
+from typing import Callable, Optional
+
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from backend.exceptions import UserVisibleException
+from backend.statistics.utils.activity_frame import ActivityFrame
 from plotly_calplot import calplot
-from stravalib.model import DetailedActivity
 
 CMAP = "YlGn"
 
 
-def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
-    activity_dates = [activity.start_date_local for activity in activity_iterator]
-
-    if not activity_dates:
-        raise UserVisibleException(
-            "Can't find any activities, so can't generate this plot."
-        )
+@dataclasses.dataclass
+class CalendarValue:
+    # The name of the column in the calendar data.
+    column_name: str
+    # Shown when hovering over a day.
+    name: str
+    # Returns how much each activity adds to its day, or None to just count
+    # the activities.
+    get_activity_values: Optional[Callable[[pd.DataFrame], pd.Series]]
 
-    earliest_activity = min(activity_dates)
-    latest_activity = max(activity_dates)
 
-    activity_counter = Counter(
-        dt.datetime(activity_date.year, activity_date.month, activity_date.day)
-        for activity_date in activity_dates
-    )
+CALENDAR_VALUES: dict[str, CalendarValue] = {
+    "count": CalendarValue("num_activities", "Activities", None),
+    "distance": CalendarValue(
+        "distance_km", "Distance (km)", lambda df: df["distance"] / 1000
+    ),
+    "moving_time": CalendarValue(
+        "moving_time_hours", "Moving Time (hours)", lambda df: df["moving_time"] / 3600
+    ),
+}
 
-    earliest_day = dt.datetime(earliest_activity.year, 1, 1)
-    latest_day = dt.datetime(latest_activity.year, 12, 31)
-
-    data = []
-    day = earliest_day
-    while day <= latest_day:
-        data.append(
-            {
-                "date": day,
-                "num_activities": activity_counter[day],
-            }
-        )
-        day += dt.timedelta(days=1)
 
-    df = pd.DataFrame(data)
+def plot(activities: ActivityFrame, colour_by: str = "count") -> go.Figure:
+    """
+    `colour_by` is one of the keys of `CALENDAR_VALUES`: the number of
+    activities, or the total distance or moving time on each day.
+    """
+    calendar_value = CALENDAR_VALUES[colour_by]
+    df = get_calendar_data(activities, calendar_value)
 
     space_between_plots = get_space_between_plots(df)
 
     fig = calplot(
-        df, x="date", y="num_activities", space_between_plots=space_between_plots
+        df,
+        x="date",
+        y=calendar_value.column_name,
+        name=calendar_value.name,
+        space_between_plots=space_between_plots,
     )
     return fig
 
 
+def get_calendar_data(
+    activities: ActivityFrame, calendar_value: CalendarValue
+) -> pd.DataFrame:
+    """
+    Returns a DataFrame with a row for every day from the 1st of January of the
+    first year with an activity, to the 31st of December of the last, and the
+    total value of the activities on each day.
+    """
+    activities = activities.with_values("start_date_local")
+
+    if not len(activities):
+        raise UserVisibleException(
+            "Can't find any activities, so can't generate this plot."
+        )
+
+    days = activities.df["start_date_local"].to_numpy(dtype="datetime64[D]")
+    first_day = days.min().astype("datetime64[Y]").astype("datetime64[D]")
+    after_last_day = (days.max().astype("datetime64[Y]") + 1).astype("datetime64[D]")
+
+    weights = None
+    if calendar_value.get_activity_values is not None:
+        weights = calendar_value.get_activity_values(activities.df).fillna(0).to_numpy()
+
+    num_days = (after_last_day - first_day).astype(np.int64)
+    totals = np.bincount(
+        (days - first_day).astype(np.int64), weights=weights, minlength=num_days
+    )
+
+    return pd.DataFrame(
+        {
+            # pandas doesn't do days as a datetime unit, so use its default.
+            "date": np.arange(first_day, after_last_day).astype("datetime64[ns]"),
+            calendar_value.column_name: totals,
+        }
+    )
+
+
 def get_space_between_plots(df: pd.DataFrame) -> float:
     """
     If we have a huge number of plots, we need to reduce the spacing between
@@ -63,8 +110,8 @@ def get_space_between_plots(df: pd.DataFrame) -> float:
 
 # For testing
 if __name__ == "__main__":
-    from backend.utils import local_storage
+    from backend.utils.s3 import get_activity_columns_from_s3
 
-    activity_iterator = local_storage.get_activity_iterator(94896104)
-    f = plot(activity_iterator)
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(94896104))
+    f = plot(activities)
     f.show()
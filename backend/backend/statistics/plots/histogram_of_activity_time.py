@@ -1,77 +1,200 @@
+"""
+A histogram of the times of day that activities start at, stacked by activity
+type.
+
+The start times are binned here rather than by plotly in the browser, so the
+frontend only gets a handful of counts per activity type instead of every
+single start time. Everything is counted once in the smallest bins, split by
+day of the week, and the wider bins and per-day counts are just sums of those.
+"""
+
 import dataclasses
-import datetime as dt
-from typing import Iterator
+from typing import Sequence
 
+import numpy as np
 import plotly.graph_objects as go
 from backend.exceptions import UserVisibleException
-from stravalib.model import DetailedActivity, ActivityType
+from backend.statistics.utils.activity_frame import ActivityFrame
+
+MINUTES_PER_DAY = 24 * 60
+DAYS_OF_THE_WEEK = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# Every bin width has to divide evenly into the smallest one.
+BASE_BIN_WIDTH_MINUTES = 15
+BIN_WIDTHS_MINUTES = (15, 30, 60)
+DEFAULT_BIN_WIDTH_MINUTES = 15
 
 
 @dataclasses.dataclass
-class CompactActivity:
-    type: ActivityType
-    start_date_local: dt.datetime
+class TimeOfDayCounts:
+    activity_types: list[str]
+    # counts[activity type, day of the week, bin] is the number of activities
+    # of that type, on that day of the week (Monday first), starting in that
+    # bin of `bin_width_minutes`.
+    counts: np.ndarray
+    bin_width_minutes: int
 
+    def with_bin_width(self, bin_width_minutes: int) -> "TimeOfDayCounts":
+        """
+        Returns the same counts, but in wider bins.
+        """
+        if bin_width_minutes % self.bin_width_minutes:
+            raise ValueError(
+                f"Can't turn {self.bin_width_minutes} minute bins into "
+                f"{bin_width_minutes} minute bins."
+            )
+        bins_per_bin = bin_width_minutes // self.bin_width_minutes
+        num_types, num_days, num_bins = self.counts.shape
+        return TimeOfDayCounts(
+            activity_types=self.activity_types,
+            counts=self.counts.reshape(
+                num_types, num_days, num_bins // bins_per_bin, bins_per_bin
+            ).sum(axis=3),
+            bin_width_minutes=bin_width_minutes,
+        )
 
-def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
-    compact_activities: list[CompactActivity] = get_compact_activities(
-        activity_iterator
-    )
 
-    if not compact_activities:
+def plot(
+    activities: ActivityFrame,
+    bin_widths_minutes: Sequence[int] = BIN_WIDTHS_MINUTES,
+    default_bin_width_minutes: int = DEFAULT_BIN_WIDTH_MINUTES,
+) -> go.Figure:
+    activities = activities.with_values("start_date_local", "type")
+
+    if not len(activities):
         raise UserVisibleException("No Data")
 
-    activity_types = list(
-        sorted(set(activity.type for activity in compact_activities), reverse=True)
-    )
+    base_counts = get_time_of_day_counts(activities)
 
-    histograms: list[go.Histogram] = []
-    for activity_type in activity_types:
-        histograms.append(
-            go.Histogram(
-                x=[
-                    dt.datetime.combine(
-                        date=dt.date(2000, 1, 1), time=activity.start_date_local.time()
-                    )
-                    for activity in compact_activities
-                    if activity.type == activity_type
-                ],
-                nbinsx=24 * 4,
-                name=activity_type,
-                hovertemplate="<b>Time:</b> %{x}<br><b>Number of Activities:</b> %{y}",
+    bars: list[tuple[int, go.Bar]] = []
+    for bin_width_minutes in bin_widths_minutes:
+        bars.extend(
+            (bin_width_minutes, bar)
+            for bar in get_bars(
+                base_counts.with_bin_width(bin_width_minutes),
+                visible=bin_width_minutes == default_bin_width_minutes,
             )
         )
 
     return go.Figure(
-        data=histograms,
-        layout=dict(
-            xaxis_title="Time of Day",
-            yaxis_title="Frequency",
-            title="Histogram of Activity Start Times",
-            barmode="stack",
-            xaxis={"tickformat": "%H:%M"},
-            title_x=0.5,
-        ),
+        data=[bar for _, bar in bars],
+        layout={
+            "xaxis_title": "Time of Day",
+            "yaxis_title": "Frequency",
+            "title": "Histogram of Activity Start Times",
+            "barmode": "stack",
+            "bargap": 0,
+            "xaxis": {"tickformat": "%H:%M"},
+            "title_x": 0.5,
+            "updatemenus": [
+                {
+                    "type": "buttons",
+                    "active": list(bin_widths_minutes).index(default_bin_width_minutes),
+                    "direction": "left",
+                    "showactive": True,
+                    "x": 0.5,
+                    "xanchor": "center",
+                    "y": 1.04,
+                    "yanchor": "middle",
+                    "buttons": [
+                        {
+                            "label": f"{bin_width_minutes} mins",
+                            "method": "update",
+                            "args": [
+                                {
+                                    "visible": [
+                                        bar_bin_width_minutes == bin_width_minutes
+                                        for bar_bin_width_minutes, _ in bars
+                                    ]
+                                }
+                            ],
+                        }
+                        for bin_width_minutes in bin_widths_minutes
+                    ],
+                }
+            ],
+        },
+    )
+
+
+def get_time_of_day_counts(
+    activities: ActivityFrame, bin_width_minutes: int = BASE_BIN_WIDTH_MINUTES
+) -> TimeOfDayCounts:
+    """
+    Counts the activities of each type starting in each bin of the day, split
+    up by the day of the week, with a single `np.bincount`.
+    """
+    activities = activities.with_values("start_date_local", "type")
+    start_dates = activities.df["start_date_local"]
+    types = activities.df["type"].cat.remove_unused_categories()
+
+    num_types = len(types.cat.categories)
+    num_bins = MINUTES_PER_DAY // bin_width_minutes
+
+    minutes_of_day = start_dates.dt.hour * 60 + start_dates.dt.minute
+    bins = (minutes_of_day // bin_width_minutes).to_numpy()
+    days_of_the_week = start_dates.dt.dayofweek.to_numpy()
+    type_codes = types.cat.codes.to_numpy()
+
+    counts = np.bincount(
+        (type_codes * len(DAYS_OF_THE_WEEK) + days_of_the_week) * num_bins + bins,
+        minlength=num_types * len(DAYS_OF_THE_WEEK) * num_bins,
+    ).reshape(num_types, len(DAYS_OF_THE_WEEK), num_bins)
+
+    return TimeOfDayCounts(
+        activity_types=list(types.cat.categories),
+        counts=counts,
+        bin_width_minutes=bin_width_minutes,
     )
 
 
-def get_compact_activities(
-    activity_iterator: Iterator[DetailedActivity],
-) -> list[CompactActivity]:
-    return [
-        CompactActivity(
-            type=activity.type,
-            start_date_local=activity.start_date_local,
+def get_bars(time_of_day_counts: TimeOfDayCounts, visible: bool) -> list[go.Bar]:
+    """
+    Returns one bar chart of counts for each activity type. Hovering over a bar
+    shows how many of its activities started on each day of the week.
+    """
+    bin_width_minutes = time_of_day_counts.bin_width_minutes
+    num_bins = time_of_day_counts.counts.shape[2]
+
+    # Put every bin on the same day, so plotly shows them as times of day.
+    bin_starts = np.datetime64("2000-01-01T00:00") + np.arange(
+        0, num_bins * bin_width_minutes, bin_width_minutes
+    ).astype("timedelta64[m]")
+
+    hover_lines = "".join(
+        f"<br>{day}: %{{customdata[{i}]}}" for i, day in enumerate(DAYS_OF_THE_WEEK)
+    )
+
+    bars: list[go.Bar] = []
+    # Backwards, so that the first activity type alphabetically is stacked on
+    # top.
+    for i in reversed(range(len(time_of_day_counts.activity_types))):
+        counts_by_day = time_of_day_counts.counts[i]
+        bars.append(
+            go.Bar(
+                x=bin_starts,
+                y=counts_by_day.sum(axis=0),
+                customdata=counts_by_day.T,
+                # Make each bar cover its whole bin, rather than being centred
+                # on the start of it.
+                width=bin_width_minutes * 60 * 1000,
+                offset=0,
+                name=time_of_day_counts.activity_types[i],
+                visible=visible,
+                hovertemplate=(
+                    "<b>Time:</b> %{x|%H:%M}<br><b>Number of Activities:</b> %{y}"
+                    + hover_lines
+                ),
+            )
         )
-        for activity in activity_iterator
-        if activity.start_date_local is not None
-    ]
+
+    return bars
 
 
 # For testing
 if __name__ == "__main__":
-    from backend.utils import local_storage
+    from backend.utils.s3 import get_activity_columns_from_s3
 
-    activity_iterator = local_storage.get_activity_iterator(94896104)
-    f = plot(activity_iterator)
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(94896104))
+    f = plot(activities)
     f.show()
@@ -5,54 +5,53 @@ that you're getting faster.
 TODO: Marker color proportional to length of activity.
 """
 
-import dataclasses
-import datetime as dt
-import math
-from typing import Iterator
+from typing import Sequence
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from backend.exceptions import UserVisibleException
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.statistics.utils.average_speed_utils import get_y_axis_settings
-from stravalib import unit_helper as uh
-from stravalib.model import DetailedActivity, ActivityType
-
-
-@dataclasses.dataclass
-class CompactActivity:
-    type: ActivityType
-    average_speed: uh._Quantity
-    start_date_local: dt.datetime
-    moving_time: int
-
-
-def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
-    activities: list[CompactActivity] = get_list_of_compact_activities(
-        activity_iterator
-    )
-
-    if not activities:
+from backend.statistics.utils.downsampling import (
+    MAX_PLOT_POINTS,
+    get_lttb_indices,
+    to_numeric,
+)
+from backend.tabs.plot_tabs import PlotWindow
+
+# The lengths of the moving averages, in days. The default one is shown
+# straight away, and the others can be turned on by clicking them in the legend.
+MOVING_AVERAGE_WINDOWS_DAYS = (7, 30, 90)
+DEFAULT_MOVING_AVERAGE_WINDOW_DAYS = 30
+
+
+def plot(
+    activities: ActivityFrame,
+    moving_average_windows_days: Sequence[int] = MOVING_AVERAGE_WINDOWS_DAYS,
+    default_moving_average_window_days: int = DEFAULT_MOVING_AVERAGE_WINDOW_DAYS,
+    max_points: int = MAX_PLOT_POINTS,
+) -> go.Figure:
+    activities = get_activities_to_plot(activities)
+
+    if not len(activities):
         raise UserVisibleException("No data, so can't generate this plot.")
 
-    alphabetical_activity_types = sorted(
-        list(set(activity.type for activity in activities))
-    )
-
-    ordered_activities: dict[ActivityType, list[CompactActivity]] = {}
-    for activity_type in alphabetical_activity_types:
-        ordered_activities[activity_type] = sorted(
-            (activity for activity in activities if activity.type == activity_type),
-            key=lambda x: x.start_date_local,
+    ordered_activities: dict[str, ActivityFrame] = {}
+    for activity_type in activities.get_activity_types():
+        ordered_activities[activity_type] = activities.of_type(activity_type).sorted_by(
+            "start_date_local"
         )
 
-    data_scatters: list[tuple[ActivityType, go.Scatter]] = get_data_scatters(
-        ordered_activities
-    )
-    moving_average_scatters: list[tuple[ActivityType, go.Scatter]] = (
-        get_moving_average_scatters(ordered_activities, weighted=False)
+    data_scatters: list[tuple[str, go.Scatter]] = get_data_scatters(
+        ordered_activities, max_points
     )
-    weighted_moving_average_scatters: list[tuple[ActivityType, go.Scatter]] = (
-        get_moving_average_scatters(ordered_activities, weighted=True)
+    moving_average_scatters: list[tuple[str, int, go.Scatter]] = (
+        get_moving_average_scatters(
+            ordered_activities,
+            moving_average_windows_days,
+            default_moving_average_window_days,
+        )
     )
 
     layout = {
@@ -78,10 +77,20 @@ def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
                         method="update",
                         args=[
                             {
-                                "visible": get_list_of_falses_with_one_true(
-                                    len(data_scatters), i
-                                )
-                                * 3
+                                "visible": [
+                                    scatter_activity_type == activity_type
+                                    for scatter_activity_type, _ in data_scatters
+                                ]
+                                + [
+                                    get_moving_average_visibility(
+                                        scatter_activity_type == activity_type,
+                                        window_days
+                                        == default_moving_average_window_days,
+                                    )
+                                    for scatter_activity_type, window_days, _ in (
+                                        moving_average_scatters
+                                    )
+                                ]
                             },
                             {
                                 "yaxis": {
@@ -95,7 +104,7 @@ def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
                             },
                         ],
                     )
-                    for i, (activity_type, scatter) in enumerate(data_scatters)
+                    for activity_type, _ in data_scatters
                 ],
             },
         ],
@@ -103,8 +112,7 @@ def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
 
     fig = go.Figure(
         data=[scatter for _, scatter in data_scatters]
-        + [scatter for _, scatter in moving_average_scatters]
-        + [scatter for _, scatter in weighted_moving_average_scatters],
+        + [scatter for _, _, scatter in moving_average_scatters],
         layout=layout,
     )
 
@@ -114,18 +122,32 @@ def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
 
 
 def get_data_scatters(
-    ordered_activities: dict[ActivityType, list[CompactActivity]]
-) -> list[go.Figure]:
-    data_scatters: list[tuple[ActivityType, list[CompactActivity]]] = []
+    ordered_activities: dict[str, ActivityFrame],
+    max_points: int = MAX_PLOT_POINTS,
+) -> list[tuple[str, go.Scatter]]:
+    """
+    Returns a scatter of every activity's pace for each activity type. If an
+    activity type has more than `max_points` activities, it's thinned out to
+    `max_points` with LTTB, and marked as downsampled in its `meta`, so the
+    frontend knows to ask `plot_window` for every activity when zoomed in.
+    """
+    data_scatters: list[tuple[str, go.Scatter]] = []
 
     for i, (activity_type, activities) in enumerate(ordered_activities.items()):
         pace_conversion_function = get_y_axis_settings(
             activity_type
         ).conversion_function
-        x = [activity.start_date_local for activity in activities]
-        y = [
-            pace_conversion_function(activity.average_speed) for activity in activities
-        ]
+        x = activities.df["start_date_local"]
+        y = pace_conversion_function(activities.df["average_speed"])
+
+        meta = None
+        if len(activities) > max_points:
+            # Paces that can't be drawn anyway would just confuse LTTB.
+            x, y = x[y.notna()], y[y.notna()]
+            kept = get_lttb_indices(to_numeric(x), to_numeric(y), max_points)
+            x, y = x.iloc[kept], y.iloc[kept]
+            meta = {"activity_type": activity_type, "downsampled": True}
+
         data_scatters.append(
             (
                 activity_type,
@@ -135,6 +157,7 @@ def get_data_scatters(
                     y=y,
                     visible=(i == 0),
                     mode="markers",
+                    meta=meta,
                 ),
             )
         )
@@ -142,129 +165,178 @@ def get_data_scatters(
     return data_scatters
 
 
+def plot_window(
+    activities: ActivityFrame, window: PlotWindow, max_points: int = MAX_PLOT_POINTS
+) -> go.Figure:
+    """
+    Returns a figure with just the scatter of the activities of one type
+    between two dates, for when the plot has been zoomed in. It's only
+    downsampled if there are still more than `max_points` of them.
+    """
+    activities = get_activities_to_plot(activities).of_type(window.activity_type)
+    start_dates = activities.df["start_date_local"]
+    activities = activities.where(
+        (start_dates >= pd.Timestamp(window.x_min))
+        & (start_dates <= pd.Timestamp(window.x_max))
+    ).sorted_by("start_date_local")
+
+    data_scatters = get_data_scatters({window.activity_type: activities}, max_points)
+    return go.Figure(data=[scatter for _, scatter in data_scatters])
+
+
 def get_moving_average_scatters(
-    ordered_activities: dict[ActivityType, list[CompactActivity]], weighted: bool
-) -> list[go.Figure]:
-    scatters: list[go.Scatter] = []
+    ordered_activities: dict[str, ActivityFrame],
+    windows_days: Sequence[int],
+    default_window_days: int,
+) -> list[tuple[str, int, go.Scatter]]:
+    """
+    Returns the moving average lines for every activity type, along with the
+    activity type and the length of the moving average in days. There's a
+    plain moving average, and one weighted by the moving time of each activity.
+    """
+    scatters: list[tuple[str, int, go.Scatter]] = []
     for i, (activity_type, activities) in enumerate(ordered_activities.items()):
         pace_conversion_function = get_y_axis_settings(
             activity_type
         ).conversion_function
-        x = [activity.start_date_local for activity in activities]
-        y = [activity.average_speed.m for activity in activities]
-        moving_time = [
-            activity.moving_time if weighted else 1.0 for activity in activities
-        ]
-        moving_average_x, moving_average_y = generate_weighted_moving_average(
-            x, y, moving_time
-        )
-        converted_moving_average_y = [
-            pace_conversion_function(uh._Quantity(i, "m/s")) for i in moving_average_y
-        ]
-
-        scatters.append(
-            (
-                activity_type,
-                go.Scatter(
-                    name=f"30 Day {'Weighted ' if weighted else ''}Moving Average",
-                    x=moving_average_x,
-                    y=converted_moving_average_y,
-                    mode="lines",
-                    visible=(i == 0),
-                ),
+        datetimes = activities.df["start_date_local"].to_numpy()
+        speeds = activities.df["average_speed"].to_numpy()
+
+        for weighted in [False, True]:
+            weights = (
+                activities.df["moving_time"].to_numpy()
+                if weighted
+                else np.ones(len(activities))
             )
-        )
+            moving_averages = generate_weighted_moving_averages(
+                datetimes, speeds, weights, windows_days
+            )
+
+            for window_days, (x, y) in moving_averages.items():
+                weighted_label = "Weighted " if weighted else ""
+                name = f"{window_days} Day {weighted_label}Moving Average"
+                scatters.append(
+                    (
+                        activity_type,
+                        window_days,
+                        go.Scatter(
+                            name=name,
+                            x=x,
+                            y=pace_conversion_function(pd.Series(y)),
+                            mode="lines",
+                            visible=get_moving_average_visibility(
+                                i == 0, window_days == default_window_days
+                            ),
+                        ),
+                    )
+                )
 
     return scatters
 
 
-def generate_weighted_moving_average(
-    datetimes: list[dt.datetime], values: list[float], weights: list[float]
-) -> tuple[list[dt.datetime], list[float]]:
-    df = pd.DataFrame({"datetime": datetimes, "values": values, "weights": weights})
-    df = df.set_index("datetime")
+def get_moving_average_visibility(
+    is_activity_type_shown: bool, is_default_window: bool
+) -> bool | str:
+    """
+    Only the default moving average is drawn to begin with. The others are
+    added to the legend, so they can be clicked on to show them.
+    """
+    if not is_activity_type_shown:
+        return False
+    return True if is_default_window else "legendonly"
+
+
+def generate_weighted_moving_averages(
+    datetimes: np.ndarray,
+    values: np.ndarray,
+    weights: np.ndarray,
+    windows_days: Sequence[int],
+) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    """
+    Calculates centred, weighted moving averages of the values, for each of
+    the window lengths. A 30 day window covers 15 days either side of each day.
 
-    # Re-sample into days using the weights to average days with multiple activities.
-    resampled_weights = df["weights"].resample("D").sum()
-    resampled_values = (df["values"] * df["weights"]).resample(
-        "D"
-    ).sum() / resampled_weights
-    daily_data = pd.DataFrame(
-        {"values": resampled_values, "weights": resampled_weights}
+    The values and weights are added up into a dense series of days, and a
+    cumulative sum of those lets us get the sum over any window with a single
+    subtraction. So each moving average is just one pass over the days, no
+    matter how long the window is.
+    """
+    days = np.asarray(datetimes, dtype="datetime64[D]")
+    first_day = days.min()
+    day_offsets = (days - first_day).astype(np.int64)
+    num_days = int(day_offsets.max()) + 1
+
+    # Add up the values and weights for each day. The activities are counted
+    # too, so that we know exactly which windows are empty.
+    cumulative_weighted_values = get_padded_cumulative_sum(
+        np.bincount(day_offsets, weights=values * weights, minlength=num_days)
+    )
+    cumulative_weights = get_padded_cumulative_sum(
+        np.bincount(day_offsets, weights=weights, minlength=num_days)
     )
+    cumulative_counts = get_padded_cumulative_sum(
+        np.bincount(day_offsets, minlength=num_days)
+    )
+
+    dates = first_day + np.arange(num_days)
+    moving_averages: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+    for window_days in windows_days:
+        half_window = window_days // 2
+        window_starts = np.clip(np.arange(num_days) - half_window, 0, num_days)
+        window_ends = np.clip(np.arange(num_days) + half_window + 1, 0, num_days)
+
+        window_weighted_values = (
+            cumulative_weighted_values[window_ends]
+            - cumulative_weighted_values[window_starts]
+        )
+        window_weights = (
+            cumulative_weights[window_ends] - cumulative_weights[window_starts]
+        )
+        window_counts = (
+            cumulative_counts[window_ends] - cumulative_counts[window_starts]
+        )
 
-    # Iterate over the dates, calculating the weighted values for each window.
-    dates = []
-    values = []
-    for date in daily_data.index:
-        group = daily_data[date - dt.timedelta(days=15) : date + dt.timedelta(days=15)]
-        dates.append(date)
-        values.append(
-            (group["values"] * group["weights"]).sum() / group["weights"].sum()
+        moving_average = np.full(num_days, np.nan)
+        np.divide(
+            window_weighted_values,
+            window_weights,
+            out=moving_average,
+            where=(window_counts > 0) & (window_weights != 0),
         )
 
-    # Keep only 1 contiguous "None" row. A single "None" row is enough to stop plotly from joining the moving averages
-    # together over long gaps, we don't want to create extra data for nothing, so drop the multiples.
-    final_dates: list[dt.datetime] = []
-    final_values: list[float] = []
-    for date, value in zip(dates, values):
-        if (
-            len(final_values) != 0
-            and math.isnan(value)
-            and math.isnan(final_values[-1])
-        ):
-            continue
-        else:
-            final_dates.append(date)
-            final_values.append(value)
-
-    return (final_dates, final_values)
-
-
-def get_list_of_falses_with_one_true(len_list: int, index_of_true: int) -> list[bool]:
+        moving_averages[window_days] = drop_repeated_nans(dates, moving_average)
+
+    return moving_averages
+
+
+def get_padded_cumulative_sum(values: np.ndarray) -> np.ndarray:
     """
-    Helper to get a list like: [False, True, False, False] for parameters of (4, 1).
-    Used to get visibility of buttons.
+    Returns the cumulative sum with a zero at the start, so that the sum of
+    values[start:end] is cumulative_sum[end] - cumulative_sum[start].
     """
-    a = []
-    for i in range(len_list):
-        if i == index_of_true:
-            a.append(True)
-        else:
-            a.append(False)
-    return a
-
-
-def get_list_of_compact_activities(
-    activity_iterator: Iterator[DetailedActivity],
-) -> list[CompactActivity]:
+    return np.concatenate([np.zeros(1, dtype=values.dtype), np.cumsum(values)])
+
+
+def drop_repeated_nans(
+    dates: np.ndarray, values: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
     """
-    To save data, we don't want to load everything from every detailed activity. Just the information we need.
+    Keep only 1 contiguous "None" row. A single "None" row is enough to stop plotly from joining the moving averages
+    together over long gaps, we don't want to create extra data for nothing, so drop the multiples.
     """
-    compact_activities: list[CompactActivity] = []
-    for activity in activity_iterator:
-        # We don't want to include flagged activities
-        if activity.flagged:
-            continue
-
-        # We also can't generate this plot for activities were the start date or the average speed are None.
-        if activity.start_date_local is None or activity.average_speed is None:
-            continue
-
-        # We also can't generated weighted average lines if we're missing the moving time.
-        if activity.moving_time is None:
-            continue
-
-        compact_activities.append(
-            CompactActivity(
-                type=activity.type,
-                average_speed=activity.average_speed,
-                start_date_local=activity.start_date_local,
-                moving_time=activity.moving_time.total_seconds(),
-            )
-        )
+    is_nan = np.isnan(values)
+    is_repeated_nan = is_nan & np.concatenate([[False], is_nan[:-1]])
+    return dates[~is_repeated_nan], values[~is_repeated_nan]
+
 
-    return compact_activities
+def get_activities_to_plot(activities: ActivityFrame) -> ActivityFrame:
+    """
+    We don't want to include flagged activities. We also can't generate this plot for activities were the start date
+    or the average speed are missing, or generate weighted average lines if we're missing the moving time.
+    """
+    return activities.without_flagged().with_values(
+        "type", "start_date_local", "average_speed", "moving_time"
+    )
 
 
 def set_initial_y_axis(fig: go.Figure) -> None:
@@ -281,9 +353,9 @@ def set_initial_y_axis(fig: go.Figure) -> None:
 
 # For testing
 if __name__ == "__main__":
-    from backend.utils import local_storage
+    from backend.utils.s3 import get_activity_columns_from_s3
 
-    activity_iterator = local_storage.get_activity_iterator(94896104)
-    fig = plot(activity_iterator)
+    activities = ActivityFrame.from_columns(get_activity_columns_from_s3(94896104))
+    fig = plot(activities)
 
     fig.show()
@@ -1,16 +1,15 @@
-from typing import Iterator
-
 import pandas as pd
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.statistics.utils.strava_links import get_activity_url, get_link
-from stravalib.model import DetailedActivity
 
 
-def flagged_activities_table(activities: Iterator[DetailedActivity]) -> pd.DataFrame:
-    flagged_activities = [activity for activity in activities if activity.flagged]
+def flagged_activities_table(activities: ActivityFrame) -> pd.DataFrame:
+    flagged_activities = activities.where(activities.df["flagged"]).df
 
-    activity_names = [activity.name for activity in flagged_activities]
+    activity_names = flagged_activities["name"].to_list()
     activity_links = [
-        get_link(get_activity_url(activity.id)) for activity in flagged_activities
+        get_link(get_activity_url(activity_id))
+        for activity_id in flagged_activities["id"].to_list()
     ]
 
     return pd.DataFrame(
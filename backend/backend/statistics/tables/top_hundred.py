@@ -3,61 +3,132 @@ The idea is that this is a generic "top 100's" table creator for all Strava
 activities. I can simply say I want "a table of the top 100 longest runs" or
 "shortest runs" or "most kudosed" or "hottest" activities or whatever, and this
 code can handle getting that data, and displaying it later in a table.
+
+Every table made by `get_top_hundred_table_function` registers the query it
+needs. The first table to be generated works out the winners for every
+registered query at once, and the rest of the tables just look up their
+answer. Only the winners ever get turned into table rows and links.
 """
 
-from typing import Any, Callable, Iterator
+import dataclasses
+from typing import Callable, Iterable, Optional
 
+import numpy as np
 import pandas as pd
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.statistics.utils.strava_links import get_activity_url, get_link
-from stravalib import unit_helper as uh
-from stravalib.model import DetailedActivity, ActivityType
+
+TOP_K = 100
+
+
+@dataclasses.dataclass(frozen=True)
+class TopKQuery:
+    """
+    Asks for the `k` activities of `activity_type` (or of any type, if it's
+    None) with the largest (or smallest) values of `attribute_name`.
+    """
+
+    activity_type: Optional[str]
+    attribute_name: str
+    largest: bool = True
+    k: int = TOP_K
+
+
+# Every query a top 100 table has been made for.
+registered_top_k_queries: list[TopKQuery] = []
 
 
 def get_top_hundred_table_function(
-    activity_type: ActivityType,
+    activity_type: Optional[str],
     attribute_name: str,
     attribute_column_name: str,
-    attribute_conversion_function: Callable[[Any], Any],
-) -> Callable[[Iterator[DetailedActivity]], pd.DataFrame]:
-    def top_hundred_table_function(activities: Iterator[DetailedActivity]) -> pd.DataFrame:
-        activity_names = []
-        attribute_column = []
-        activity_links = []
-
-        for activity in activities:
-            if activity.type == activity_type:
-                activity_names.append(activity.name)
-                attribute_column.append(
-                    attribute_conversion_function(getattr(activity, attribute_name))
-                )
-                activity_links.append(get_link(get_activity_url(activity.id)))
+    attribute_conversion_function: Callable[[pd.Series], pd.Series],
+    largest: bool = True,
+) -> Callable[[ActivityFrame], pd.DataFrame]:
+    query = TopKQuery(activity_type, attribute_name, largest)
+    if query not in registered_top_k_queries:
+        registered_top_k_queries.append(query)
+
+    def top_hundred_table_function(activities: ActivityFrame) -> pd.DataFrame:
+        all_top_k_indices = activities.get_shared_result(
+            ("top_k_activity_indices", tuple(registered_top_k_queries)),
+            lambda: get_top_k_activity_indices(activities, registered_top_k_queries),
+        )
+        top_activities = activities.df.iloc[all_top_k_indices[query]]
 
         # Create a DataFrame with the specified attribute as a column
-        data = {
-            "Activity Name": activity_names,
-            attribute_column_name: attribute_column,
-            "Activity Link": activity_links,
-        }
-        df = pd.DataFrame(data)
+        attribute_column = attribute_conversion_function(top_activities[attribute_name])
+        df = pd.DataFrame(
+            {
+                "Rank": np.arange(1, len(top_activities) + 1),
+                "Activity Name": top_activities["name"].to_list(),
+                # Shorten the values
+                attribute_column_name: [f"{x:.2f}" for x in attribute_column],
+                "Activity Link": [
+                    get_link(get_activity_url(activity_id))
+                    for activity_id in top_activities["id"].to_list()
+                ],
+            }
+        )
+
+        return df
 
-        # Sort the df
-        df = df.sort_values(by=[attribute_column_name], ascending=False)
+    return top_hundred_table_function
 
-        # Only keep top 100
-        df = df.head(100)
 
-        # Add a rank column as the first column
-        df.insert(0, "Rank", df.reset_index().index + 1)
+def get_top_k_activity_indices(
+    activities: ActivityFrame, queries: Iterable[TopKQuery]
+) -> dict[TopKQuery, np.ndarray]:
+    """
+    Answers every query in one go, returning the positions (for `iloc`) of the
+    winning activities for each query, best first. Each attribute column and
+    each activity type's rows are only looked up once, no matter how many
+    queries use them.
+    """
+    df = activities.df
+    attribute_values: dict[str, np.ndarray] = {}
+    activity_type_rows: dict[Optional[str], np.ndarray] = {}
 
-        # Shorten the values
-        df[attribute_column_name] = df[attribute_column_name].apply(
-            lambda x: f"{x:.2f}"
-        )
+    top_k_indices: dict[TopKQuery, np.ndarray] = {}
+    for query in queries:
+        if query.attribute_name not in attribute_values:
+            attribute_values[query.attribute_name] = df[query.attribute_name].to_numpy(
+                dtype=np.float64
+            )
 
-        return df
+        if query.activity_type not in activity_type_rows:
+            activity_type_rows[query.activity_type] = (
+                np.arange(len(df))
+                if query.activity_type is None
+                else np.flatnonzero((df["type"] == query.activity_type).to_numpy())
+            )
 
-    return top_hundred_table_function
+        rows = activity_type_rows[query.activity_type]
+        values = attribute_values[query.attribute_name][rows]
+        top_k_indices[query] = rows[get_top_k_indices(values, query.k, query.largest)]
+
+    return top_k_indices
+
+
+def get_top_k_indices(values: np.ndarray, k: int, largest: bool = True) -> np.ndarray:
+    """
+    Returns the indices of the `k` largest (or smallest) values, best first.
+    Missing values are never picked, and winners with the same value are
+    ordered by whichever came first.
+
+    `np.argpartition` finds the k winners without sorting everything, so only
+    the winners themselves get sorted.
+    """
+    candidates = np.flatnonzero(~np.isnan(values))
+    keys = -values[candidates] if largest else values[candidates]
+
+    if len(candidates) > k:
+        winners = np.argpartition(keys, k - 1)[:k]
+        candidates = candidates[winners]
+        keys = keys[winners]
+
+    return candidates[np.lexsort((candidates, keys))]
 
 
-def distance_conversion_function_to_km(quantity: uh._Quantity) -> float:
-    return float(uh.kilometers(quantity).magnitude)
+def distance_conversion_function_to_km(distances: pd.Series) -> pd.Series:
+    return distances / 1000
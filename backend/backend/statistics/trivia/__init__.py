@@ -1 +1,13 @@
-from .trivia import TriviaProcessor, TriviaTidbitBase
+from .trivia import (
+    TriviaProcessor,
+    TriviaReduction,
+    TriviaReductionResult,
+    TriviaTidbitBase,
+)
+
+__all__ = [
+    "TriviaProcessor",
+    "TriviaReduction",
+    "TriviaReductionResult",
+    "TriviaTidbitBase",
+]
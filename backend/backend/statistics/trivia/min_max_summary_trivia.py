@@ -1,8 +1,12 @@
-from typing import Optional
+from typing import Optional, Sequence
 
-import stravalib.unit_helper as uh
-from backend.statistics.trivia import TriviaProcessor, TriviaTidbitBase
-from stravalib.model import DetailedActivity, ActivityType
+from backend.statistics.trivia import (
+    TriviaProcessor,
+    TriviaReduction,
+    TriviaReductionResult,
+    TriviaTidbitBase,
+)
+from stravalib.model import DetailedActivity
 
 
 class MinAttributeTidbit(TriviaTidbitBase):
@@ -10,30 +14,43 @@ class MinAttributeTidbit(TriviaTidbitBase):
     A type of tidbit that can calculate the min of any attribute for any activity type.
     """
 
-    def __init__(self, activity_type: ActivityType, attribute_name: str) -> None:
+    def __init__(self, activity_type: str, attribute_name: str) -> None:
         self.all_distances_zero: bool = True
 
         self.min_activity_id: Optional[int] = None
         self.attribute_name = attribute_name
-        self.min_attribute_value: Optional[uh._Quantity] = None
-        self.activity_type: Optional[ActivityType] = activity_type
+        self.min_attribute_value: Optional[float] = None
+        self.activity_type: str = activity_type
 
     def reset_tidbit(self) -> None:
         self.all_distances_zero = True
         self.min_activity_id = None
         self.min_attribute_value = None
 
+    def get_activity_types(self) -> Optional[Sequence[str]]:
+        return [self.activity_type]
+
+    def get_required_fields(self) -> Sequence[str]:
+        return [self.attribute_name]
+
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [
+            TriviaReduction(self.attribute_name, "min", self.activity_type),
+            TriviaReduction(self.attribute_name, "count_nonzero", self.activity_type),
+        ]
+
+    def process_reductions(self, results: list[TriviaReductionResult]) -> None:
+        minimum, num_nonzero = results
+        if minimum.activity is not None:
+            self.process_activity(minimum.activity)
+        self.all_distances_zero = num_nonzero.value == 0
+
     def process_activity(self, activity: DetailedActivity) -> None:
         attr_value = getattr(activity, self.attribute_name)
 
-        # If activity type is not correct, just return.
-        if activity.type != self.activity_type:
-            return
-
-        # If the distance is non-zero and non-null, then turn off the "all distances null" flag.
-        if attr_value is not None:
-            if attr_value != 0.0:
-                self.all_distances_zero = False
+        # If the distance is non-zero, then turn off the "all distances null" flag.
+        if attr_value != 0.0:
+            self.all_distances_zero = False
 
         if self.min_attribute_value is None or attr_value < self.min_attribute_value:
             self.min_attribute_value = attr_value
@@ -54,7 +71,7 @@ class MinAttributeTidbit(TriviaTidbitBase):
             return None
         else:
             # Round the magnitude to nearest meter
-            return f"{int(quantity.magnitude)} meters"
+            return f"{int(quantity)} meters"
 
     def get_activity_id(self) -> Optional[int]:
         return self.min_activity_id
@@ -65,31 +82,43 @@ class MaxAttributeTidbit(TriviaTidbitBase):
     A type of tidbit that can calculate the min of any attribute for any activity type.
     """
 
-    def __init__(self, activity_type: ActivityType, attribute_name: str) -> None:
+    def __init__(self, activity_type: str, attribute_name: str) -> None:
         self.all_distances_zero: bool = True
 
         self.max_activity_id: Optional[int] = None
         self.attribute_name = attribute_name
-        self.max_attribute_value: Optional[uh._Quantity] = None
-        self.activity_type: Optional[ActivityType] = activity_type
+        self.max_attribute_value: Optional[float] = None
+        self.activity_type: str = activity_type
 
     def reset_tidbit(self) -> None:
         self.all_distances_zero = True
         self.max_activity_id = None
         self.max_attribute_value = None
 
+    def get_activity_types(self) -> Optional[Sequence[str]]:
+        return [self.activity_type]
+
+    def get_required_fields(self) -> Sequence[str]:
+        return [self.attribute_name]
+
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [
+            TriviaReduction(self.attribute_name, "max", self.activity_type),
+            TriviaReduction(self.attribute_name, "count_nonzero", self.activity_type),
+        ]
+
+    def process_reductions(self, results: list[TriviaReductionResult]) -> None:
+        maximum, num_nonzero = results
+        if maximum.activity is not None:
+            self.process_activity(maximum.activity)
+        self.all_distances_zero = num_nonzero.value == 0
+
     def process_activity(self, activity: DetailedActivity) -> None:
         attr_value = getattr(activity, self.attribute_name)
 
-        # If activity type is not the specified type, just return.
-        if activity_type is not None:
-            if activity.type != self.activity_type:
-                return
-
-        # If the distance is non-zero and non-null, then turn off the "all distances null" flag.
-        if attr_value is not None:
-            if attr_value != 0.0:
-                self.all_distances_zero = False
+        # If the distance is non-zero, then turn off the "all distances null" flag.
+        if attr_value != 0.0:
+            self.all_distances_zero = False
 
         if self.max_attribute_value is None or attr_value > self.max_attribute_value:
             self.max_attribute_value = attr_value
@@ -110,7 +139,7 @@ class MaxAttributeTidbit(TriviaTidbitBase):
             return None
         else:
             # Round the magnitude to nearest meter
-            return f"{int(quantity.magnitude)} meters"
+            return f"{int(quantity)} meters"
 
     def get_activity_id(self) -> Optional[int]:
         return self.max_activity_id
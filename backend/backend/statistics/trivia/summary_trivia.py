@@ -1,70 +1,17 @@
 import datetime as dt
 from typing import Optional
 
-from backend.statistics.trivia import TriviaProcessor, TriviaTidbitBase
+import numpy as np
+from backend.statistics.trivia import (
+    TriviaProcessor,
+    TriviaReduction,
+    TriviaReductionResult,
+    TriviaTidbitBase,
+)
+from backend.statistics.utils.streaks import get_daily_streaks, get_weekly_streaks
 from stravalib.model import DetailedActivity
 
 
-class HottestActivityTidbit(TriviaTidbitBase):
-    def __init__(self) -> None:
-        self.activity_id: Optional[int] = None
-        self.hottest_temp: Optional[int] = None
-
-    def reset_tidbit(self) -> None:
-        self.activity_id = None
-        self.hottest_temp = None
-
-    def process_activity(self, activity: DetailedActivity) -> None:
-        if activity.average_temp is None:
-            return
-
-        if self.hottest_temp is None or self.hottest_temp < activity.average_temp:
-            self.activity_id = activity.id
-            self.hottest_temp = activity.average_temp
-
-    def get_tidbit(self) -> Optional[str]:
-        if self.hottest_temp:
-            return f"{self.hottest_temp} Celsius"
-        else:
-            return None
-
-    def get_description(self) -> str:
-        return "Highest Average Temperature"
-
-    def get_activity_id(self) -> Optional[int]:
-        return self.activity_id
-
-
-class ColdestActivityTidbit(TriviaTidbitBase):
-    def __init__(self) -> None:
-        self.activity_id: Optional[int] = None
-        self.coldest_temp: Optional[int] = None
-
-    def reset_tidbit(self) -> None:
-        self.activity_id = None
-        self.coldest_temp = None
-
-    def process_activity(self, activity: DetailedActivity) -> None:
-        if activity.average_temp is None:
-            return
-
-        if self.coldest_temp is None or self.coldest_temp > activity.average_temp:
-            self.activity_id = activity.id
-            self.coldest_temp = activity.average_temp
-
-    def get_tidbit(self) -> Optional[str]:
-        if self.coldest_temp:
-            return f"{self.coldest_temp} Celsius"
-        else:
-            return None
-
-    def get_description(self) -> str:
-        return "Lowest Average Temperature"
-
-    def get_activity_id(self) -> Optional[int]:
-        return self.activity_id
-
-
 class MostPeopleOnAGroupRunTidbit(TriviaTidbitBase):
     def __init__(self) -> None:
         self.activity_id: Optional[int] = None
@@ -74,7 +21,13 @@ class MostPeopleOnAGroupRunTidbit(TriviaTidbitBase):
         self.activity_id = None
         self.most_people = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("athlete_count", "max")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
+        if activity.athlete_count is None:
+            return
+
         if self.most_people is None or self.most_people < activity.athlete_count:
             self.activity_id = activity.id
             self.most_people = activity.athlete_count
@@ -101,6 +54,9 @@ class HighestHeartRateRecordedTidbit(TriviaTidbitBase):
         self.activity_id = None
         self.highest_max_heartrate = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("max_heartrate", "max")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
         if activity.max_heartrate is None:
             return
@@ -134,6 +90,9 @@ class LowestHeartRateRecordedTidbit(TriviaTidbitBase):
         self.activity_id = None
         self.lowest_max_heartrate = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("max_heartrate", "min")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
         if activity.max_heartrate is None:
             return
@@ -167,8 +126,11 @@ class HighestAverageHeartrateTidbit(TriviaTidbitBase):
         self.activity_id = None
         self.highest_average_heartrate = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("average_heartrate", "max")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
-        if activity.max_heartrate is None:
+        if activity.average_heartrate is None:
             return
 
         if (
@@ -200,8 +162,11 @@ class LowestAverageHeartrateTidbit(TriviaTidbitBase):
         self.activity_id = None
         self.lowest_average_heartrate = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("average_heartrate", "min")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
-        if activity.max_heartrate is None:
+        if activity.average_heartrate is None:
             return
 
         if (
@@ -233,7 +198,13 @@ class MostKudosedActivityTidbit(TriviaTidbitBase):
         self.activity_id = None
         self.max_kudos = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("kudos_count", "max")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
+        if activity.kudos_count is None:
+            return
+
         if self.max_kudos is None or activity.kudos_count > self.max_kudos:
             self.activity_id = activity.id
             self.max_kudos = activity.kudos_count
@@ -260,7 +231,13 @@ class FirstActivityRecordedTidbit(TriviaTidbitBase):
         self.activity_id = None
         self.activity_date = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("start_date_local", "min")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
+        if activity.start_date_local is None:
+            return
+
         if self.activity_date is None or self.activity_date > activity.start_date_local:
             self.activity_id = activity.id
             self.activity_date = activity.start_date_local
@@ -285,6 +262,12 @@ class TotalKudosRecievedTidbit(TriviaTidbitBase):
     def reset_tidbit(self) -> None:
         self.kudos_count = 0
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("kudos_count", "sum")]
+
+    def process_reductions(self, results: list[TriviaReductionResult]) -> None:
+        self.kudos_count = int(results[0].value)
+
     def process_activity(self, activity: DetailedActivity) -> None:
         if activity.kudos_count is not None:
             self.kudos_count += activity.kudos_count
@@ -305,6 +288,10 @@ class EarliestActivityTidbit(TriviaTidbitBase):
         self.earliest_activity_id = None
         self.time_of_earliest_activity = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        # Ties go to the later activity, just like process_activity.
+        return [TriviaReduction("start_time_of_day_local", "min", keep="last")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
         if activity.start_date_local is not None:
             activity_time = activity.start_date_local.time()
@@ -337,6 +324,10 @@ class LatestActivityTidbit(TriviaTidbitBase):
         self.latest_activity_id = None
         self.time_of_latest_activity = None
 
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        # Ties go to the later activity, just like process_activity.
+        return [TriviaReduction("start_time_of_day_local", "max", keep="last")]
+
     def process_activity(self, activity: DetailedActivity) -> None:
         if activity.start_date_local is not None:
             activity_time = activity.start_date_local.time()
@@ -362,66 +353,67 @@ class LatestActivityTidbit(TriviaTidbitBase):
 
 class MostConsecutiveDaysOfActivities(TriviaTidbitBase):
     def __init__(self) -> None:
-        self.date_list: list[dt.date] = []
+        self.dates: list[dt.date] | np.ndarray = []
 
     def reset_tidbit(self) -> None:
-        self.date_list = []
+        self.dates = []
+
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("start_day_local", "unique")]
+
+    def process_reductions(self, results: list[TriviaReductionResult]) -> None:
+        self.dates = results[0].value
 
     def process_activity(self, activity: DetailedActivity) -> None:
         if activity.start_date_local is not None:
-            self.date_list.append(activity.start_date_local.date())
+            self.dates.append(activity.start_date_local.date())
 
     def get_tidbit(self) -> Optional[str]:
-        # If there are no activities, just return None
-        if not self.date_list:
+        longest = get_daily_streaks(np.array(self.dates, dtype="datetime64[D]")).longest
+        if longest is None:
             return None
 
-        # Sort the date list in ascending order
-        self.date_list.sort()
+        return f"{longest.length} days ({longest.start} to {longest.end})"
+
+    def get_description(self) -> str:
+        return "Most Consecutive Days of Activities"
+
 
-        max_consecutive_days = 1
-        current_consecutive_days = 1
-        start_date = self.date_list[0]
-        end_date = self.date_list[0]
+class MostConsecutiveWeeksOfActivities(TriviaTidbitBase):
+    def __init__(self) -> None:
+        self.dates: list[dt.date] | np.ndarray = []
 
-        # Initialize variables to track the start and end of the longest consecutive days
-        max_start_date = self.date_list[0]
-        max_end_date = self.date_list[0]
+    def reset_tidbit(self) -> None:
+        self.dates = []
 
-        for i in range(1, len(self.date_list)):
-            # Calculate the difference between consecutive datetimes
-            time_difference = self.date_list[i] - self.date_list[i - 1]
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        return [TriviaReduction("start_day_local", "unique")]
 
-            # If there are multiple activities on the same day, just continue.
-            if time_difference == dt.timedelta(days=0):
-                continue
+    def process_reductions(self, results: list[TriviaReductionResult]) -> None:
+        self.dates = results[0].value
 
-            # Check if the difference is one day
-            if time_difference == dt.timedelta(days=1):
-                current_consecutive_days += 1
-                end_date = self.date_list[i]
-            else:
-                # If the difference is not one day, reset the current count
-                current_consecutive_days = 1
-                start_date = self.date_list[i]
-                end_date = self.date_list[i]
+    def process_activity(self, activity: DetailedActivity) -> None:
+        if activity.start_date_local is not None:
+            self.dates.append(activity.start_date_local.date())
 
-            # Update the maximum consecutive days count and dates if needed
-            if current_consecutive_days > max_consecutive_days:
-                max_consecutive_days = current_consecutive_days
-                max_start_date = start_date
-                max_end_date = end_date
+    def get_tidbit(self) -> Optional[str]:
+        longest = get_weekly_streaks(
+            np.array(self.dates, dtype="datetime64[D]")
+        ).longest
+        if longest is None:
+            return None
 
-        return f"{max_consecutive_days} days ({max_start_date} to {max_end_date})"
+        # The streak runs from the Monday of the first week to the Sunday of
+        # the last week.
+        last_day = longest.end + dt.timedelta(days=6)
+        return f"{longest.length} weeks ({longest.start} to {last_day})"
 
     def get_description(self) -> str:
-        return "Most Consecutive Days of Activities"
+        return "Most Consecutive Weeks of Activities"
 
 
 general_trivia = TriviaProcessor()
 
-general_trivia.register_tidbit(HottestActivityTidbit())
-general_trivia.register_tidbit(ColdestActivityTidbit())
 general_trivia.register_tidbit(MostPeopleOnAGroupRunTidbit())
 general_trivia.register_tidbit(HighestHeartRateRecordedTidbit())
 general_trivia.register_tidbit(LowestHeartRateRecordedTidbit())
@@ -433,3 +425,4 @@ general_trivia.register_tidbit(EarliestActivityTidbit())
 general_trivia.register_tidbit(LatestActivityTidbit())
 general_trivia.register_tidbit(TotalKudosRecievedTidbit())
 general_trivia.register_tidbit(MostConsecutiveDaysOfActivities())
+general_trivia.register_tidbit(MostConsecutiveWeeksOfActivities())
@@ -1,13 +1,56 @@
+import dataclasses
 from abc import ABC, abstractmethod
-from typing import Iterator, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
 
+import numpy as np
+import pandas as pd
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.statistics.utils.strava_links import (
     get_activity_url,
     get_link,
     get_segment_url,
 )
 from backend.tabs.table_tab import LinkCell
-from stravalib.model import DetailedActivity
+from stravalib.model import DetailedActivity, SummaryActivity
+
+# Columns which tidbits can reduce over that aren't stored directly, and how to
+# calculate them from the frame.
+DERIVED_COLUMNS: dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    "start_time_of_day_local": lambda df: (
+        df["start_date_local"] - df["start_date_local"].dt.normalize()
+    ),
+    "start_day_local": lambda df: df["start_date_local"].dt.normalize(),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class TriviaReduction:
+    """
+    A single reduction over one column of the activities, optionally only over
+    activities of one type. `operation` is one of:
+        * "min" / "max": finds the activity with the smallest / largest value.
+          `keep` says whether the "first" or "last" activity wins a tie.
+        * "sum": adds up all the values.
+        * "count_nonzero": counts the values which aren't zero.
+        * "unique": all the different values, sorted, as a NumPy array.
+    Missing values are always ignored.
+    """
+
+    column_name: str
+    operation: str
+    activity_type: Optional[str] = None
+    keep: str = "first"
+
+
+@dataclasses.dataclass
+class TriviaReductionResult:
+    """
+    The answer to a `TriviaReduction`. For "min" and "max", `activity` is the
+    winning activity, and both are None if there were no values at all.
+    """
+
+    value: Any
+    activity: Optional[SummaryActivity] = None
 
 
 class TriviaTidbitBase(ABC):
@@ -25,9 +68,47 @@ class TriviaTidbitBase(ABC):
         """
         The function that is called with each activity once, expecting this
         class to store all info required to generate the tidbit of information.
+        Only activities matching `get_activity_types` and
+        `get_required_fields` are passed in.
         """
         pass
 
+    def get_activity_types(self) -> Optional[Sequence[str]]:
+        """
+        The activity types this tidbit cares about. The processor only passes
+        activities of these types to the tidbit, so a tidbit about runs never
+        even sees a ride. Returns None if the tidbit wants every activity.
+        """
+        return None
+
+    def get_required_fields(self) -> Sequence[str]:
+        """
+        The fields an activity needs to have a value for (IE: not None) to be
+        any use to this tidbit. Activities missing any of them are skipped.
+        """
+        return ()
+
+    def get_reductions(self) -> Optional[list[TriviaReduction]]:
+        """
+        Lots of tidbits are really just "the activity with the biggest X". If a
+        tidbit can be worked out from a few reductions over the columns of all
+        the activities, it returns them here, and the processor can calculate
+        it for a whole `ActivityFrame` at once instead of activity by
+        activity. Returns None if the tidbit needs to see every activity.
+        """
+        return None
+
+    def process_reductions(self, results: list[TriviaReductionResult]) -> None:
+        """
+        Called with the results of `get_reductions`, in the same order, instead
+        of `process_activity` being called for every activity. By default each
+        winning activity is just processed as normal, which is all a tidbit
+        that keeps the most extreme activity needs.
+        """
+        for result in results:
+            if result.activity is not None:
+                self.process_activity(result.activity)
+
     @abstractmethod
     def get_tidbit(self) -> Optional[str]:
         """
@@ -92,29 +173,117 @@ class TriviaProcessor:
     """
     The trivia processor processes all the individual tidbits of trivia,
     and returns them all as a list.
+
+    Rather than handing every activity to every tidbit (most of which would
+    just return straight away because it's the wrong activity type), the
+    tidbits are indexed by the activity types they care about. Each activity
+    is only handed to the tidbits for its type, grouped by the fields they
+    need, so each group's fields are only checked once per activity.
     """
 
     def __init__(self) -> None:
         self.tidbits: list[TriviaTidbitBase] = []
 
+        # Activity type -> [(required fields, tidbits needing those fields)].
+        # Built lazily the first time each type is seen, since most athletes
+        # only do a handful of the activity types.
+        self.tidbit_groups_by_type: dict[
+            Optional[str], list[tuple[Sequence[str], list[TriviaTidbitBase]]]
+        ] = {}
+
     def register_tidbit(self, tidbit: TriviaTidbitBase) -> None:
         self.tidbits.append(tidbit)
+        self.tidbit_groups_by_type = {}
 
     def get_data(
         self, activities: Iterator[DetailedActivity]
     ) -> list[tuple[str, str, LinkCell | None]]:
-        trivia: list[tuple[str, str, LinkCell | None]] = []
+        self.reset()
+
+        for activity in activities:
+            self.process_activity(activity)
 
-        # Reset tidbits
+        return self.get_results()
+
+    def reset(self) -> None:
         for tidbit in self.tidbits:
             tidbit.reset_tidbit()
 
-        # Process activities
-        for activity in activities:
-            for tidbit in self.tidbits:
+    def process_activity(self, activity: DetailedActivity) -> None:
+        activity_type = activity.type.root if activity.type is not None else None
+
+        tidbit_groups = self.tidbit_groups_by_type.get(activity_type)
+        if tidbit_groups is None:
+            tidbit_groups = self.get_tidbit_groups(activity_type)
+            self.tidbit_groups_by_type[activity_type] = tidbit_groups
+
+        for required_fields, tidbits in tidbit_groups:
+            if any(getattr(activity, field, None) is None for field in required_fields):
+                continue
+            for tidbit in tidbits:
                 tidbit.process_activity(activity)
 
-        # Get results
+    def get_data_from_frame(
+        self, activities: ActivityFrame
+    ) -> list[tuple[str, str, LinkCell | None]]:
+        """
+        The same as `get_data`, but works out every tidbit that has reductions
+        with a handful of grouped pandas operations over the whole frame. Only
+        the tidbits without reductions are still processed activity by
+        activity.
+        """
+        self.reset()
+
+        reduced_tidbits: list[tuple[TriviaTidbitBase, list[TriviaReduction]]] = []
+        activity_processor = TriviaProcessor()
+        for tidbit in self.tidbits:
+            reductions = tidbit.get_reductions()
+            if reductions is None:
+                activity_processor.register_tidbit(tidbit)
+            else:
+                reduced_tidbits.append((tidbit, reductions))
+
+        results = get_reduction_results(
+            activities,
+            [
+                reduction
+                for _, reductions in reduced_tidbits
+                for reduction in reductions
+            ],
+        )
+        for tidbit, reductions in reduced_tidbits:
+            tidbit.process_reductions([results[reduction] for reduction in reductions])
+
+        if activity_processor.tidbits:
+            for activity in activities.iter_activities():
+                activity_processor.process_activity(activity)
+
+        return self.get_results()
+
+    def get_tidbit_groups(
+        self, activity_type: Optional[str]
+    ) -> list[tuple[Sequence[str], list[TriviaTidbitBase]]]:
+        """
+        Returns the tidbits which want activities of `activity_type`, grouped
+        by the fields they require.
+        """
+        tidbits_by_fields: dict[tuple[str, ...], list[TriviaTidbitBase]] = {}
+        for tidbit in self.tidbits:
+            activity_types = tidbit.get_activity_types()
+            if activity_types is not None and activity_type not in activity_types:
+                continue
+
+            required_fields = tuple(tidbit.get_required_fields())
+            tidbits_by_fields.setdefault(required_fields, []).append(tidbit)
+
+        return list(tidbits_by_fields.items())
+
+    def get_results(self) -> list[tuple[str, str, LinkCell | None]]:
+        """
+        Returns the tidbits of trivia for all the activities processed since
+        the last reset.
+        """
+        trivia: list[tuple[str, str, LinkCell | None]] = []
         for tidbit in self.tidbits:
             description = tidbit.get_description()
             tidbit_text = tidbit.get_tidbit()
@@ -124,3 +293,144 @@ class TriviaProcessor:
                 trivia.append((description, tidbit_text, url))
 
         return trivia
+
+
+def get_reduction_results(
+    activities: ActivityFrame, reductions: Iterable[TriviaReduction]
+) -> dict[TriviaReduction, TriviaReductionResult]:
+    """
+    Calculates every reduction over the activities. All the reductions of the
+    same column and operation are done together, with one groupby over the
+    activity types plus one reduction over every activity, no matter how many
+    activity types are asked for.
+    """
+    # Use positions as the index, so winners can be looked up with iloc.
+    df = activities.df.reset_index(drop=True)
+
+    reductions_by_operation: dict[tuple[str, str, str], list[TriviaReduction]] = {}
+    for reduction in reductions:
+        key = (reduction.column_name, reduction.operation, reduction.keep)
+        reductions_by_operation.setdefault(key, []).append(reduction)
+
+    values: dict[TriviaReduction, Any] = {}
+    winners: dict[TriviaReduction, int] = {}
+    for (
+        column_name,
+        operation,
+        keep,
+    ), operation_reductions in reductions_by_operation.items():
+        column = get_reduction_column(df, column_name)
+
+        if operation in ("min", "max"):
+            extreme_values, extreme_winners = get_extremes(
+                column, df["type"], operation, keep, operation_reductions
+            )
+            values.update(extreme_values)
+            winners.update(extreme_winners)
+        elif operation in ("sum", "count_nonzero"):
+            values.update(
+                get_totals(column, df["type"], operation, operation_reductions)
+            )
+        elif operation == "unique":
+            values.update(get_unique_values(column, df["type"], operation_reductions))
+        else:
+            raise ValueError(f"Unknown trivia reduction operation: {operation}")
+
+    # Only the winning activities ever get turned into activity objects.
+    winning_positions = sorted(set(winners.values()))
+    winning_activities = dict(
+        zip(
+            winning_positions,
+            ActivityFrame(df.iloc[winning_positions]).iter_activities(),
+        )
+    )
+
+    return {
+        reduction: TriviaReductionResult(
+            values.get(reduction),
+            winning_activities[winners[reduction]] if reduction in winners else None,
+        )
+        for operation_reductions in reductions_by_operation.values()
+        for reduction in operation_reductions
+    }
+
+
+def get_extremes(
+    column: pd.Series,
+    types: pd.Series,
+    operation: str,
+    keep: str,
+    reductions: list[TriviaReduction],
+) -> tuple[dict[TriviaReduction, Any], dict[TriviaReduction, int]]:
+    """
+    Returns the smallest or largest value for each reduction, and the position
+    of the activity it came from.
+    """
+    column_values = column.to_numpy()
+    column = column.dropna()
+    if keep == "last":
+        # idxmin/idxmax return the first winner, so look backwards.
+        column = column.iloc[::-1]
+    if len(column) == 0:
+        return {}, {}
+
+    grouped = column.groupby(types[column.index], observed=True)
+    if operation == "min":
+        winners_by_type, overall_winner = grouped.idxmin().to_dict(), column.idxmin()
+    else:
+        winners_by_type, overall_winner = grouped.idxmax().to_dict(), column.idxmax()
+
+    winners: dict[TriviaReduction, int] = {}
+    for reduction in reductions:
+        if reduction.activity_type is None:
+            winners[reduction] = overall_winner
+        elif reduction.activity_type in winners_by_type:
+            winners[reduction] = winners_by_type[reduction.activity_type]
+
+    values = {reduction: column_values[winner] for reduction, winner in winners.items()}
+    return values, winners
+
+
+def get_totals(
+    column: pd.Series,
+    types: pd.Series,
+    operation: str,
+    reductions: list[TriviaReduction],
+) -> dict[TriviaReduction, Any]:
+    if operation == "count_nonzero":
+        column = (column.notna() & (column != 0)).astype(np.int64)
+    column = column.fillna(0)
+    totals_by_type = column.groupby(types, observed=True).sum().to_dict()
+
+    return {
+        reduction: (
+            column.sum()
+            if reduction.activity_type is None
+            else totals_by_type.get(reduction.activity_type, 0)
+        )
+        for reduction in reductions
+    }
+
+
+def get_unique_values(
+    column: pd.Series, types: pd.Series, reductions: list[TriviaReduction]
+) -> dict[TriviaReduction, np.ndarray]:
+    unique_values: dict[TriviaReduction, np.ndarray] = {}
+    for reduction in reductions:
+        type_column = column
+        if reduction.activity_type is not None:
+            type_column = column[types == reduction.activity_type]
+        unique_values[reduction] = np.unique(type_column.dropna().to_numpy())
+    return unique_values
+
+
+def get_reduction_column(df: pd.DataFrame, column_name: str) -> pd.Series:
+    """
+    Returns the column to reduce over. Reducing over a column we don't store is
+    an error, rather than quietly finding nothing.
+    """
+    if column_name in DERIVED_COLUMNS:
+        return DERIVED_COLUMNS[column_name](df)
+    if column_name not in df:
+        raise ValueError(f"Can't reduce over unknown trivia column: {column_name}")
+    return df[column_name]
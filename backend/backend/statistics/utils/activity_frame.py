@@ -0,0 +1,116 @@
+"""
+The one table of activities that all the statistics are calculated from.
+
+Every plot, table and image used to loop over pydantic activity objects,
+building its own little `CompactActivity` dataclass for each one and doing
+arithmetic on stravalib's unit types. Now the activities are loaded into a
+single pandas DataFrame once, and every statistic works on whole columns at a
+time instead.
+
+The columns are the same as `ActivityColumns`, with plain SI units:
+    * distance and total_elevation_gain are in meters.
+    * moving_time is in seconds.
+    * average_speed is in meters per second.
+    * Missing numbers are NaN, and missing dates are NaT.
+    * type is a categorical, with missing types as NaN.
+"""
+
+import dataclasses
+from typing import Any, Callable, Hashable, Iterable, Iterator, TypeVar
+
+import numpy as np
+import pandas as pd
+from backend.utils.activity_columns import (
+    CATEGORICAL_COLUMNS,
+    DATETIME_COLUMNS,
+    ActivityColumns,
+)
+from stravalib.model import SummaryActivity
+
+T = TypeVar("T")
+
+
+class ActivityFrame:
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+
+        # Results calculated from this frame which more than one statistic
+        # needs. See `get_shared_result`.
+        self.shared_results: dict[Hashable, Any] = {}
+
+    @classmethod
+    def from_columns(cls, columns: ActivityColumns) -> "ActivityFrame":
+        df = pd.DataFrame(
+            {
+                field.name: getattr(columns, field.name)
+                for field in dataclasses.fields(columns)
+            }
+        )
+        for column in CATEGORICAL_COLUMNS:
+            # "" means missing in ActivityColumns, so make it a proper NaN here
+            # so that groupbys and comparisons just skip it.
+            df[column] = pd.Categorical(df[column].replace("", np.nan))
+        return cls(df)
+
+    @classmethod
+    def from_activities(cls, activities: Iterable[SummaryActivity]) -> "ActivityFrame":
+        return cls.from_columns(ActivityColumns.from_summary_activities(activities))
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def to_columns(self) -> ActivityColumns:
+        columns = {
+            field.name: self.df[field.name].to_numpy()
+            for field in dataclasses.fields(ActivityColumns)
+        }
+        for column in DATETIME_COLUMNS:
+            columns[column] = self.df[column].to_numpy(dtype="datetime64[s]")
+        for column in CATEGORICAL_COLUMNS:
+            columns[column] = (
+                self.df[column].astype(object).fillna("").to_numpy(dtype=object)
+            )
+        return ActivityColumns(**columns)
+
+    def get_shared_result(self, key: Hashable, calculate: Callable[[], T]) -> T:
+        """
+        Returns the result of `calculate()`, only actually calling it the first
+        time each key is asked for. This lets several tabs share one
+        calculation over the same frame, like the four cumulative plots.
+        """
+        if key not in self.shared_results:
+            self.shared_results[key] = calculate()
+        return self.shared_results[key]
+
+    def iter_activities(self) -> Iterator[SummaryActivity]:
+        """
+        Yields a lightweight `SummaryActivity` for each activity, for the few
+        places (like trivia) which still look at activities one at a time.
+        """
+        return self.to_columns().iter_summary_activities()
+
+    def get_activity_types(self) -> list[str]:
+        """
+        Returns every activity type the athlete has logged, in alphabetical
+        order.
+        """
+        return sorted(self.df["type"].dropna().unique())
+
+    def of_type(self, activity_type: str) -> "ActivityFrame":
+        return self.where(self.df["type"] == activity_type)
+
+    def without_flagged(self) -> "ActivityFrame":
+        return self.where(~self.df["flagged"])
+
+    def with_values(self, *column_names: str) -> "ActivityFrame":
+        """
+        Returns only the activities which have a value for all the given
+        columns.
+        """
+        return self.where(self.df[list(column_names)].notna().all(axis=1))
+
+    def where(self, mask: pd.Series | np.ndarray) -> "ActivityFrame":
+        return self.__class__(self.df[mask])
+
+    def sorted_by(self, column_name: str) -> "ActivityFrame":
+        return self.__class__(self.df.sort_values(column_name, kind="stable"))
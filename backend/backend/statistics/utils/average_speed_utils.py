@@ -4,48 +4,36 @@ activity types. Here are all my utils for converting between them.
 """
 
 import dataclasses
-import datetime as dt
-import math
 from typing import Callable, Optional
 
-from stravalib import unit_helper as uh
-from stravalib.model import ActivityType
+import numpy as np
+import pandas as pd
 
 
-def average_speed_to_kmph(average_speed_in_m_per_sec: uh._Quantity) -> Optional[float]:
-    if math.isnan(average_speed_in_m_per_sec):
-        return None
-    else:
-        return float(average_speed_in_m_per_sec.magnitude / 1000 * 3600)
+def average_speed_to_kmph(average_speeds_in_m_per_sec: pd.Series) -> pd.Series:
+    return average_speeds_in_m_per_sec / 1000 * 3600
 
 
-def average_speed_to_mins_per_km(
-    average_speed_in_m_per_sec: uh._Quantity,
-) -> Optional[dt.datetime]:
+def average_speed_to_mins_per_km(average_speeds_in_m_per_sec: pd.Series) -> pd.Series:
     """
     Plotly doesn't support timedelta on the y-axis, so we show datetimes, and just change the plot formatting to make
-    it look correct.
+    it look correct. Missing speeds come back as NaT.
     """
-    # If the speed is 0, then the mins/km would be infinity and ruin the plot, so just return None in this case.
-    if average_speed_in_m_per_sec.magnitude == 0:
-        return None
-
-    if math.isnan(average_speed_in_m_per_sec):
-        return None
-    else:
-        return dt.datetime(1970, 1, 1) + dt.timedelta(
-            seconds=int(1000 / average_speed_in_m_per_sec.magnitude)
-        )
+    # If the speed is 0, then the mins/km would be infinity and ruin the plot, so just make it missing in this case.
+    seconds_per_km = np.floor(
+        1000 / average_speeds_in_m_per_sec.where(average_speeds_in_m_per_sec != 0)
+    )
+    return pd.Timestamp(1970, 1, 1) + pd.to_timedelta(seconds_per_km, unit="s")
 
 
 @dataclasses.dataclass
 class AverageSpeedYAxisSettings:
-    conversion_function: Callable[[uh._Quantity], None | float | dt.datetime]
+    conversion_function: Callable[[pd.Series], pd.Series]
     tick_format: Optional[str]
     axis_title: str
 
 
-ACTIVITY_TO_Y_AXIS_SETTINGS_MAPPING: dict[ActivityType, AverageSpeedYAxisSettings] = {
+ACTIVITY_TO_Y_AXIS_SETTINGS_MAPPING: dict[str, AverageSpeedYAxisSettings] = {
     "AlpineSki": AverageSpeedYAxisSettings(
         conversion_function=average_speed_to_kmph,
         tick_format=None,
@@ -69,7 +57,7 @@ ACTIVITY_TO_Y_AXIS_SETTINGS_MAPPING: dict[ActivityType, AverageSpeedYAxisSetting
 }
 
 
-def get_y_axis_settings(activity_type: ActivityType) -> AverageSpeedYAxisSettings:
+def get_y_axis_settings(activity_type: str) -> AverageSpeedYAxisSettings:
     return ACTIVITY_TO_Y_AXIS_SETTINGS_MAPPING.get(
         activity_type,
         AverageSpeedYAxisSettings(
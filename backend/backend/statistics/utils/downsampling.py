@@ -0,0 +1,123 @@
+"""
+Helpers for plots with so many points that sending every one of them to the
+browser makes the chart JSON huge and the page slow. Above a certain number of
+points, plots either thin out their points, or show how dense they are instead.
+
+Time series are thinned out with Largest-Triangle-Three-Buckets (LTTB), which
+keeps the points that matter most to the shape of the line. Clouds of points
+are binned into a 2D histogram.
+
+Datetimes are handled by working on their nanoseconds since the epoch, and
+converting back afterwards.
+"""
+
+import dataclasses
+
+import numpy as np
+import pandas as pd
+
+# Plots with more points than this switch to their downsampled version.
+MAX_PLOT_POINTS = 5000
+
+# The number of bins along each axis of a density plot.
+DENSITY_BINS = 60
+
+
+def to_numeric(values: pd.Series) -> np.ndarray:
+    """
+    Returns the values as floats, with datetimes as nanoseconds since the
+    epoch, and missing values as NaN.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        numeric = values.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        return np.where(values.isna(), np.nan, numeric.astype(np.float64))
+    return values.to_numpy(dtype=np.float64)
+
+
+def from_numeric(values: np.ndarray, like: pd.Series) -> np.ndarray:
+    """
+    The opposite of `to_numeric`, turning the values back into datetimes if
+    `like` is datetimes.
+    """
+    if pd.api.types.is_datetime64_any_dtype(like):
+        return values.astype(np.int64).astype("datetime64[ns]")
+    return values
+
+
+def get_lttb_indices(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Picks `num_points` of the points (x, y), sorted by x, which best keep the
+    shape of the line through them, using Largest-Triangle-Three-Buckets. The
+    first and last points are always kept. Returns the indices of the picked
+    points, in order.
+    """
+    num_values = len(x)
+    if num_points >= num_values or num_points < 3:
+        return np.arange(num_values)
+
+    # Every point except the first and last is split into buckets, and one
+    # point is picked from each.
+    bucket_edges = (
+        np.floor(
+            np.arange(num_points - 1) * (num_values - 2) / (num_points - 2)
+        ).astype(np.int64)
+        + 1
+    )
+    bucket_edges[-1] = num_values - 1
+
+    # The point picked from each bucket depends on the one picked before it,
+    # so only the buckets can be looped over, but each bucket is vectorised.
+    next_bucket_edges = np.append(bucket_edges[2:], num_values)
+    indices = np.empty(num_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = num_values - 1
+    previous = 0
+    for i in range(num_points - 2):
+        start, end = bucket_edges[i], bucket_edges[i + 1]
+        next_start, next_end = end, next_bucket_edges[i]
+
+        # The triangle is between the last picked point, each point in this
+        # bucket, and the average of the next bucket.
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        indices[i + 1] = previous
+
+    return indices
+
+
+@dataclasses.dataclass
+class DensityBins:
+    # The centres of the bins along each axis.
+    x: np.ndarray
+    y: np.ndarray
+    # counts[j, i] is the number of points in the bin at (x[i], y[j]), or NaN
+    # if there weren't any, so empty bins aren't drawn.
+    counts: np.ndarray
+
+
+def get_density_bins(
+    x: pd.Series, y: pd.Series, num_bins: int = DENSITY_BINS
+) -> DensityBins:
+    """
+    Counts how many of the points (x, y) land in each bin of a `num_bins` by
+    `num_bins` grid. Either axis can be datetimes.
+    """
+    numeric_x = to_numeric(x)
+    numeric_y = to_numeric(y)
+    has_values = ~np.isnan(numeric_x) & ~np.isnan(numeric_y)
+
+    counts, x_edges, y_edges = np.histogram2d(
+        numeric_x[has_values], numeric_y[has_values], bins=num_bins
+    )
+    counts[counts == 0] = np.nan
+
+    return DensityBins(
+        x=from_numeric((x_edges[:-1] + x_edges[1:]) / 2, x),
+        y=from_numeric((y_edges[:-1] + y_edges[1:]) / 2, y),
+        counts=counts.T,
+    )
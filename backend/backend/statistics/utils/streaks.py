@@ -0,0 +1,140 @@
+"""
+Works out streaks of activities, like "the most days in a row I did something".
+
+Rather than walking through a list of dates one at a time, all the dates are
+squashed into a sorted array of unique day (or week) numbers. A streak is then
+just a run of numbers that each go up by one, so `np.diff` finds where every
+streak breaks, and the streaks themselves fall out of the gaps between breaks.
+"""
+
+import dataclasses
+import datetime as dt
+from typing import Callable, Optional
+
+import numpy as np
+
+# 1970-01-01 (day 0 of datetime64[D]) was a Thursday, so shift by this many days
+# to make weeks start on a Monday.
+DAYS_FROM_MONDAY_TO_EPOCH = 3
+
+
+@dataclasses.dataclass(frozen=True)
+class Streak:
+    """
+    A streak of consecutive days (or weeks) with activities. For weekly streaks,
+    `start` and `end` are the Mondays starting the first and last weeks.
+    """
+
+    start: dt.date
+    end: dt.date
+    length: int
+
+
+@dataclasses.dataclass
+class Streaks:
+    # The first of the longest streaks, or None if there were no activities.
+    longest: Optional[Streak]
+    # The streak still going as of today (IE: with an activity today, or in the
+    # period before today), or None if it's been broken.
+    current: Optional[Streak]
+    # The longest streaks, longest first. Equally long streaks are in order.
+    top: list[Streak]
+
+
+def get_daily_streaks(
+    dates: np.ndarray, today: Optional[dt.date] = None, top_n: int = 5
+) -> Streaks:
+    """
+    Returns the streaks of consecutive days with at least one activity. `dates`
+    can be any datetime64 array (times are ignored and NaT is skipped), in any
+    order, with any number of activities on the same day.
+    """
+    days = get_unique_days(dates).astype(np.int64)
+    return get_streaks(days, get_day_number(today), top_n, get_date_of_day)
+
+
+def get_weekly_streaks(
+    dates: np.ndarray, today: Optional[dt.date] = None, top_n: int = 5
+) -> Streaks:
+    """
+    The same as `get_daily_streaks`, but for consecutive weeks (Monday to
+    Sunday) with at least one activity.
+    """
+    weeks = np.unique(get_week_numbers(get_unique_days(dates).astype(np.int64)))
+    today_week = get_week_numbers(np.array([get_day_number(today)]))[0]
+    return get_streaks(weeks, today_week, top_n, get_date_of_week)
+
+
+def get_daily_and_weekly_streaks(
+    dates: np.ndarray, today: Optional[dt.date] = None, top_n: int = 5
+) -> tuple[Streaks, Streaks]:
+    """
+    Returns both the daily and weekly streaks, only sorting the dates once.
+    """
+    days = get_unique_days(dates)
+    return get_daily_streaks(days, today, top_n), get_weekly_streaks(days, today, top_n)
+
+
+def get_unique_days(dates: np.ndarray) -> np.ndarray:
+    """
+    Returns the sorted, unique days of `dates` as a `datetime64[D]` array.
+    """
+    days = np.asarray(dates).astype("datetime64[D]")
+    return np.unique(days[~np.isnat(days)])
+
+
+def get_streaks(
+    periods: np.ndarray,
+    today_period: int,
+    top_n: int,
+    get_date_of_period: Callable[[int], dt.date],
+) -> Streaks:
+    """
+    Finds the streaks in `periods`, a sorted array of unique day or week
+    numbers, using run length encoding.
+    """
+    if len(periods) == 0:
+        return Streaks(longest=None, current=None, top=[])
+
+    # Each streak starts wherever a period isn't straight after the one before.
+    starts = np.flatnonzero(np.diff(periods, prepend=periods[0] - 2) != 1)
+    ends = np.append(starts[1:], len(periods)) - 1
+    lengths = ends - starts + 1
+
+    # Longest first, and the earliest first when they're the same length.
+    order = np.lexsort((starts, -lengths))
+
+    def get_streak(i: int) -> Streak:
+        return Streak(
+            start=get_date_of_period(periods[starts[i]]),
+            end=get_date_of_period(periods[ends[i]]),
+            length=int(lengths[i]),
+        )
+
+    current = None
+    if periods[-1] >= today_period - 1:
+        current = get_streak(len(starts) - 1)
+
+    return Streaks(
+        longest=get_streak(order[0]),
+        current=current,
+        top=[get_streak(i) for i in order[:top_n]],
+    )
+
+
+def get_week_numbers(days: np.ndarray) -> np.ndarray:
+    return (days + DAYS_FROM_MONDAY_TO_EPOCH) // 7
+
+
+def get_day_number(date: Optional[dt.date]) -> int:
+    if date is None:
+        date = dt.date.today()
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+def get_date_of_day(day: int) -> dt.date:
+    return np.datetime64(int(day), "D").astype(dt.date)
+
+
+def get_date_of_week(week: int) -> dt.date:
+    return get_date_of_day(week * 7 - DAYS_FROM_MONDAY_TO_EPOCH)
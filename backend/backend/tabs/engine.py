@@ -0,0 +1,47 @@
+"""
+Runs the backend processing for many tabs over an athlete's activities.
+
+The activities are loaded into one `ActivityFrame`, which every tab's
+`backend_processing_hook` is given, rather than each tab loading and going
+through the activities itself.
+"""
+
+import logging
+
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.tabs.tabs import Tab
+from backend.utils.environment_variables import EnvironmentVariableManager
+
+logger = logging.getLogger(__name__)
+
+
+class TabProcessingEngine:
+    def __init__(self, tabs: list[Tab]) -> None:
+        self.tabs = tabs
+
+    def run(
+        self,
+        activities: ActivityFrame,
+        evm: EnvironmentVariableManager,
+        athlete_id: int,
+    ) -> dict[str, Exception]:
+        """
+        Runs the backend processing for every tab. One tab failing doesn't
+        stop the others. Returns the exceptions raised by any failed tabs,
+        keyed by the tab's key.
+        """
+        failures: dict[str, Exception] = {}
+
+        for tab in self.tabs:
+            try:
+                tab.backend_processing_hook(activities, evm, athlete_id)
+            except Exception as e:
+                failures[tab.get_key()] = e
+
+        for key, exception in failures.items():
+            logger.error(
+                f"Failed to process tab {key} for athlete: {athlete_id}",
+                exc_info=exception,
+            )
+
+        return failures
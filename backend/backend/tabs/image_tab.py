@@ -1,10 +1,12 @@
+import json
 import os
-import shutil
-from typing import Any, Callable, Iterator
+import tempfile
+from typing import Any, Callable
 
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.tabs.tabs import Tab
 from backend.utils.environment_variables import EnvironmentVariableManager
-from stravalib.model import DetailedActivity
+from backend.utils.s3 import get_tab_object, get_tab_object_url, put_tab_object
 
 Image = Any
 
@@ -15,47 +17,51 @@ class ImageTab(Tab):
         name: str,
         detailed: bool,
         description: str,
-        create_images_function: Callable[[Iterator[DetailedActivity], str], None],
+        create_images_function: Callable[[ActivityFrame, str], None],
         **kwargs: Any,
     ) -> None:
         super().__init__(name, detailed, **kwargs)
         self.description = description
         self.create_images_function = create_images_function
 
-    def get_plot_function(self) -> Callable[[Iterator[DetailedActivity], str], None]:
+    def get_plot_function(self) -> Callable[[ActivityFrame, str], None]:
         return self.create_images_function
 
     def get_type(self) -> str:
         return "plot_tab"
 
-    def get_local_image_path(self) -> str:
-        return os.path.join(os.getcwd(), "local_image_dir", self.get_key())
-
     def retrieve_frontend_data(
         self, evm: EnvironmentVariableManager, athlete_id: int
     ) -> Any:
-        raise NotImplementedError
+        # The image creation function writes a captions.json file next to the
+        # images, mapping the image file names to their captions.
+        captions: dict[str, str] = json.loads(
+            get_tab_object(athlete_id, self.get_key(), "captions.json")
+        )
+        return [
+            {
+                "url": get_tab_object_url(athlete_id, self.get_key(), image_name),
+                "caption": caption,
+            }
+            for image_name, caption in captions.items()
+        ]
+
+    def is_frontend_data_cacheable(self) -> bool:
+        # The presigned URLs expire.
+        return False
 
     def backend_processing_hook(
         self,
-        activity_iterator: Iterator[DetailedActivity],
+        activities: ActivityFrame,
         evm: EnvironmentVariableManager,
         athlete_id: int,
     ) -> None:
-        # Create a directory:
-        path = self.get_local_image_path()
-        if not os.path.exists(path):
-            os.makedirs(path)
-        try:
-            # Make the images
-            self.create_images_function(activity_iterator, path)
+        # Make the images in a temporary directory, which is removed afterwards
+        # even if there is an error.
+        with tempfile.TemporaryDirectory() as path:
+            self.create_images_function(activities, path)
+
             # Add the images to an S3 bucket.
-            files = os.listdir(path)
-            for file in files:
-                # upload_file(athlete_id, self.get_key(), os.path.join(path, file))
-                a = 1
-
-        except Exception as e:
-            # Ensure that if there is an error, the tmp file gets removed anyway.
-            shutil.rmtree(path)
-            raise e
+            for file in os.listdir(path):
+                with open(os.path.join(path, file), "rb") as f:
+                    put_tab_object(athlete_id, self.get_key(), file, f.read())
@@ -1,13 +1,35 @@
-import json
-from typing import Any, Callable, Iterator
+import dataclasses
+import traceback
+from typing import Any, Callable, Optional
 
-import plotly
 import plotly.graph_objects as go
+import plotly.io as pio
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.tabs.tabs import Tab
+from backend.utils.dynamodb import get_athlete_id_from_session_token
 from backend.utils.environment_variables import EnvironmentVariableManager
+from backend.utils.json_encoding import EncodedJson, get_json_response
+from backend.utils.routes import unauthorized_if_no_session_token
+from backend.utils.s3 import (
+    get_activity_columns_from_s3,
+    get_tab_object,
+    put_tab_object,
+)
+from fastapi import Depends, FastAPI, Request, Response
 
-# from backend.utils.s3 import get_object
-from stravalib.model import DetailedActivity
+
+@dataclasses.dataclass
+class PlotWindow:
+    """
+    The part of a plot the user has zoomed in on, for the plots which are
+    downsampled when they have lots of points. `x_min` and `x_max` are the
+    ends of the x axis, exactly as plotly gives them to the frontend (so they
+    might be numbers or dates).
+    """
+
+    activity_type: str
+    x_min: str
+    x_max: str
 
 
 class PlotTab(Tab):
@@ -16,45 +38,104 @@ class PlotTab(Tab):
         name: str,
         detailed: bool,
         description: str,
-        plot_function: Callable[[Iterator[DetailedActivity]], go.Figure],
+        plot_function: Callable[[ActivityFrame], go.Figure],
+        window_function: Optional[
+            Callable[[ActivityFrame, PlotWindow], go.Figure]
+        ] = None,
         **kwargs: Any,
     ) -> None:
+        """
+        If the plot downsamples its traces when there are lots of points, then
+        `window_function` should return a figure with the full resolution
+        trace for a zoomed in window of the plot. It's served from
+        `/api/data/<key>/window`.
+        """
         super().__init__(name, detailed, **kwargs)
         self.description = description
         self.plot_function = plot_function
+        self.window_function = window_function
 
-    def get_plot_function(self) -> Callable[[Iterator[DetailedActivity]], go.Figure]:
+    def get_plot_function(self) -> Callable[[ActivityFrame], go.Figure]:
         return self.plot_function
 
     def retrieve_frontend_data(
         self, evm: EnvironmentVariableManager, athlete_id: int
     ) -> Any:
-        # chart_string = get_object(athlete_id, self.get_key(), "chart.json")
-        chart_string = "a"
-        return json.loads(chart_string)
+        return EncodedJson(get_tab_object(athlete_id, self.get_key(), "chart.json"))
 
     def backend_processing_hook(
         self,
-        activity_iterator: Iterator[DetailedActivity],
+        activities: ActivityFrame,
         evm: EnvironmentVariableManager,
         athlete_id: int,
     ) -> None:
-        # If we aren't using S3, just do nothing because it'll all happen on the frontend data retrieval hook.
-        chart_data = self.get_chart_dict(activity_iterator)
-        chart_json_string = json.dumps(chart_data, cls=plotly.utils.PlotlyJSONEncoder)
-        raise NotImplementedError
-        # save_chart_json(athlete_id, self.get_key(), chart_json_string)
-
-    def get_chart_dict(self, activity_iterator: Iterator[DetailedActivity]) -> Any:
-        fig = self.plot_function(activity_iterator)
-
-        # Convert the chart figure to a dictionary which can be correctly serialised by flasks `jsonify`.
-        # We can't just rely on jsonify, because it serialised datetimes incorrectly, so we use plotlys
-        # json encoder to make a string, then read that back into a dictionary. This serialises all the
-        # datetimes correctly.
-        chart_json_string = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        chart_dict = json.loads(chart_json_string)
-        return chart_dict
+        put_tab_object(
+            athlete_id, self.get_key(), "chart.json", self.get_chart_json(activities)
+        )
+
+    def get_chart_json(self, activities: ActivityFrame) -> bytes:
+        return self.encode_figure(self.plot_function(activities))
+
+    def get_window_json(self, activities: ActivityFrame, window: PlotWindow) -> bytes:
+        if self.window_function is None:
+            raise ValueError(f"Tab {self.get_key()} can't be zoomed into.")
+        return self.encode_figure(self.window_function(activities, window))
+
+    def encode_figure(self, fig: go.Figure) -> bytes:
+        # Plotly encodes the figure with orjson, which is much faster than its
+        # own json encoder, and handles the datetimes and numpy arrays. The
+        # figure was already validated when it was made, so don't do it again.
+        return pio.to_json(fig, validate=False, engine="orjson").encode()
+
+    def generate_and_register_route(
+        self, app: FastAPI, evm: EnvironmentVariableManager
+    ) -> None:
+        super().generate_and_register_route(app, evm)
+        if self.window_function is not None:
+            self.register_window_route(app)
+
+    def register_window_route(self, app: FastAPI) -> None:
+        """
+        Registers the route the frontend hits when a downsampled plot is zoomed
+        in, to get every point in the zoomed in window. Unlike the main route,
+        this has to load the athlete's activities.
+        """
+
+        def window_data_retrieval_hook(
+            request: Request, activity_type: str, x_min: str, x_max: str
+        ) -> Response:
+            session_token = request.cookies["session_token"]
+            athlete_id = get_athlete_id_from_session_token(session_token)
+
+            response_msg: dict[str, Any] = {
+                "key": self.get_key(),
+                "type": self.__class__.__name__,
+            }
+
+            try:
+                activities = ActivityFrame.from_columns(
+                    get_activity_columns_from_s3(athlete_id)
+                )
+                window_json = self.get_window_json(
+                    activities, PlotWindow(activity_type, x_min, x_max)
+                )
+                response_msg["status"] = "Success"
+                response_msg["tab_data"] = EncodedJson(window_json)
+
+            except Exception as e:
+                print(e)
+                traceback.print_exc()
+                response_msg["status"] = "Failure"
+
+            return get_json_response(response_msg)
+
+        window_data_retrieval_hook.__name__ = f"{self.get_key()}_window"
+        app.add_api_route(
+            path=f"/api/data/{self.get_key()}/window",
+            endpoint=window_data_retrieval_hook,
+            methods=["GET"],
+            dependencies=[Depends(unauthorized_if_no_session_token)],
+        )
 
     def get_type(self) -> str:
         return "plot_tab"
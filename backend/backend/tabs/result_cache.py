@@ -0,0 +1,91 @@
+"""
+Caches the data each tab sends to the frontend, so clicking back and forth
+between tabs doesn't redo any work.
+
+There are two tiers. Warm Lambdas keep the most recently used results in
+memory, and every result is also saved to S3, so a cold Lambda only has to read
+back one object. Results are keyed by the athlete, the tab, and the version of
+the athlete's data they were generated from. Saving new activities gives the
+data a new version, so old results are never served after that.
+
+Results are kept as encoded JSON, so they can be sent to the frontend, or saved
+to S3, without encoding them again.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from backend.utils.s3 import get_tab_result, put_tab_result
+
+# Chart data can be a few megabytes, so don't keep too many around.
+MAX_CACHED_RESULTS = 128
+
+
+class TabResultCache:
+    def __init__(self, max_results: int = MAX_CACHED_RESULTS) -> None:
+        self.max_results = max_results
+        # Each athlete's tab only ever has one cached result, which is
+        # replaced when the version changes, so the version lives next to the
+        # result rather than in the key.
+        self.results: OrderedDict[tuple[int, str], tuple[str, bytes]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_or_compute(
+        self,
+        athlete_id: int,
+        tab_key: str,
+        version: str,
+        compute: Callable[[], bytes],
+    ) -> bytes:
+        """
+        Returns the result for the tab from memory, then from S3, and only
+        calls `compute` (and saves what it returns to both) if neither has a
+        result for this version of the athlete's data.
+        """
+        result = self.get_from_memory(athlete_id, tab_key, version)
+        if result is not None:
+            return result
+
+        result = get_tab_result(athlete_id, tab_key, version)
+        if result is None:
+            result = compute()
+            try:
+                put_tab_result(athlete_id, tab_key, version, result)
+            except RuntimeError as e:
+                # It'll just have to be computed again next time.
+                print(e)
+
+        self.put_in_memory(athlete_id, tab_key, version, result)
+        return result
+
+    def get_from_memory(
+        self, athlete_id: int, tab_key: str, version: str
+    ) -> Optional[bytes]:
+        with self.lock:
+            cached = self.results.get((athlete_id, tab_key))
+            if cached is None or cached[0] != version:
+                return None
+            self.results.move_to_end((athlete_id, tab_key))
+            return cached[1]
+
+    def put_in_memory(
+        self, athlete_id: int, tab_key: str, version: str, result: bytes
+    ) -> None:
+        with self.lock:
+            self.results[(athlete_id, tab_key)] = (version, result)
+            self.results.move_to_end((athlete_id, tab_key))
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+
+    def invalidate(self, athlete_id: int) -> None:
+        """
+        Forgets every result held in memory for the athlete. Results from old
+        versions can never be served anyway, but there's no point keeping them.
+        """
+        with self.lock:
+            for key in [key for key in self.results if key[0] == athlete_id]:
+                del self.results[key]
+
+
+tab_result_cache = TabResultCache()
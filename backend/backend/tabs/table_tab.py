@@ -1,11 +1,12 @@
 import dataclasses
-import json
-from typing import Any, Callable, Iterator, Literal, Optional
+from typing import Any, Callable, Literal, Optional
 
 import pandas as pd
+from backend.statistics.utils.activity_frame import ActivityFrame
 from backend.tabs.tabs import Tab
 from backend.utils.environment_variables import EnvironmentVariableManager
-from stravalib.model import DetailedActivity
+from backend.utils.json_encoding import EncodedJson, encode_json
+from backend.utils.s3 import get_tab_object, put_tab_object
 
 ColumnTypes = Literal["string", "link"]
 
@@ -22,18 +23,14 @@ class TableTab(Tab):
         name: str,
         detailed: bool,
         description: str,
-        table_function: Optional[
-            Callable[[Iterator[DetailedActivity]], pd.DataFrame]
-        ] = None,
+        table_function: Optional[Callable[[ActivityFrame], pd.DataFrame]] = None,
         **kwargs: Any,
     ) -> None:
         super().__init__(name, detailed, **kwargs)
         self.description = description
         self.table_function = table_function
 
-    def get_table_dataframe(
-        self, activities: Iterator[DetailedActivity]
-    ) -> pd.DataFrame:
+    def get_table_dataframe(self, activities: ActivityFrame) -> pd.DataFrame:
         if self.table_function is None:
             raise Exception("Table tab has no function to generate a table.")
         return self.table_function(activities)
@@ -61,9 +58,10 @@ class TableTab(Tab):
 
         return cols
 
-    def get_table_data(self, activities: Iterator[DetailedActivity]) -> dict[str, Any]:
-        df = self.get_table_dataframe(activities)
+    def get_table_data(self, activities: ActivityFrame) -> dict[str, Any]:
+        return self.get_table_data_from_dataframe(self.get_table_dataframe(activities))
 
+    def get_table_data_from_dataframe(self, df: pd.DataFrame) -> dict[str, Any]:
         def serialise_linkcells(
             linkcell: Optional[LinkCell],
         ) -> Optional[dict[str, Any]]:
@@ -91,19 +89,17 @@ class TableTab(Tab):
     def retrieve_frontend_data(
         self, evm: EnvironmentVariableManager, athlete_id: int
     ) -> Any:
-        # table_string = get_object(athlete_id, self.get_key(), "table.json")
-        # return json.loads(table_string)
-        return ""
+        return EncodedJson(get_tab_object(athlete_id, self.get_key(), "table.json"))
 
     def backend_processing_hook(
         self,
-        activity_iterator: Iterator[DetailedActivity],
+        activities: ActivityFrame,
         evm: EnvironmentVariableManager,
         athlete_id: int,
     ) -> None:
-        # If we aren't using S3, just leave it for the frontend hook to generate.
-        table_data = self.get_table_data(activity_iterator)
-        table_json_string = json.dumps(table_data)
+        self.save_table_data(athlete_id, self.get_table_data(activities))
 
-        raise NotImplementedError
-        # save_table_json(athlete_id, self.get_key(), table_json_string)
+    def save_table_data(self, athlete_id: int, table_data: dict[str, Any]) -> None:
+        put_tab_object(
+            athlete_id, self.get_key(), "table.json", encode_json(table_data)
+        )
@@ -1,10 +1,48 @@
+import hashlib
 import traceback
 from abc import ABC, abstractmethod
-from typing import Any, Iterator, Optional
+from typing import Any, Optional
 
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.tabs.result_cache import tab_result_cache
+from backend.utils.dynamodb import get_athlete_id_from_session_token
 from backend.utils.environment_variables import EnvironmentVariableManager
-from stravalib.model import DetailedActivity
-from fastapi import FastAPI, Request
+from backend.utils.json_encoding import EncodedJson, encode_json, get_json_response
+from backend.utils.routes import unauthorized_if_no_session_token
+from backend.utils.s3 import get_dataset_version
+from fastapi import Depends, FastAPI, Request, Response
+
+
+def get_etag(athlete_id: int, tab_key: str, version: str) -> str:
+    """
+    A strong ETag for a tab's data, which changes whenever the athlete's data
+    does. The athlete is hashed in too, so a browser shared by two athletes
+    never mixes them up.
+    """
+    digest = hashlib.sha256(f"{athlete_id}:{tab_key}:{version}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Checks an `If-None-Match` header against an ETag. The header can list many
+    ETags, and compression along the way can turn ours into a weak one, so the
+    `W/` is ignored, like the spec says to for `If-None-Match`.
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def get_etag_headers(etag: str) -> dict[str, str]:
+    # The data is only for this athlete, and the browser has to check back
+    # every time, since new data could have been downloaded since.
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
 
 
 class Tab(ABC):
@@ -38,46 +76,96 @@ class Tab(ABC):
         so that when the route is hit, the frontend message is returned.
         """
 
-        def frontend_data_retrieval_hook(request: Request) -> Any:
-            session_token = int(request.cookies["session_token"])
-            athlete_id = 1  # TODO: Fix this
+        def frontend_data_retrieval_hook(request: Request) -> Response:
+            session_token = request.cookies["session_token"]
+            athlete_id = get_athlete_id_from_session_token(session_token)
 
-            response_msg = {"key": self.get_key(), "type": self.__class__.__name__}
+            # If the browser already has this version of the tab, there's no
+            # need to even look at the tab's data.
+            version = get_dataset_version(athlete_id)
+            etag = None
+            if version is not None and self.is_frontend_data_cacheable():
+                etag = get_etag(athlete_id, self.get_key(), version)
+                if etag_matches(request.headers.get("if-none-match"), etag):
+                    return Response(status_code=304, headers=get_etag_headers(etag))
+
+            response_msg: dict[str, Any] = {
+                "key": self.get_key(),
+                "type": self.__class__.__name__,
+            }
 
             try:
-                frontend_data = self.retrieve_frontend_data(evm, athlete_id)
+                frontend_data = self.get_encoded_frontend_data(evm, athlete_id, version)
                 response_msg["status"] = "Success"
-                response_msg["tab_data"] = frontend_data
+                response_msg["tab_data"] = EncodedJson(frontend_data)
 
             except Exception as e:
                 print(e)
                 traceback.print_exc()
                 response_msg["status"] = "Failure"
+                etag = None
 
-            return response_msg
+            return get_json_response(
+                response_msg, headers=None if etag is None else get_etag_headers(etag)
+            )
 
         frontend_data_retrieval_hook.__name__ = f"{self.get_key()}"
         app.add_api_route(
             path=f"/api/data/{self.get_key()}",
             endpoint=frontend_data_retrieval_hook,
             methods=["GET"],
+            dependencies=[Depends(unauthorized_if_no_session_token)],
         )
 
+    def get_encoded_frontend_data(
+        self,
+        evm: EnvironmentVariableManager,
+        athlete_id: int,
+        version: Optional[str],
+    ) -> bytes:
+        """
+        Returns what `retrieve_frontend_data` does, encoded as JSON, but only
+        calls it once for each `version` of the athlete's data (from
+        `get_dataset_version`).
+        """
+        if version is None or not self.is_frontend_data_cacheable():
+            return encode_json(self.retrieve_frontend_data(evm, athlete_id))
+
+        return tab_result_cache.get_or_compute(
+            athlete_id,
+            self.get_key(),
+            version,
+            lambda: encode_json(self.retrieve_frontend_data(evm, athlete_id)),
+        )
+
+    def is_frontend_data_cacheable(self) -> bool:
+        """
+        Tabs whose frontend data goes stale on its own, even when the athlete's
+        data hasn't changed, should return False here.
+        """
+        return True
+
     @abstractmethod
     def retrieve_frontend_data(
         self, evm: EnvironmentVariableManager, athlete_id: int
     ) -> Any:
+        """
+        Returns the data the frontend needs to show the tab. Anything orjson
+        can encode is fine, and tabs which saved their data as JSON can return
+        it as `EncodedJson` to skip decoding and re-encoding it.
+        """
         pass
 
     @abstractmethod
     def backend_processing_hook(
         self,
-        activity_iterator: Iterator[DetailedActivity],
+        activities: ActivityFrame,
         evm: EnvironmentVariableManager,
         athlete_id: int,
     ) -> None:
         """
-        This is the backend processing hook for the tab. It is called when the
-        rq worker attempts to do any preprocessing for the tab.
+        This is the backend processing hook for the tab. It is called once the
+        athlete's data has been downloaded, and saves everything the tab needs
+        so that `retrieve_frontend_data` only has to read it back.
         """
         pass
@@ -1,9 +1,9 @@
-from typing import Any, Iterator
+from typing import Any
 
 import pandas as pd
 from backend.statistics.trivia import TriviaProcessor
-from backend.tabs.table_tab import TableTab
-from stravalib.model import DetailedActivity
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.tabs.table_tab import LinkCell, TableTab
 
 
 class TriviaTab(TableTab):
@@ -19,9 +19,14 @@ class TriviaTab(TableTab):
         self.description = description
         self.trivia_processor = trivia_processor
 
-    def get_table_dataframe(self, activities: Iterator[DetailedActivity]) -> pd.DataFrame:
-        trivia_data = self.trivia_processor.get_data(activities)
+    def get_table_dataframe(self, activities: ActivityFrame) -> pd.DataFrame:
+        return self.get_trivia_dataframe(
+            self.trivia_processor.get_data_from_frame(activities)
+        )
 
+    def get_trivia_dataframe(
+        self, trivia_data: list[tuple[str, str, LinkCell | None]]
+    ) -> pd.DataFrame:
         descriptions = []
         tidbit_info = []
         optional_links = []
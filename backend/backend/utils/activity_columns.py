@@ -0,0 +1,309 @@
+"""
+A columnar representation of an athlete's activities.
+
+Storing every `SummaryActivity.model_dump()` as one big JSON document means that
+every read has to parse and validate every field of every activity, even though
+the statistics only ever look at a handful of them. Instead, we keep one typed
+NumPy array per field that the statistics actually use, and serialise those
+arrays with `np.savez_compressed`. Reading it back is just decompressing some
+arrays, with no pydantic in sight.
+
+Conventions for the columns:
+    * Nullable numeric columns are float64, with NaN meaning "missing".
+    * Datetimes are `datetime64[s]`, with NaT meaning "missing". `start_date` is
+      UTC and `start_date_local` is the athlete's local wall-clock time.
+    * String columns are object arrays of `str`, with "" meaning "missing".
+"""
+
+import dataclasses
+import datetime as dt
+import io
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+from stravalib.model import (
+    Distance,
+    Duration,
+    Map,
+    RelaxedActivityType,
+    SummaryActivity,
+    Velocity,
+)
+
+# Bump this if the on-disk layout changes in a way old readers can't handle.
+FORMAT_VERSION = 1
+
+INT_COLUMNS = ["id"]
+STRING_COLUMNS = ["name", "summary_polyline"]
+CATEGORICAL_COLUMNS = ["type"]
+DATETIME_COLUMNS = ["start_date", "start_date_local"]
+FLOAT_COLUMNS = [
+    "distance",
+    "moving_time",
+    "total_elevation_gain",
+    "average_speed",
+    "average_heartrate",
+    "max_heartrate",
+    "kudos_count",
+    "athlete_count",
+]
+BOOL_COLUMNS = ["flagged"]
+
+
+@dataclasses.dataclass
+class ActivityColumns:
+    """
+    All of an athlete's activities, stored as one array per field. Every array
+    has the same length, and index `i` of every array refers to the same
+    activity.
+    """
+
+    id: np.ndarray
+    name: np.ndarray
+    type: np.ndarray
+    start_date: np.ndarray
+    start_date_local: np.ndarray
+    distance: np.ndarray
+    moving_time: np.ndarray
+    total_elevation_gain: np.ndarray
+    average_speed: np.ndarray
+    average_heartrate: np.ndarray
+    max_heartrate: np.ndarray
+    kudos_count: np.ndarray
+    athlete_count: np.ndarray
+    flagged: np.ndarray
+    summary_polyline: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @classmethod
+    def from_summary_activities(
+        cls, activities: Iterable[SummaryActivity]
+    ) -> "ActivityColumns":
+        rows: dict[str, list[Any]] = {
+            field.name: [] for field in dataclasses.fields(cls)
+        }
+        for activity in activities:
+            rows["id"].append(activity.id)
+            rows["name"].append(activity.name or "")
+            rows["type"].append(activity.type.root if activity.type is not None else "")
+            rows["start_date"].append(_to_naive_utc(activity.start_date))
+            rows["start_date_local"].append(
+                # Strava labels the local start date as UTC, but it's really
+                # the wall-clock time wherever the athlete was, so just drop
+                # the timezone.
+                activity.start_date_local.replace(tzinfo=None)
+                if activity.start_date_local is not None
+                else None
+            )
+            for column in FLOAT_COLUMNS:
+                rows[column].append(_to_float(getattr(activity, column)))
+            rows["flagged"].append(bool(activity.flagged))
+            rows["summary_polyline"].append(
+                (activity.map.summary_polyline or "")
+                if activity.map is not None
+                else ""
+            )
+        return cls.from_lists(rows)
+
+    @classmethod
+    def from_lists(cls, rows: dict[str, list[Any]]) -> "ActivityColumns":
+        columns: dict[str, np.ndarray] = {}
+        for column in INT_COLUMNS:
+            columns[column] = np.array(rows[column], dtype=np.int64)
+        for column in STRING_COLUMNS + CATEGORICAL_COLUMNS:
+            columns[column] = _object_array(rows[column])
+        for column in DATETIME_COLUMNS:
+            columns[column] = np.array(rows[column], dtype="datetime64[s]")
+        for column in FLOAT_COLUMNS:
+            columns[column] = np.array(rows[column], dtype=np.float64)
+        for column in BOOL_COLUMNS:
+            columns[column] = np.array(rows[column], dtype=bool)
+        return cls(**columns)
+
+    @classmethod
+    def empty(cls) -> "ActivityColumns":
+        return cls.from_lists({field.name: [] for field in dataclasses.fields(cls)})
+
+    @classmethod
+    def concatenate(cls, all_columns: list["ActivityColumns"]) -> "ActivityColumns":
+        if not all_columns:
+            return cls.empty()
+        return cls(
+            **{
+                field.name: np.concatenate(
+                    [getattr(columns, field.name) for columns in all_columns]
+                )
+                for field in dataclasses.fields(cls)
+            }
+        )
+
+    def take(self, indices: np.ndarray | slice) -> "ActivityColumns":
+        """
+        Returns a new `ActivityColumns` with only the activities at `indices`
+        (either an array of indices or a slice), in that order.
+        """
+        return self.__class__(
+            **{
+                field.name: getattr(self, field.name)[indices]
+                for field in dataclasses.fields(self)
+            }
+        )
+
+    def deduplicated(self) -> "ActivityColumns":
+        """
+        Returns the columns with only one copy of each activity id. When an id
+        appears more than once, the last copy wins, since that's the most
+        recently downloaded version of the activity.
+        """
+        # np.unique returns the index of the first occurrence, so look at the
+        # ids backwards to find the last occurrence instead.
+        _, reversed_indices = np.unique(self.id[::-1], return_index=True)
+        last_indices = np.sort(len(self) - 1 - reversed_indices)
+        if len(last_indices) == len(self):
+            return self
+        return self.take(last_indices)
+
+    def iter_summary_activities(self) -> Iterator[SummaryActivity]:
+        """
+        Yields a `SummaryActivity` for each activity, with just the fields we
+        store filled in. They're built with `model_construct`, so no pydantic
+        validation happens here either.
+        """
+        start_dates = _to_aware_datetimes(self.start_date)
+        start_dates_local = _to_aware_datetimes(self.start_date_local)
+        activity_types = {
+            activity_type: RelaxedActivityType(activity_type)
+            for activity_type in set(self.type)
+            if activity_type
+        }
+
+        for i in range(len(self)):
+            yield SummaryActivity.model_construct(
+                id=int(self.id[i]),
+                name=self.name[i] or None,
+                type=activity_types.get(self.type[i]),
+                start_date=start_dates[i],
+                start_date_local=start_dates_local[i],
+                distance=_optional(Distance, self.distance[i]),
+                moving_time=_optional(Duration, self.moving_time[i]),
+                total_elevation_gain=_optional(Distance, self.total_elevation_gain[i]),
+                average_speed=_optional(Velocity, self.average_speed[i]),
+                average_heartrate=_optional(float, self.average_heartrate[i]),
+                max_heartrate=_optional(float, self.max_heartrate[i]),
+                kudos_count=_optional(int, self.kudos_count[i]),
+                athlete_count=_optional(int, self.athlete_count[i]),
+                flagged=bool(self.flagged[i]),
+                map=Map.model_construct(
+                    summary_polyline=self.summary_polyline[i] or None
+                ),
+            )
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialises the columns into a compressed `.npz` archive. Strings are
+        stored as one UTF-8 buffer plus offsets, and categoricals as integer
+        codes plus their categories, so nothing here needs pickle to load.
+        """
+        arrays: dict[str, np.ndarray] = {
+            "format_version": np.array(FORMAT_VERSION, dtype=np.int64)
+        }
+        for column in INT_COLUMNS + DATETIME_COLUMNS + FLOAT_COLUMNS + BOOL_COLUMNS:
+            arrays[column] = getattr(self, column)
+        for column in STRING_COLUMNS:
+            buffer, offsets = _encode_strings(getattr(self, column))
+            arrays[f"{column}__buffer"] = buffer
+            arrays[f"{column}__offsets"] = offsets
+        for column in CATEGORICAL_COLUMNS:
+            categories, codes = np.unique(
+                getattr(self, column).astype(str), return_inverse=True
+            )
+            buffer, offsets = _encode_strings(categories)
+            arrays[f"{column}__buffer"] = buffer
+            arrays[f"{column}__offsets"] = offsets
+            arrays[f"{column}__codes"] = codes.astype(np.int32)
+
+        file = io.BytesIO()
+        np.savez_compressed(file, **arrays)
+        return file.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ActivityColumns":
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            format_version = int(archive["format_version"])
+            if format_version != FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported activity columns format version: {format_version}"
+                )
+
+            columns: dict[str, np.ndarray] = {}
+            for column in INT_COLUMNS + DATETIME_COLUMNS + FLOAT_COLUMNS + BOOL_COLUMNS:
+                columns[column] = archive[column]
+            for column in STRING_COLUMNS:
+                columns[column] = _decode_strings(
+                    archive[f"{column}__buffer"], archive[f"{column}__offsets"]
+                )
+            for column in CATEGORICAL_COLUMNS:
+                categories = _decode_strings(
+                    archive[f"{column}__buffer"], archive[f"{column}__offsets"]
+                )
+                columns[column] = categories[archive[f"{column}__codes"]]
+        return cls(**columns)
+
+
+def _to_naive_utc(datetime: Optional[dt.datetime]) -> Optional[dt.datetime]:
+    if datetime is None:
+        return None
+    if datetime.tzinfo is not None:
+        datetime = datetime.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return datetime
+
+
+def _to_float(value: Any) -> float:
+    if value is None:
+        return np.nan
+    return float(value)
+
+
+def _to_aware_datetimes(datetimes: np.ndarray) -> list[Optional[dt.datetime]]:
+    # Strava labels all its datetimes as UTC (even the local ones), so we do
+    # the same when turning them back into datetimes.
+    return [
+        datetime.replace(tzinfo=dt.timezone.utc) if datetime is not None else None
+        for datetime in datetimes.astype(object)
+    ]
+
+
+def _optional(type: Any, value: float) -> Any:
+    if np.isnan(value):
+        return None
+    if type in (int, Duration):
+        return type(int(value))
+    return type(value)
+
+
+def _object_array(values: list[str]) -> np.ndarray:
+    # Build the array this way so that numpy doesn't try to turn a list of
+    # strings into a fixed width unicode array.
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _encode_strings(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return buffer, offsets
+
+
+def _decode_strings(buffer: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    raw = buffer.tobytes()
+    return _object_array(
+        [
+            raw[start:end].decode("utf-8")
+            for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+        ]
+    )
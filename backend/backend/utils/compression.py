@@ -0,0 +1,129 @@
+"""
+Compresses the big JSON responses (charts and tables), which are very
+repetitive and shrink massively, with brotli or gzip depending on what the
+browser says it accepts.
+
+The responses are only ever sent in one go, so the middleware just waits for
+the whole body and compresses it at once. Small responses aren't worth
+compressing, so they're left alone.
+"""
+
+import gzip
+from typing import Optional, Sequence
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Bodies smaller than this (in bytes) are sent as is.
+MINIMUM_SIZE = 1024
+
+# Both are a bit below the maximum, since the responses are compressed on every
+# request and the last few percent cost a lot of time.
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+# In order of preference, when the browser is equally happy with either.
+ENCODINGS = ("br", "gzip")
+
+
+def get_accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Picks the encoding to use from an `Accept-Encoding` header, taking into
+    account any q-values (where q=0 means "never"). Returns None if the browser
+    doesn't accept any of `ENCODINGS`.
+    """
+    q_values: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, *parameters = [piece.strip() for piece in part.split(";")]
+        q_value = 1.0
+        for parameter in parameters:
+            if parameter.startswith("q="):
+                try:
+                    q_value = float(parameter[2:])
+                except ValueError:
+                    q_value = 0.0
+        if name:
+            q_values[name] = q_value
+
+    best_encoding, best_q_value = None, 0.0
+    for encoding in ENCODINGS:
+        q_value = q_values.get(encoding, q_values.get("*", 0.0))
+        if q_value > best_q_value:
+            best_encoding, best_q_value = encoding, q_value
+    return best_encoding
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # A fixed mtime, so the same body always compresses to the same bytes.
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Can't compress with unknown encoding: {encoding}")
+
+
+class CompressionMiddleware:
+    """
+    Compresses the responses of any route starting with one of `paths`.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Sequence[str],
+        minimum_size: int = MINIMUM_SIZE,
+    ) -> None:
+        self.app = app
+        self.paths = tuple(paths)
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = get_accepted_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        start_message: Optional[Message] = None
+        body_parts: list[bytes] = []
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(body_parts)
+            headers = MutableHeaders(scope=start_message)
+            # Caches have to know the response depends on Accept-Encoding,
+            # even when this one happens not to be compressed.
+            headers.add_vary_header("Accept-Encoding")
+
+            if (
+                encoding is not None
+                and len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+            ):
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                # The compressed bytes aren't the same as the uncompressed
+                # ones, so the ETag can't promise they are any more.
+                etag = headers.get("etag")
+                if etag is not None and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
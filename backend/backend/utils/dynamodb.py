@@ -2,7 +2,7 @@ import boto3
 from stravalib.protocol import AccessInfo
 from pydantic import BaseModel
 from botocore.exceptions import ClientError
-from typing import Any
+from typing import Any, Optional
 from fastapi import HTTPException
 import datetime as dt
 
@@ -26,7 +26,7 @@ class UserTable(BaseModel):
 class DownloadStatusTable(BaseModel):
     athlete_id: int
     last_download_time: int
-    status: str
+    status: Optional[str] = None
 
 
 def save_user_data_to_dynamo(
@@ -122,7 +122,7 @@ def get_download_status_from_dynamo(athlete_id: int) -> str | None:
         row = DownloadStatusTable(
             athlete_id=response["Item"]["athlete_id"],
             last_download_time=response["Item"]["last_download_time"],
-            status=response["Item"]["status"],
+            status=response["Item"].get("status"),
         )
         return row.status
 
@@ -143,6 +143,6 @@ def get_last_downloaded_time_from_dynamo(athlete_id: int) -> dt.datetime | None:
         row = DownloadStatusTable(
             athlete_id=response["Item"]["athlete_id"],
             last_download_time=response["Item"]["last_download_time"],
-            status=response["Item"]["status"],
+            status=response["Item"].get("status"),
         )
         return dt.datetime.fromtimestamp(row.last_download_time)
@@ -0,0 +1,57 @@
+"""
+Helpers for sending JSON to the frontend without encoding it more than once.
+
+Tab data is saved to S3 as JSON, so rather than reading it back into Python
+objects just for FastAPI to encode it all over again, it's wrapped in
+`EncodedJson` and spliced into the response as is. Everything else is encoded
+with orjson, which is much faster than the json module, and handles numpy
+arrays and datetimes itself.
+"""
+
+import dataclasses
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+@dataclasses.dataclass
+class EncodedJson:
+    """
+    Some JSON which has already been encoded, and should be sent as it is.
+    """
+
+    data: bytes
+
+
+def encode_json(data: Any) -> bytes:
+    if isinstance(data, EncodedJson):
+        return data.data
+    return orjson.dumps(data, option=ORJSON_OPTIONS)
+
+
+def encode_json_object(fields: dict[str, Any]) -> bytes:
+    """
+    Encodes a dictionary as a JSON object, where any of the values can be
+    `EncodedJson`, which is copied straight in.
+    """
+    return (
+        b"{"
+        + b",".join(
+            orjson.dumps(key) + b":" + encode_json(value)
+            for key, value in fields.items()
+        )
+        + b"}"
+    )
+
+
+def get_json_response(
+    fields: dict[str, Any], headers: Optional[dict[str, str]] = None
+) -> Response:
+    return Response(
+        content=encode_json_object(fields),
+        media_type="application/json",
+        headers=headers,
+    )
@@ -1,16 +1,67 @@
 """
 A collection of helpers for all s3 related tasks.
+
+An athlete's activities are stored as one or more shards of columnar data under
+the `<athlete_id>/activities/` prefix. A full download writes a fresh set of
+shards, and an incremental sync just adds a new shard with whatever activities
+it found. When reading, all the shards are concatenated in the order they were
+written, and if an activity appears in more than one shard, the newest copy
+wins.
+
+Every time an athlete's activities are written, their dataset version (a small
+object next to the shards) is bumped. Anything generated from the activities,
+like the data served for each tab, is cached against the version it was
+generated from, so a new version means none of it can be used any more.
 """
 
 from botocore.exceptions import ClientError
-import datetime as dt
+import time
 import boto3
+from typing import Iterable, Optional
 from stravalib.model import SummaryActivity
-import json
-import plotly
+from backend.utils.activity_columns import ActivityColumns
 
 BUCKET_NAME = "test-athlete-data-storage"
 
+# Once an athlete has this many shards, the next incremental sync merges them
+# all back together so that reads don't need a huge number of requests.
+MAX_ACTIVITY_SHARDS = 64
+
+# Downloads are written in shards of roughly this many activities, so we never
+# need to hold more than one shard's worth of activities in memory.
+ACTIVITIES_PER_SHARD = 2000
+
+# The name of the file holding the cached frontend data for a tab.
+TAB_RESULT_FILE_NAME = "result.json"
+
+
+def get_activity_shard_prefix(athlete_id: int) -> str:
+    return f"{athlete_id}/activities/"
+
+
+def get_new_activity_shard_key(athlete_id: int) -> str:
+    """
+    Shard keys are named after the time they were written, zero-padded so that
+    sorting the keys sorts them from oldest to newest.
+    """
+    return f"{get_activity_shard_prefix(athlete_id)}{time.time_ns():020d}.npz"
+
+
+def list_activity_shards(athlete_id: int) -> list[dict]:
+    """
+    Returns the S3 listing entries for all of an athlete's activity shards,
+    ordered from oldest to newest.
+    """
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+    paginator = s3.get_paginator("list_objects_v2")
+
+    shards: list[dict] = []
+    for page in paginator.paginate(
+        Bucket=BUCKET_NAME, Prefix=get_activity_shard_prefix(athlete_id)
+    ):
+        shards.extend(page.get("Contents", []))
+    return sorted(shards, key=lambda shard: shard["Key"])
+
 
 def is_there_any_data_for_athlete(athlete_id: int) -> bool:
     """
@@ -19,98 +70,322 @@ def is_there_any_data_for_athlete(athlete_id: int) -> bool:
     s3 = boto3.client("s3", region_name="ap-southeast-2")
 
     # Check if there are any objects in the folder
+    response = s3.list_objects_v2(
+        Bucket=BUCKET_NAME, Prefix=get_activity_shard_prefix(athlete_id), MaxKeys=1
+    )
+    return response.get("KeyCount", 0) > 0
+
+
+def delete_athlete_data(athlete_id: int) -> None:
+    """
+    Given an athlete's ID, delete all their data from S3. That's their
+    activities, and any tab data that was generated from them.
+    """
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+    paginator = s3.get_paginator("list_objects_v2")
+
+    keys: list[str] = []
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=f"{athlete_id}/"):
+        keys.extend(object["Key"] for object in page.get("Contents", []))
+    delete_athlete_objects(athlete_id, keys)
+
+
+def delete_athlete_objects(athlete_id: int, keys: list[str]) -> None:
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+
+    # delete_objects can only delete 1000 keys at a time.
+    for i in range(0, len(keys), 1000):
+        try:
+            s3.delete_objects(
+                Bucket=BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in keys[i : i + 1000]]},
+            )
+        except ClientError as e:
+            # Handle any errors that occur during the delete operation
+            print(f"Error deleting data for athlete {athlete_id}: {e}")
+            raise
+
+
+def save_summary_activities_to_s3(
+    athlete_id: int, summary_activities: list[SummaryActivity]
+) -> None:
+    """
+    Saves all the data for an athlete into s3 under their athlete id. If data
+    for that athlete already exists, it is deleted and replaced.
+    """
+    save_summary_activity_pages_to_s3(athlete_id, [summary_activities])
+
+
+def save_summary_activity_pages_to_s3(
+    athlete_id: int, pages: Iterable[list[SummaryActivity]]
+) -> int:
+    """
+    Streams pages of activities (as they arrive from Strava) into s3, replacing
+    any data that already exists for the athlete. Returns the number of
+    activities saved.
+    """
+    old_shard_keys = [shard["Key"] for shard in list_activity_shards(athlete_id)]
+
+    # Write the new data before deleting the old data, so that there is never
+    # a moment where the athlete has no data at all.
+    num_activities = put_activity_shards_from_pages(athlete_id, pages)
+    if num_activities == 0:
+        # Save an empty shard anyway, so we know this athlete has been
+        # downloaded and just doesn't have any activities.
+        put_activity_shard(athlete_id, ActivityColumns.empty())
+    delete_athlete_objects(athlete_id, old_shard_keys)
+    put_dataset_version(athlete_id)
+    return num_activities
+
+
+def append_summary_activity_pages_to_s3(
+    athlete_id: int, pages: Iterable[list[SummaryActivity]]
+) -> int:
+    """
+    Streams pages of newly downloaded activities into s3 without touching what
+    is already stored. Activities which were already stored are replaced by the
+    new copies when the data is next read. Returns the number of activities
+    saved.
+    """
+    num_activities = put_activity_shards_from_pages(athlete_id, pages)
+
+    # Don't let the shards pile up forever.
+    if num_activities and len(list_activity_shards(athlete_id)) > MAX_ACTIVITY_SHARDS:
+        save_activity_columns_to_s3(
+            athlete_id, get_activity_columns_from_s3(athlete_id)
+        )
+
+    if num_activities:
+        put_dataset_version(athlete_id)
+    return num_activities
+
+
+def save_activity_columns_to_s3(athlete_id: int, columns: ActivityColumns) -> None:
+    """
+    Saves the columnar activity data for an athlete into s3 under their athlete
+    id. If data for that athlete already exists, it is replaced.
+    """
+    old_shard_keys = [shard["Key"] for shard in list_activity_shards(athlete_id)]
+
+    # Always write at least one shard, even if it's empty, so we know this
+    # athlete has been downloaded and just doesn't have any activities.
+    for start in range(0, max(len(columns), 1), ACTIVITIES_PER_SHARD):
+        put_activity_shard(
+            athlete_id,
+            columns.take(slice(start, start + ACTIVITIES_PER_SHARD)),
+        )
+    delete_athlete_objects(athlete_id, old_shard_keys)
+    put_dataset_version(athlete_id)
+
+
+def put_activity_shards_from_pages(
+    athlete_id: int, pages: Iterable[list[SummaryActivity]]
+) -> int:
+    """
+    Converts each page of activities into columns as soon as it arrives, so the
+    pydantic objects for a page can be thrown away straight away. Once enough
+    activities have built up, they're written to s3 as a shard.
+    """
+    buffered_columns: list[ActivityColumns] = []
+    num_buffered = 0
+    num_activities = 0
+
+    for page in pages:
+        columns = ActivityColumns.from_summary_activities(page)
+        buffered_columns.append(columns)
+        num_buffered += len(columns)
+        num_activities += len(columns)
+
+        if num_buffered >= ACTIVITIES_PER_SHARD:
+            put_activity_shard(
+                athlete_id, ActivityColumns.concatenate(buffered_columns)
+            )
+            buffered_columns = []
+            num_buffered = 0
+
+    if num_buffered:
+        put_activity_shard(athlete_id, ActivityColumns.concatenate(buffered_columns))
+
+    return num_activities
+
+
+def put_activity_shard(athlete_id: int, columns: ActivityColumns) -> None:
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+
     try:
-        s3.head_object(Bucket=BUCKET_NAME, Key=str(athlete_id))
-        return True
+        s3.put_object(
+            Bucket=BUCKET_NAME,
+            Key=get_new_activity_shard_key(athlete_id),
+            Body=columns.to_bytes(),
+        )
     except ClientError as e:
-        if e.response["Error"]["Code"] == "404":
-            return False
-        # Re-raise for any unexpected error
-        raise
+        raise RuntimeError(f"Failed to save data for athlete {athlete_id}") from e
+
+
+def get_activity_columns_from_s3(athlete_id: int) -> ActivityColumns:
+    """
+    Given an athletes id, return the columnar activity data that has been
+    stored in s3.
+    """
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+
+    all_columns: list[ActivityColumns] = []
+    for shard in list_activity_shards(athlete_id):
+        object = s3.get_object(Bucket=BUCKET_NAME, Key=shard["Key"])
+        all_columns.append(ActivityColumns.from_bytes(object["Body"].read()))
+
+    return ActivityColumns.concatenate(all_columns).deduplicated()
 
 
-def get_age_of_data_for_athlete(athlete_id: int) -> dt.timedelta:
+def get_dataset_version_key(athlete_id: int) -> str:
+    return f"{athlete_id}/dataset_version"
+
+
+def put_dataset_version(athlete_id: int) -> str:
     """
-    Returns the age of the blob in the bucket. If it doesn't exist it raises an exception.
+    Gives the athlete's data a new version, which invalidates everything that
+    was cached from their old data. Returns the new version.
     """
     s3 = boto3.client("s3", region_name="ap-southeast-2")
+    version = f"{time.time_ns():020d}"
 
     try:
-        # Fetch the object's metadata
-        response = s3.head_object(Bucket=BUCKET_NAME, Key=str(athlete_id))
-        last_modified = response["LastModified"]
-        current_time = dt.datetime.now(dt.timezone.utc)
-
-        # Calculate the age of the data
-        age = current_time - last_modified
-        return age
+        s3.put_object(
+            Bucket=BUCKET_NAME, Key=get_dataset_version_key(athlete_id), Body=version
+        )
     except ClientError as e:
-        if e.response["Error"]["Code"] == "404":
-            raise FileNotFoundError(
-                f"Data for athlete_id {athlete_id} does not exist in the bucket."
-            )
-        # Re-raise for any other unexpected error
-        raise
+        raise RuntimeError(
+            f"Failed to save the dataset version for athlete {athlete_id}"
+        ) from e
+    return version
 
 
-def delete_athlete_data(athlete_id: int) -> None:
+def get_dataset_version(athlete_id: int) -> Optional[str]:
     """
-    Given an athlete's ID, delete their data from S3.
+    Returns the current version of an athlete's data, or None if it's never
+    been given one.
     """
     s3 = boto3.client("s3", region_name="ap-southeast-2")
 
     try:
-        # Attempt to delete the object corresponding to the athlete_id
-        response = s3.delete_object(Bucket=BUCKET_NAME, Key=str(athlete_id))
-        # You can check the response if needed
-        # print(response)  # For debugging purposes
+        object = s3.get_object(
+            Bucket=BUCKET_NAME, Key=get_dataset_version_key(athlete_id)
+        )
     except ClientError as e:
-        # Handle any errors that occur during the delete operation
-        print(f"Error deleting data for athlete {athlete_id}: {e}")
+        if e.response["Error"]["Code"] == "NoSuchKey":
+            return None
         raise
+    return object["Body"].read().decode()
 
 
-def save_summary_activities_to_s3(
-    athlete_id: int, summary_activities: list[SummaryActivity]
+def get_tab_prefix(athlete_id: int) -> str:
+    return f"{athlete_id}/tabs/"
+
+
+def get_tab_object_key(athlete_id: int, tab_key: str, file_name: str) -> str:
+    return f"{get_tab_prefix(athlete_id)}{tab_key}/{file_name}"
+
+
+def is_there_any_tab_data_for_athlete(athlete_id: int) -> bool:
+    """
+    Returns True if any tab data has been generated for the athlete yet.
+    """
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+
+    response = s3.list_objects_v2(
+        Bucket=BUCKET_NAME, Prefix=get_tab_prefix(athlete_id), MaxKeys=1
+    )
+    return response.get("KeyCount", 0) > 0
+
+
+def put_tab_object(
+    athlete_id: int, tab_key: str, file_name: str, body: str | bytes
 ) -> None:
     """
-    Saves all the data for an athlete into s3 under their athlete id. If data
-    for that athlete already exists, it is deleted and replaced.
+    Saves a file generated for a tab (like a chart's json, or an image) so that
+    it can be served to the frontend later without regenerating it.
     """
     s3 = boto3.client("s3", region_name="ap-southeast-2")
 
-    # Serialize the activities to JSON
-    activities_data = [activity.model_dump() for activity in summary_activities]
-    json_data = json.dumps(activities_data, cls=plotly.utils.PlotlyJSONEncoder)
+    try:
+        s3.put_object(
+            Bucket=BUCKET_NAME,
+            Key=get_tab_object_key(athlete_id, tab_key, file_name),
+            Body=body,
+        )
+    except ClientError as e:
+        raise RuntimeError(
+            f"Failed to save {file_name} for tab {tab_key} for athlete {athlete_id}"
+        ) from e
 
-    # Remove existing data for the athlete if it exists
-    if is_there_any_data_for_athlete(athlete_id):
-        try:
-            # Delete the current athlete's data
-            s3.delete_object(Bucket=BUCKET_NAME, Key=str(athlete_id))
-        except ClientError as e:
-            raise RuntimeError(
-                f"Failed to delete existing data for athlete {athlete_id}"
-            ) from e
 
-    # Upload the new data to S3
+def get_tab_object(athlete_id: int, tab_key: str, file_name: str) -> bytes:
+    """
+    Returns the contents of a file previously saved for a tab.
+    """
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+    object = s3.get_object(
+        Bucket=BUCKET_NAME, Key=get_tab_object_key(athlete_id, tab_key, file_name)
+    )
+    return object["Body"].read()
+
+
+def put_tab_result(athlete_id: int, tab_key: str, version: str, body: bytes) -> None:
+    """
+    Saves the data served to the frontend for a tab, tagged with the dataset
+    version it was generated from. There's only ever one result per tab, so
+    results from old versions are just overwritten.
+    """
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+
     try:
-        s3.put_object(Bucket=BUCKET_NAME, Key=str(athlete_id), Body=json_data)
+        s3.put_object(
+            Bucket=BUCKET_NAME,
+            Key=get_tab_object_key(athlete_id, tab_key, TAB_RESULT_FILE_NAME),
+            Body=body,
+            Metadata={"dataset-version": version},
+        )
     except ClientError as e:
-        raise RuntimeError(f"Failed to save data for athlete {athlete_id}") from e
+        raise RuntimeError(
+            f"Failed to save the result for tab {tab_key} for athlete {athlete_id}"
+        ) from e
 
 
-def get_summary_activities_from_s3(athlete_id: int) -> list[SummaryActivity]:
+def get_tab_result(athlete_id: int, tab_key: str, version: str) -> Optional[bytes]:
     """
-    Given an athletes id, return the list of summary activities that has been stored in
-    s3.
+    Returns the result saved by `put_tab_result`, or None if there isn't one for
+    this dataset version.
     """
-    # Get object from S3
     s3 = boto3.client("s3", region_name="ap-southeast-2")
-    object = s3.get_object(Bucket=BUCKET_NAME, Key=str(athlete_id))
 
-    json_data = json.loads(object["Body"].read())
+    try:
+        object = s3.get_object(
+            Bucket=BUCKET_NAME,
+            Key=get_tab_object_key(athlete_id, tab_key, TAB_RESULT_FILE_NAME),
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchKey":
+            return None
+        raise
+
+    if object["Metadata"].get("dataset-version") != version:
+        return None
+    return object["Body"].read()
 
-    activities = [SummaryActivity.model_validate(activity) for activity in json_data]
 
-    return activities
+def get_tab_object_url(
+    athlete_id: int, tab_key: str, file_name: str, expires_in_s: int = 60 * 60
+) -> str:
+    """
+    Returns a presigned URL the frontend can use to download a tab's file (like
+    an image) directly from S3.
+    """
+    s3 = boto3.client("s3", region_name="ap-southeast-2")
+    return s3.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": BUCKET_NAME,
+            "Key": get_tab_object_key(athlete_id, tab_key, file_name),
+        },
+        ExpiresIn=expires_in_s,
+    )
@@ -0,0 +1,103 @@
+"""
+Helpers for downloading data from Strava.
+
+Strava's activity list endpoint is paginated, and stravalib walks it one page
+at a time, waiting for each page before asking for the next. For athletes with
+thousands of activities that's a lot of waiting, so here we keep a few page
+requests in flight at once instead.
+"""
+
+import collections
+import datetime as dt
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterator, Optional
+
+from stravalib.client import Client
+from stravalib.model import SummaryActivity
+
+# The most activities Strava will return in a single page.
+ACTIVITIES_PER_PAGE = 200
+
+# How many pages to request at the same time by default. Every request still
+# goes through the client's rate limiter, so this just stops us sitting idle
+# while waiting on the network.
+DEFAULT_PAGE_CONCURRENCY = 4
+
+
+def iter_summary_activity_pages(
+    client: Client,
+    after: Optional[dt.datetime] = None,
+    concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+) -> Iterator[list[SummaryActivity]]:
+    """
+    Yields pages of an athlete's summary activities, in the same order
+    `client.get_activities()` would return them. That's newest first, except
+    when `after` is given, where Strava returns them oldest first instead.
+    So don't rely on the order: anything which needs the activities by date
+    should sort them.
+
+    The first page is fetched on its own, because most athletes have fewer
+    than a page of activities and there's no point requesting empty pages for
+    them. After that, up to `concurrency` pages are requested at once. As soon
+    as a page comes back with less than a full page of activities, we know
+    we've reached the end and stop requesting more.
+
+    Each request is made through `client.protocol`, so the client's
+    `RateLimiter` sees every response and can sleep (or raise) exactly like it
+    would for a serial download.
+    """
+    first_page = fetch_summary_activity_page(client, 1, after)
+    if first_page:
+        yield first_page
+    if len(first_page) < ACTIVITIES_PER_PAGE:
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending: collections.deque[Future[list[SummaryActivity]]] = collections.deque()
+        for page in range(2, 2 + concurrency):
+            pending.append(
+                executor.submit(fetch_summary_activity_page, client, page, after)
+            )
+        next_page = 2 + concurrency
+
+        while pending:
+            activities = pending.popleft().result()
+            if activities:
+                yield activities
+
+            if len(activities) < ACTIVITIES_PER_PAGE:
+                # Every page after this one is empty, so don't wait for them.
+                for future in pending:
+                    future.cancel()
+                return
+
+            pending.append(
+                executor.submit(fetch_summary_activity_page, client, next_page, after)
+            )
+            next_page += 1
+
+
+def fetch_summary_activity_page(
+    client: Client, page: int, after: Optional[dt.datetime] = None
+) -> list[SummaryActivity]:
+    params: dict[str, Any] = {"page": page, "per_page": ACTIVITIES_PER_PAGE}
+    if after is not None:
+        params["after"] = datetime_to_epoch(after)
+
+    raw_activities = client.protocol.get(
+        "/athlete/activities", check_for_errors=True, **params
+    )
+    return [
+        SummaryActivity.model_validate({**raw, "bound_client": client})
+        for raw in raw_activities
+    ]
+
+
+def datetime_to_epoch(datetime: dt.datetime) -> int:
+    """
+    Converts a datetime to a unix timestamp. Like stravalib, naive datetimes
+    are treated as UTC.
+    """
+    if datetime.tzinfo is None:
+        datetime = datetime.replace(tzinfo=dt.timezone.utc)
+    return int(datetime.timestamp())
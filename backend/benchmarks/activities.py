@@ -0,0 +1,66 @@
+"""
+Made up activities for the benchmarks, so they can be run without any AWS
+credentials or a real athlete's data.
+"""
+
+import numpy as np
+import polyline
+from backend.utils.activity_columns import ActivityColumns
+
+ACTIVITY_TYPES = ["Run", "Ride", "Walk", "Hike", "Swim", "WeightTraining"]
+
+
+def get_random_activity_columns(num_activities: int, seed: int = 0) -> ActivityColumns:
+    """
+    Returns `num_activities` activities, roughly one a day ending today, with
+    a mix of types and a few missing values sprinkled in.
+    """
+    rng = np.random.default_rng(seed)
+
+    days_ago = np.sort(rng.integers(0, num_activities, num_activities))[::-1]
+    start_times = rng.integers(5 * 60 * 60, 21 * 60 * 60, num_activities)
+    start_date_local = (
+        np.datetime64("today", "D") - days_ago.astype("timedelta64[D]")
+    ).astype("datetime64[s]") + start_times.astype("timedelta64[s]")
+
+    moving_time = rng.uniform(10 * 60, 3 * 60 * 60, num_activities)
+    average_speed = rng.uniform(1.0, 10.0, num_activities)
+    average_heartrate = rng.uniform(100, 180, num_activities)
+    average_heartrate[rng.random(num_activities) < 0.2] = np.nan
+
+    return ActivityColumns.from_lists(
+        {
+            "id": list(range(1, num_activities + 1)),
+            "name": [f"Activity {i}" for i in range(num_activities)],
+            "type": list(rng.choice(ACTIVITY_TYPES, num_activities)),
+            "start_date": list(start_date_local),
+            "start_date_local": list(start_date_local),
+            "distance": list(moving_time * average_speed),
+            "moving_time": list(moving_time),
+            "total_elevation_gain": list(rng.uniform(0, 1000, num_activities)),
+            "average_speed": list(average_speed),
+            "average_heartrate": list(average_heartrate),
+            "max_heartrate": list(average_heartrate + 20),
+            "kudos_count": list(rng.integers(0, 30, num_activities)),
+            "athlete_count": list(rng.integers(1, 10, num_activities)),
+            "flagged": list(rng.random(num_activities) < 0.01),
+            "summary_polyline": [""] * num_activities,
+        }
+    )
+
+
+def get_random_encoded_polylines(num_polylines: int, seed: int = 0) -> list[str]:
+    """
+    Returns `num_polylines` encoded random walks of a few hundred points, each
+    a few kilometres long and starting somewhere around Melbourne.
+    """
+    rng = np.random.default_rng(seed)
+
+    encoded_polylines = []
+    for _ in range(num_polylines):
+        num_points = rng.integers(50, 400)
+        start = np.array([-37.8, 145.0]) + rng.uniform(-1, 1, 2)
+        steps = rng.uniform(-0.002, 0.002, (num_points, 2))
+        points = start + np.cumsum(steps, axis=0)
+        encoded_polylines.append(polyline.encode(points.tolist()))
+    return encoded_polylines
@@ -0,0 +1,101 @@
+"""
+Measures how long each animation format takes to save, and how many bytes it
+comes to, for the grid and overlay animations of a few hundred activities.
+
+"gif (rgb)" is how the animations used to be saved: full RGB frames, which
+Pillow has to quantise, with none of the frame differencing.
+
+Run it from the backend directory with:
+
+    python -m benchmarks.animation_formats
+"""
+
+import os
+import statistics
+import tempfile
+import time
+
+from backend.statistics.images import animation, polyline_grid, polyline_overlay
+from PIL.Image import Image
+
+from benchmarks.activities import get_random_encoded_polylines
+
+NUM_POLYLINES = 300
+NUM_REPEATS = 3
+
+
+def get_animations() -> dict[str, tuple[list[Image], float]]:
+    """
+    The frames of each animation, and how long each frame lasts in
+    milliseconds.
+    """
+    encoded_polylines = get_random_encoded_polylines(NUM_POLYLINES)
+    return {
+        "grid": (
+            polyline_grid.create_gif_image(
+                encoded_polylines,
+                polyline_grid.ANIMATION_DURATION_MS,
+                polyline_grid.ANIMATION_FPS,
+                polyline_grid.PROPOSED_IMAGE_SIZE,
+                polyline_grid.BORDER_SIZE_PX,
+                polyline_grid.LINE_THICKNESS,
+            ),
+            polyline_grid.ANIMATION_DURATION_MS / polyline_grid.ANIMATION_FPS,
+        ),
+        "overlay": (
+            polyline_overlay.create_gif_image(
+                encoded_polylines,
+                polyline_overlay.ANIMATION_DURATION_MS,
+                polyline_overlay.ANIMATION_FPS,
+            ),
+            polyline_overlay.ANIMATION_DURATION_MS / polyline_overlay.ANIMATION_FPS,
+        ),
+    }
+
+
+def save_rgb_gif(frames: list[Image], path: str, frame_duration_ms: float) -> str:
+    rgb_frames = [frame.convert("RGB") for frame in frames]
+    rgb_frames[0].save(
+        os.path.join(path, "rgb.gif"),
+        save_all=True,
+        append_images=rgb_frames[1:],
+        duration=frame_duration_ms,
+        loop=0,
+    )
+    return "rgb.gif"
+
+
+def measure(
+    frames: list[Image], frame_duration_ms: float, animation_format: str
+) -> tuple[int, float]:
+    """
+    Returns the size of the saved animation in bytes, and the median time taken
+    to save it, in seconds.
+    """
+    times = []
+    with tempfile.TemporaryDirectory() as path:
+        for _ in range(NUM_REPEATS):
+            start = time.perf_counter()
+            if animation_format == "gif (rgb)":
+                file_name = save_rgb_gif(frames, path, frame_duration_ms)
+            else:
+                file_name = animation.save_animation(
+                    frames, path, "animation", frame_duration_ms, animation_format
+                )
+            times.append(time.perf_counter() - start)
+        num_bytes = os.path.getsize(os.path.join(path, file_name))
+    return num_bytes, statistics.median(times)
+
+
+def main() -> None:
+    animations = get_animations()
+
+    print(f"{'animation':<12}{'format':<12}{'bytes':>12}{'save (s)':>10}")
+    for name, (frames, frame_duration_ms) in animations.items():
+        for animation_format in ["gif (rgb)", *animation.FORMATS]:
+            num_bytes, save_s = measure(frames, frame_duration_ms, animation_format)
+            print(f"{name:<12}{animation_format:<12}{num_bytes:>12,}{save_s:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Measures how many bytes the chart and table responses take on the wire with no
+compression, gzip and brotli, how long the server takes to send them, and
+roughly how long the whole request takes over a slow connection.
+
+The responses go through the real `CompressionMiddleware`, served by a test
+client, so the server times include building the response and compressing it,
+but not any network. Charts are served already encoded, like the tab routes
+serve them.
+
+Run it from the backend directory with:
+
+    python -m benchmarks.response_compression
+"""
+
+import json
+import os
+import statistics
+import time
+from typing import Any
+
+from backend.gui import tabs
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.utils.compression import CompressionMiddleware
+from backend.utils.json_encoding import EncodedJson, get_json_response
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from benchmarks.activities import get_random_activity_columns
+
+NUM_ACTIVITIES = 5000
+NUM_REPEATS = 10
+
+# A middling mobile connection, to turn bytes into time on the wire.
+MEGABITS_PER_SECOND = 10
+ROUND_TRIP_MS = 50
+
+ACCEPT_ENCODINGS = {"none": "identity", "gzip": "gzip", "brotli": "br"}
+
+
+def get_payloads() -> dict[str, Any]:
+    example_chart_path = os.path.join(
+        os.path.dirname(tabs.__file__),
+        "..",
+        "static",
+        "example_charts",
+        "personal_bests.json",
+    )
+    with open(example_chart_path) as f:
+        example_chart = json.load(f)
+
+    activities = ActivityFrame.from_columns(get_random_activity_columns(NUM_ACTIVITIES))
+    return {
+        "example chart": example_chart,
+        "pace timeline": EncodedJson(tabs.pace_timeline_tab.get_chart_json(activities)),
+        "cumulative distance": EncodedJson(
+            tabs.cumulative_distance_tab.get_chart_json(activities)
+        ),
+        "top 100 runs": tabs.top_100_longest_runs_tab.get_table_data(activities),
+    }
+
+
+def get_client(payloads: dict[str, Any]) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, paths=["/api/data/"])
+
+    for i, payload in enumerate(payloads.values()):
+        app.add_api_route(
+            f"/api/data/{i}",
+            lambda payload=payload: get_json_response({"tab_data": payload}),
+        )
+
+    return TestClient(app)
+
+
+def measure(client: TestClient, path: str, accept_encoding: str) -> tuple[int, float]:
+    """
+    Returns the number of bytes sent, and the median time taken to send them,
+    in milliseconds.
+    """
+    times = []
+    for _ in range(NUM_REPEATS):
+        start = time.perf_counter()
+        with client.stream(
+            "GET", path, headers={"Accept-Encoding": accept_encoding}
+        ) as response:
+            num_bytes = len(b"".join(response.iter_raw()))
+        times.append(time.perf_counter() - start)
+    return num_bytes, statistics.median(times) * 1000
+
+
+def main() -> None:
+    payloads = get_payloads()
+    client = get_client(payloads)
+
+    print(
+        f"{'payload':<22}{'encoding':<10}{'bytes':>12}{'ratio':>8}"
+        f"{'server (ms)':>13}{'total (ms)':>12}"
+    )
+    for i, name in enumerate(payloads):
+        uncompressed_bytes = None
+        for encoding_name, accept_encoding in ACCEPT_ENCODINGS.items():
+            num_bytes, server_ms = measure(client, f"/api/data/{i}", accept_encoding)
+            if uncompressed_bytes is None:
+                uncompressed_bytes = num_bytes
+
+            wire_ms = num_bytes * 8 / (MEGABITS_PER_SECOND * 1e6) * 1000
+            total_ms = server_ms + ROUND_TRIP_MS + wire_ms
+            print(
+                f"{name:<22}{encoding_name:<10}{num_bytes:>12,}"
+                f"{uncompressed_bytes / num_bytes:>8.1f}{server_ms:>13.2f}"
+                f"{total_ms:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares the cost per activity of the trivia processors when every tidbit sees
+every activity, against routing each activity to only the tidbits for its
+type, and against working the tidbits out from the whole frame at once.
+
+Run it from the backend directory with:
+
+    python -m benchmarks.trivia_dispatch
+"""
+
+import time
+
+from backend.statistics.trivia import TriviaProcessor
+from backend.statistics.trivia.min_max_summary_trivia import (
+    min_and_max_distance_trivia_processor,
+    min_and_max_elevation_trivia_processor,
+)
+from backend.statistics.trivia.summary_trivia import general_trivia
+from backend.statistics.utils.activity_frame import ActivityFrame
+from stravalib.model import SummaryActivity
+
+from benchmarks.activities import get_random_activity_columns
+
+NUM_ACTIVITIES = 5000
+NUM_REPEATS = 3
+
+PROCESSORS = {
+    "min/max distance": min_and_max_distance_trivia_processor,
+    "min/max elevation": min_and_max_elevation_trivia_processor,
+    "general": general_trivia,
+}
+
+
+def process_activity_with_every_tidbit(
+    processor: TriviaProcessor, activity: SummaryActivity
+) -> None:
+    """
+    How the processor used to work: every tidbit sees every activity, and has
+    to check the type and fields itself.
+    """
+    for tidbit in processor.tidbits:
+        activity_types = tidbit.get_activity_types()
+        if activity_types is not None and activity.type not in activity_types:
+            continue
+        if any(
+            getattr(activity, field, None) is None
+            for field in tidbit.get_required_fields()
+        ):
+            continue
+        tidbit.process_activity(activity)
+
+
+def time_per_activity_us(
+    processor: TriviaProcessor, activities: list[SummaryActivity], routed: bool
+) -> float:
+    best = float("inf")
+    for _ in range(NUM_REPEATS):
+        processor.reset()
+        start = time.perf_counter()
+        if routed:
+            for activity in activities:
+                processor.process_activity(activity)
+        else:
+            for activity in activities:
+                process_activity_with_every_tidbit(processor, activity)
+        best = min(best, time.perf_counter() - start)
+    return best / len(activities) * 1e6
+
+
+def frame_time_per_activity_us(
+    processor: TriviaProcessor, activities: ActivityFrame
+) -> float:
+    best = float("inf")
+    for _ in range(NUM_REPEATS):
+        start = time.perf_counter()
+        processor.get_data_from_frame(activities)
+        best = min(best, time.perf_counter() - start)
+    return best / len(activities) * 1e6
+
+
+def main() -> None:
+    frame = ActivityFrame.from_columns(get_random_activity_columns(NUM_ACTIVITIES))
+    activities = list(frame.iter_activities())
+
+    print(
+        f"{'processor':<20}{'tidbits':>8}{'every (us)':>12}{'routed (us)':>13}"
+        f"{'frame (us)':>12}"
+    )
+    for name, processor in PROCESSORS.items():
+        every = time_per_activity_us(processor, activities, routed=False)
+        routed = time_per_activity_us(processor, activities, routed=True)
+        whole_frame = frame_time_per_activity_us(processor, frame)
+        print(
+            f"{name:<20}{len(processor.tidbits):>8}{every:>12.2f}{routed:>13.2f}"
+            f"{whole_frame:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import datetime as dt
+
+import numpy as np
+from backend.utils.activity_columns import ActivityColumns
+from tests.factories.activity_factories import ActivityFactory
+
+
+def test_columns_roundtrip_through_bytes(some_basic_runs_and_rides) -> None:
+    columns = ActivityColumns.from_summary_activities(some_basic_runs_and_rides)
+    reloaded = ActivityColumns.from_bytes(columns.to_bytes())
+
+    assert len(reloaded) == 6
+    np.testing.assert_array_equal(reloaded.id, columns.id)
+    np.testing.assert_array_equal(reloaded.name, columns.name)
+    np.testing.assert_array_equal(reloaded.type, columns.type)
+    np.testing.assert_array_equal(reloaded.start_date_local, columns.start_date_local)
+    np.testing.assert_array_equal(reloaded.distance, columns.distance)
+    np.testing.assert_array_equal(reloaded.flagged, columns.flagged)
+
+
+def test_columns_roundtrip_polylines(activities_with_polylines) -> None:
+    columns = ActivityColumns.from_summary_activities(activities_with_polylines)
+    reloaded = ActivityColumns.from_bytes(columns.to_bytes())
+
+    assert (
+        reloaded.summary_polyline[0]
+        == activities_with_polylines[0].map.summary_polyline
+    )
+
+
+def test_missing_values_become_nan_and_nat() -> None:
+    activity = ActivityFactory(
+        type="Run", average_heartrate=None, kudos_count=None, start_date_local=None
+    )
+    columns = ActivityColumns.from_summary_activities([activity])
+
+    assert np.isnan(columns.average_heartrate[0])
+    assert np.isnan(columns.kudos_count[0])
+    assert np.isnat(columns.start_date_local[0])
+    assert columns.summary_polyline[0] == ""
+
+
+def test_start_date_local_keeps_wall_clock_time() -> None:
+    activity = ActivityFactory(
+        start_date_local=dt.datetime(2020, 1, 2, 6, 30, tzinfo=dt.timezone.utc)
+    )
+    columns = ActivityColumns.from_summary_activities([activity])
+
+    assert columns.start_date_local[0] == np.datetime64("2020-01-02T06:30:00")
+
+
+def test_empty_columns_roundtrip(no_activities_at_all) -> None:
+    columns = ActivityColumns.from_summary_activities(no_activities_at_all)
+    reloaded = ActivityColumns.from_bytes(columns.to_bytes())
+
+    assert len(reloaded) == 0
+
+
+def test_iter_summary_activities(some_basic_runs_and_rides) -> None:
+    columns = ActivityColumns.from_summary_activities(some_basic_runs_and_rides)
+
+    for original, rebuilt in zip(
+        some_basic_runs_and_rides, columns.iter_summary_activities()
+    ):
+        assert rebuilt.id == original.id
+        assert rebuilt.type == original.type
+        assert rebuilt.distance == original.distance
+        assert rebuilt.moving_time == original.moving_time
+        assert rebuilt.flagged == original.flagged
+        assert rebuilt.kudos_count is None
+        assert rebuilt.start_date == original.start_date.replace(microsecond=0)
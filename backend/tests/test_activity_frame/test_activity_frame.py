@@ -0,0 +1,49 @@
+import numpy as np
+from backend.statistics.utils.activity_frame import ActivityFrame
+from tests.factories.activity_factories import ActivityFactory
+
+
+def test_frame_has_typed_columns(some_basic_runs_and_rides) -> None:
+    frame = ActivityFrame.from_activities(some_basic_runs_and_rides)
+
+    assert len(frame) == 6
+    assert frame.df["type"].dtype == "category"
+    assert frame.df["distance"].dtype == np.float64
+    assert np.issubdtype(frame.df["start_date_local"].dtype, np.datetime64)
+    assert frame.get_activity_types() == ["Ride", "Run"]
+
+
+def test_frame_filters() -> None:
+    activities = [
+        ActivityFactory(type="Run", flagged=True, average_heartrate=150),
+        ActivityFactory(type="Run", flagged=False, average_heartrate=None),
+        ActivityFactory(type="Ride", flagged=False, average_heartrate=140),
+    ]
+    frame = ActivityFrame.from_activities(activities)
+
+    assert frame.of_type("Run").df["id"].to_list() == [
+        activities[0].id,
+        activities[1].id,
+    ]
+    assert frame.without_flagged().df["id"].to_list() == [
+        activities[1].id,
+        activities[2].id,
+    ]
+    assert frame.with_values("average_heartrate").df["id"].to_list() == [
+        activities[0].id,
+        activities[2].id,
+    ]
+    assert len(frame.of_type("Swim")) == 0
+
+
+def test_frame_iterates_activities(some_basic_runs_and_rides) -> None:
+    frame = ActivityFrame.from_activities(some_basic_runs_and_rides)
+    activities = list(frame.of_type("Ride").iter_activities())
+
+    assert [activity.id for activity in activities] == [
+        activity.id for activity in some_basic_runs_and_rides[3:]
+    ]
+    assert all(activity.type == "Ride" for activity in activities)
+    assert activities[0].start_date_local == some_basic_runs_and_rides[
+        3
+    ].start_date_local.replace(microsecond=0)
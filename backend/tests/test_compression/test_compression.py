@@ -0,0 +1,95 @@
+import gzip
+import json
+
+import brotli
+import pytest
+from backend.utils.compression import CompressionMiddleware, get_accepted_encoding
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+BIG_BODY = {"values": list(range(2000))}
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0.5, gzip;q=0.8", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_get_accepted_encoding(accept_encoding: str, expected: str | None) -> None:
+    assert get_accepted_encoding(accept_encoding) == expected
+
+
+def get_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, paths=["/api/data/"])
+
+    @app.get("/api/data/big")
+    def big() -> dict:
+        return BIG_BODY
+
+    @app.get("/api/data/small")
+    def small() -> dict:
+        return {"values": [1]}
+
+    @app.get("/api/data/etag")
+    def etag(response: Response) -> dict:
+        response.headers["ETag"] = '"abc"'
+        return BIG_BODY
+
+    @app.get("/api/other")
+    def other() -> dict:
+        return BIG_BODY
+
+    return TestClient(app)
+
+
+def test_responses_are_compressed_with_the_accepted_encoding() -> None:
+    client = get_client()
+
+    # The test client decodes gzip (but not brotli) itself, so read the raw
+    # bytes off the stream.
+    with client.stream(
+        "GET", "/api/data/big", headers={"Accept-Encoding": "br"}
+    ) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["Content-Encoding"] == "br"
+    assert response.headers["Content-Length"] == str(len(raw))
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(brotli.decompress(raw)) == BIG_BODY
+
+    with client.stream(
+        "GET", "/api/data/big", headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(raw)) == BIG_BODY
+
+    response = client.get("/api/data/big", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.json() == BIG_BODY
+
+
+def test_small_and_other_responses_are_left_alone() -> None:
+    client = get_client()
+
+    response = client.get("/api/data/small", headers={"Accept-Encoding": "br"})
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.json() == {"values": [1]}
+
+    response = client.get("/api/other", headers={"Accept-Encoding": "br"})
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+
+
+def test_compressed_responses_have_weak_etags() -> None:
+    response = get_client().get("/api/data/etag", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["ETag"] == 'W/"abc"'
@@ -219,3 +219,25 @@ def test_get_user_data_row_for_athlete():
     assert row.access_token == "a"
     assert row.refresh_token == "b"
     assert row.expires_at == 2
+
+
+@mock_aws
+def test_last_downloaded_time_roundtrip_without_status() -> None:
+    name = DOWNLOAD_STATUS_NAME
+    conn = boto3.client(
+        "dynamodb",
+        region_name="ap-southeast-2",
+        aws_access_key_id="ak",
+        aws_secret_access_key="sk",
+    )
+    conn.create_table(
+        TableName=name,
+        KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "athlete_id", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    save_download_status_to_dynamo(1, dt.datetime(2020, 1, 2))
+    assert get_last_downloaded_time_from_dynamo(1) == dt.datetime(2020, 1, 2)
+    assert get_download_status_from_dynamo(1) is None
@@ -0,0 +1,73 @@
+from moto import mock_aws
+import datetime as dt
+from typing import Any, Optional
+
+import boto3
+from backend import main
+from backend.utils.dynamodb import (
+    DOWNLOAD_STATUS_NAME,
+    get_last_downloaded_time_from_dynamo,
+    save_download_status_to_dynamo,
+)
+from backend.utils.s3 import BUCKET_NAME, save_summary_activities_to_s3
+from fastapi.testclient import TestClient
+
+
+def create_download_status_table_and_bucket() -> None:
+    region = "ap-southeast-2"
+    boto3.client("dynamodb", region_name=region).create_table(
+        TableName=DOWNLOAD_STATUS_NAME,
+        KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "athlete_id", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    boto3.client("s3", region_name=region).create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+
+@mock_aws
+def test_stale_data_is_refreshed_since_the_last_download(
+    some_basic_runs_and_rides, monkeypatch
+) -> None:
+    create_download_status_table_and_bucket()
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides)
+    last_download_time = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=10)
+    save_download_status_to_dynamo(123, last_download_time)
+
+    afters: list[Optional[dt.datetime]] = []
+
+    def iter_summary_activity_pages(
+        client: Any, after: Optional[dt.datetime] = None
+    ) -> Any:
+        afters.append(after)
+        return iter([[]])
+
+    monkeypatch.setattr(
+        main, "get_athlete_id_from_session_token", lambda session_token: 123
+    )
+    monkeypatch.setattr(main, "get_client_for_athlete", lambda athlete_id: None)
+    monkeypatch.setattr(
+        main, "iter_summary_activity_pages", iter_summary_activity_pages
+    )
+    monkeypatch.setattr(main, "precompute_tab_data", lambda athlete_id: None)
+
+    client = TestClient(main.app, cookies={"session_token": "token"})
+    response = client.get("/api/data_status")
+
+    assert response.status_code == 200
+    assert response.json()["stop_polling"]
+    # Only what's new since the last download is asked for.
+    assert afters == [
+        last_download_time.replace(microsecond=0) - main.INCREMENTAL_SYNC_OVERLAP
+    ]
+
+    # The download was recorded, so polling again doesn't start another one.
+    recorded_download_time = get_last_downloaded_time_from_dynamo(123)
+    assert recorded_download_time is not None
+    assert dt.datetime.now() - recorded_download_time < dt.timedelta(minutes=1)
+    client.get("/api/data_status")
+    assert len(afters) == 1
@@ -1,7 +1,14 @@
 from moto import mock_aws
 from backend.utils.s3 import (
     save_summary_activities_to_s3,
-    get_summary_activities_from_s3,
+    get_activity_columns_from_s3,
+    append_summary_activity_pages_to_s3,
+    is_there_any_data_for_athlete,
+    is_there_any_tab_data_for_athlete,
+    put_tab_object,
+    list_activity_shards,
+    save_summary_activity_pages_to_s3,
+    get_dataset_version,
 )
 import boto3
 from backend.utils.s3 import BUCKET_NAME
@@ -17,9 +24,180 @@ def test_saving_activity_roundtrip(some_basic_runs_and_rides) -> None:
     )
 
     save_summary_activities_to_s3(123, some_basic_runs_and_rides)
-    reloaded_activities = get_summary_activities_from_s3(123)
+    reloaded_columns = get_activity_columns_from_s3(123)
 
-    for fixture_activity, reloaded_activity in zip(
-        some_basic_runs_and_rides, reloaded_activities
-    ):
-        assert fixture_activity == reloaded_activity
+    assert len(reloaded_columns) == len(some_basic_runs_and_rides)
+    for i, fixture_activity in enumerate(some_basic_runs_and_rides):
+        assert reloaded_columns.id[i] == fixture_activity.id
+        assert reloaded_columns.name[i] == fixture_activity.name
+        assert reloaded_columns.type[i] == fixture_activity.type.root
+        assert reloaded_columns.distance[i] == fixture_activity.distance
+
+
+@mock_aws
+def test_appending_activities_replaces_duplicates(some_basic_runs_and_rides) -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides[:4])
+
+    # Re-download the last stored activity with some kudos, plus two new ones.
+    updated_activity = some_basic_runs_and_rides[3].model_copy(
+        update={"kudos_count": 7}
+    )
+    num_activities = append_summary_activity_pages_to_s3(
+        123, iter([[updated_activity], some_basic_runs_and_rides[4:]])
+    )
+    reloaded_columns = get_activity_columns_from_s3(123)
+
+    assert list(reloaded_columns.id) == [
+        activity.id for activity in some_basic_runs_and_rides
+    ]
+    assert reloaded_columns.kudos_count[3] == 7
+    assert num_activities == 3
+
+
+@mock_aws
+def test_saving_activities_replaces_all_shards(some_basic_runs_and_rides) -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides[:3])
+    append_summary_activity_pages_to_s3(123, iter([some_basic_runs_and_rides[3:]]))
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides[:1])
+
+    assert len(list_activity_shards(123)) == 1
+    assert len(get_activity_columns_from_s3(123)) == 1
+    assert is_there_any_data_for_athlete(123)
+    assert not is_there_any_data_for_athlete(456)
+
+
+@mock_aws
+def test_streaming_pages_into_shards(some_basic_runs_and_rides, monkeypatch) -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+    monkeypatch.setattr("backend.utils.s3.ACTIVITIES_PER_SHARD", 2)
+
+    pages = (
+        some_basic_runs_and_rides[i : i + 1]
+        for i in range(len(some_basic_runs_and_rides))
+    )
+    num_activities = save_summary_activity_pages_to_s3(123, pages)
+
+    assert num_activities == 6
+    assert len(list_activity_shards(123)) == 3
+    assert list(get_activity_columns_from_s3(123).id) == [
+        activity.id for activity in some_basic_runs_and_rides
+    ]
+
+
+@mock_aws
+def test_saving_no_activities_still_marks_athlete_as_downloaded() -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+    assert save_summary_activity_pages_to_s3(123, iter([])) == 0
+    assert is_there_any_data_for_athlete(123)
+    assert len(get_activity_columns_from_s3(123)) == 0
+
+
+@mock_aws
+def test_saving_activities_bumps_the_dataset_version(some_basic_runs_and_rides) -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+    assert get_dataset_version(123) is None
+
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides[:3])
+    first_version = get_dataset_version(123)
+    assert first_version is not None
+
+    append_summary_activity_pages_to_s3(123, iter([some_basic_runs_and_rides[3:]]))
+    second_version = get_dataset_version(123)
+    assert second_version not in (None, first_version)
+
+    # Appending nothing doesn't change anything.
+    append_summary_activity_pages_to_s3(123, iter([]))
+    assert get_dataset_version(123) == second_version
+
+
+@mock_aws
+def test_appending_no_activities_writes_nothing(some_basic_runs_and_rides) -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides)
+    shard_keys = [shard["Key"] for shard in list_activity_shards(123)]
+
+    # Strava can return an empty page, as well as no pages at all.
+    assert append_summary_activity_pages_to_s3(123, iter([[]])) == 0
+    assert [shard["Key"] for shard in list_activity_shards(123)] == shard_keys
+    assert len(get_activity_columns_from_s3(123)) == len(some_basic_runs_and_rides)
+
+
+@mock_aws
+def test_appending_merges_shards_once_there_are_too_many(
+    some_basic_runs_and_rides, monkeypatch
+) -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+    monkeypatch.setattr("backend.utils.s3.MAX_ACTIVITY_SHARDS", 3)
+
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides[:1])
+    for activity in some_basic_runs_and_rides[1:3]:
+        append_summary_activity_pages_to_s3(123, iter([[activity]]))
+    assert len(list_activity_shards(123)) == 3
+
+    # The fourth shard goes over the limit, so everything is merged.
+    append_summary_activity_pages_to_s3(123, iter([some_basic_runs_and_rides[3:]]))
+
+    assert len(list_activity_shards(123)) == 1
+    assert list(get_activity_columns_from_s3(123).id) == [
+        activity.id for activity in some_basic_runs_and_rides
+    ]
+
+
+@mock_aws
+def test_tab_data_is_only_there_once_a_tab_is_saved(some_basic_runs_and_rides) -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+    # Just having activities isn't having tab data.
+    save_summary_activities_to_s3(123, some_basic_runs_and_rides)
+    assert not is_there_any_tab_data_for_athlete(123)
+
+    put_tab_object(123, "some_tab", "data.json", "{}")
+    assert is_there_any_tab_data_for_athlete(123)
+    assert not is_there_any_tab_data_for_athlete(456)
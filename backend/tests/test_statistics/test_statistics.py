@@ -0,0 +1,514 @@
+import datetime as dt
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import polyline
+import pytest
+from backend.gui import tabs
+from backend.statistics.images import (
+    animation,
+    geometry,
+    polyline_grid,
+    polyline_overlay,
+    rendering,
+)
+from backend.statistics.plots import (
+    average_heartrate_by_average_speed,
+    cumulative_anything,
+    github_style_activities,
+    histogram_of_activity_time,
+    pace_timeline,
+)
+from backend.statistics.tables import top_hundred
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.statistics.utils.downsampling import get_density_bins, get_lttb_indices
+from backend.tabs.plot_tabs import PlotTab, PlotWindow
+from backend.tabs.table_tab import TableTab
+from PIL import Image
+from tests.factories.activity_factories import ActivityFactory
+
+
+@pytest.mark.parametrize(
+    "tab",
+    [
+        tabs.cumulative_time_tab,
+        tabs.cumulative_distance_tab,
+        tabs.cumulative_elevation_tab,
+        tabs.calendar_tab,
+        tabs.average_hr_by_average_speed_tab,
+        tabs.pace_timeline_tab,
+        tabs.histogram_of_activity_times_tab,
+    ],
+    ids=lambda tab: tab.get_key(),
+)
+def test_plots(tab: PlotTab, some_basic_runs_and_rides) -> None:
+    chart = json.loads(
+        tab.get_chart_json(ActivityFrame.from_activities(some_basic_runs_and_rides))
+    )
+
+    assert chart["data"]
+
+
+@pytest.mark.parametrize(
+    "tab",
+    [
+        tabs.min_and_max_distance_activities_tab,
+        tabs.min_and_max_elevation_activities_tab,
+        tabs.general_trivia_tab,
+        tabs.top_100_longest_runs_tab,
+        tabs.top_100_longest_rides_tab,
+    ],
+    ids=lambda tab: tab.get_key(),
+)
+def test_tables(tab: TableTab, some_basic_runs_and_rides) -> None:
+    table_data = tab.get_table_data(
+        ActivityFrame.from_activities(some_basic_runs_and_rides)
+    )
+
+    assert all(len(column) > 0 for column in table_data["table_data"].values())
+
+
+def test_cumulative_distance_is_in_km(some_basic_runs_and_rides) -> None:
+    runs = some_basic_runs_and_rides[:3]
+    for run in runs:
+        run.start_date_local = runs[0].start_date_local
+
+    chart = json.loads(
+        tabs.cumulative_distance_tab.get_chart_json(ActivityFrame.from_activities(runs))
+    )
+
+    assert chart["data"][0]["y"][-1] == pytest.approx(
+        sum(run.distance for run in runs) / 1000
+    )
+
+
+@pytest.mark.parametrize("module", [polyline_grid, polyline_overlay])
+def test_images(module, activities_with_polylines, tmp_path) -> None:
+    module.create_images(
+        ActivityFrame.from_activities(activities_with_polylines), tmp_path
+    )
+
+    with open(tmp_path / "captions.json") as f:
+        captions = json.load(f)
+    assert captions
+    assert all((tmp_path / image_name).exists() for image_name in captions)
+
+
+def render_geometry_sum(
+    geometry: np.ndarray, activity_type: str, artifact: str, path: str
+) -> dict[str, str]:
+    file_name = f"{activity_type}_{artifact}.txt"
+    with open(os.path.join(path, file_name), "w") as f:
+        f.write(str(geometry.sum()))
+    return {file_name: f"{artifact} of {activity_type}"}
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_render_all(max_workers, tmp_path) -> None:
+    geometries = {"Run": np.arange(10), "Ride": np.arange(5)}
+
+    captions = rendering.render_all(
+        render_geometry_sum, geometries, str(tmp_path), max_workers
+    )
+
+    # The captions are in the same order whether or not they're rendered in
+    # parallel.
+    assert list(captions) == [
+        "Run_image.txt",
+        "Run_animation.txt",
+        "Ride_image.txt",
+        "Ride_animation.txt",
+    ]
+    assert (tmp_path / "Run_animation.txt").read_text() == "45"
+    assert (tmp_path / "Ride_image.txt").read_text() == "10"
+
+
+def test_grid_animation_frames_match_full_renders(activities_with_polylines) -> None:
+    encoded_polylines = [
+        activity.map.summary_polyline for activity in activities_with_polylines
+    ] * 3
+
+    frames = polyline_grid.create_gif_image(
+        encoded_polylines, 1000, 10, proposed_image_size=200, line_thickness=2
+    )
+
+    assert len(frames) == 10
+    for frame_number in [1, 5, 10]:
+        image = polyline_grid.create_image(
+            encoded_polylines,
+            frame_number / 10,
+            proposed_image_size=200,
+            line_thickness=2,
+        )
+        assert frames[frame_number - 1].tobytes() == image.tobytes()
+
+
+def test_overlay_animation_frames_match_full_renders(
+    activities_with_polylines,
+) -> None:
+    encoded_polyline = activities_with_polylines[0].map.summary_polyline
+    # A second, shorter polyline, which finishes being drawn before the end.
+    encoded_polylines = [
+        encoded_polyline,
+        polyline.encode(polyline.decode(encoded_polyline)[:20]),
+    ]
+
+    frames = polyline_overlay.create_gif_image(encoded_polylines, 1000, 10)
+
+    assert len(frames) == 10
+    for frame_number in [1, 3, 10]:
+        image = polyline_overlay.create_image(
+            iter(encoded_polylines), 1000, frame_number / 10
+        )
+        assert frames[frame_number - 1].tobytes() == image.tobytes()
+
+
+@pytest.mark.parametrize("animation_format", animation.FORMATS)
+def test_saved_animations_have_every_frame(
+    animation_format, activities_with_polylines, tmp_path
+) -> None:
+    encoded_polylines = [
+        activity.map.summary_polyline for activity in activities_with_polylines
+    ] * 2
+    frames = polyline_grid.create_gif_image(
+        encoded_polylines, 1000, 10, proposed_image_size=200
+    )
+
+    file_name = animation.save_animation(
+        frames, str(tmp_path), "grid", 100, animation_format
+    )
+
+    assert file_name == f"grid.{animation.FILE_EXTENSIONS[animation_format]}"
+    with Image.open(tmp_path / file_name) as saved:
+        assert saved.n_frames == len(frames)
+        for i, frame in enumerate(frames):
+            saved.seek(i)
+            is_black = np.asarray(saved.convert("L")) < 128
+            assert (is_black == (np.asarray(frame) == animation.BLACK)).all()
+
+
+def test_decode_polylines_matches_polyline_package(activities_with_polylines) -> None:
+    encoded_polylines = [
+        activity.map.summary_polyline for activity in activities_with_polylines
+    ]
+    encoded_polylines += [None, "", polyline.encode([(-89.5, 179.5), (89.5, -179.5)])]
+
+    polylines = geometry.decode_polylines(encoded_polylines)
+
+    assert len(polylines) == len(encoded_polylines)
+    for i, encoded_polyline in enumerate(encoded_polylines):
+        expected = polyline.decode(encoded_polyline) if encoded_polyline else []
+        assert polylines[i].tolist() == [list(point) for point in expected]
+
+
+def test_decode_polylines_rejects_truncated_polylines() -> None:
+    encoded_polyline = polyline.encode([(-37.8, 145.0), (-37.81, 145.01)])
+
+    with pytest.raises(ValueError):
+        geometry.decode_polylines([encoded_polyline[:-1]])
+
+
+def test_scale_into_unit_squares_drops_polylines_without_any_size() -> None:
+    polylines = geometry.Polylines(
+        points=np.array([[0, 0], [2, 1], [4, 3], [1, 1], [1, 1]], dtype=float),
+        offsets=np.array([0, 3, 5]),
+    )
+
+    scaled = geometry.scale_into_unit_squares(polylines)
+
+    assert len(scaled) == 1
+    # The widest side is scaled to 1, with y flipped so the top is at 0.
+    assert scaled[0].tolist() == [[0, 0.75], [0.5, 0.5], [1, 0]]
+
+
+def test_cumulative_totals(some_basic_runs_and_rides) -> None:
+    for i, activity in enumerate(some_basic_runs_and_rides):
+        activity.start_date_local = dt.datetime(2010 + i % 2, 1, 1 + i)
+    activities = ActivityFrame.from_activities(some_basic_runs_and_rides)
+
+    totals = cumulative_anything.get_cumulative_totals(activities)
+
+    assert totals.activity_types == ["All", "Ride", "Run"]
+    assert totals.years.tolist() == [2010, 2011]
+    distances = totals.totals["distance"]
+    assert distances.shape == (3, 2, 366)
+    assert distances[0, :, -1].sum() == pytest.approx(
+        sum(activity.distance for activity in some_basic_runs_and_rides)
+    )
+    assert distances[2, :, -1].sum() == pytest.approx(
+        sum(activity.distance for activity in some_basic_runs_and_rides[:3])
+    )
+    # The first run is on the 1st of January 2010, and the next run in 2010 is
+    # on the 3rd.
+    assert distances[2, 0, 1] == pytest.approx(some_basic_runs_and_rides[0].distance)
+    assert not totals.has_data["kudos_count"].any()
+
+
+def test_cumulative_tabs_share_totals(some_basic_runs_and_rides, monkeypatch) -> None:
+    num_calculations = 0
+    get_cumulative_totals = cumulative_anything.get_cumulative_totals
+
+    def counting_get_cumulative_totals(*args, **kwargs):
+        nonlocal num_calculations
+        num_calculations += 1
+        return get_cumulative_totals(*args, **kwargs)
+
+    monkeypatch.setattr(
+        cumulative_anything, "get_cumulative_totals", counting_get_cumulative_totals
+    )
+    activities = ActivityFrame.from_activities(some_basic_runs_and_rides)
+    for tab in [
+        tabs.cumulative_time_tab,
+        tabs.cumulative_distance_tab,
+        tabs.cumulative_elevation_tab,
+        tabs.cumulative_kudos_tab,
+    ]:
+        tab.get_chart_json(activities)
+
+    assert num_calculations == 1
+
+
+def test_weighted_moving_averages() -> None:
+    datetimes = np.array(
+        ["2020-01-01T06:00", "2020-01-01T18:00", "2020-01-03", "2020-01-20"],
+        dtype="datetime64[s]",
+    )
+    values = np.array([1.0, 2.0, 4.0, 8.0])
+    weights = np.array([1.0, 3.0, 1.0, 1.0])
+
+    moving_averages = pace_timeline.generate_weighted_moving_averages(
+        datetimes, values, weights, [3, 90]
+    )
+
+    dates, three_day_averages = moving_averages[3]
+    # The 1st and 2nd both only see the two activities on the 1st, the 3rd and
+    # 4th only see the activity on the 3rd, and only one of the empty days
+    # after that is kept.
+    assert dates.tolist() == [dt.date(2020, 1, day) for day in [1, 2, 3, 4, 5, 19, 20]]
+    np.testing.assert_allclose(
+        three_day_averages, [1.75, 1.75 * 4 / 5 + 4 / 5, 4, 4, np.nan, 8, 8]
+    )
+
+    # Every day is within 45 days of every activity.
+    dates, ninety_day_averages = moving_averages[90]
+    assert len(dates) == 20
+    np.testing.assert_allclose(ninety_day_averages, 19 / 6)
+
+
+def test_top_k_indices() -> None:
+    values = np.array([3.0, np.nan, 7.0, 1.0, 7.0, 5.0])
+
+    assert top_hundred.get_top_k_indices(values, 3).tolist() == [2, 4, 5]
+    assert top_hundred.get_top_k_indices(values, 2, largest=False).tolist() == [3, 0]
+    assert top_hundred.get_top_k_indices(values, 10).tolist() == [2, 4, 5, 0, 3]
+
+
+def test_top_hundred_tables_share_one_pass(some_basic_runs_and_rides) -> None:
+    longest_runs = top_hundred.get_top_hundred_table_function(
+        "Run",
+        "distance",
+        "Distance (km)",
+        top_hundred.distance_conversion_function_to_km,
+    )
+    hilliest_activities = top_hundred.get_top_hundred_table_function(
+        None, "total_elevation_gain", "Elevation (m)", lambda x: x
+    )
+    activities = ActivityFrame.from_activities(some_basic_runs_and_rides)
+
+    runs_df = longest_runs(activities)
+    assert len(activities.shared_results) == 1
+    hilliest_df = hilliest_activities(activities)
+    assert len(activities.shared_results) == 1
+
+    runs = sorted(
+        some_basic_runs_and_rides[:3], key=lambda run: run.distance, reverse=True
+    )
+    assert runs_df["Rank"].to_list() == [1, 2, 3]
+    assert runs_df["Activity Name"].to_list() == [run.name for run in runs]
+    assert runs_df["Distance (km)"].to_list() == [
+        f"{run.distance / 1000:.2f}" for run in runs
+    ]
+    assert runs_df["Activity Link"][0].url.endswith(str(runs[0].id))
+    assert len(hilliest_df) == 6
+
+
+def test_time_of_day_counts() -> None:
+    activities = ActivityFrame.from_activities(
+        [
+            # Monday
+            ActivityFactory(type="Run", start_date_local=dt.datetime(2024, 1, 1, 6, 5)),
+            ActivityFactory(
+                type="Run", start_date_local=dt.datetime(2024, 1, 1, 6, 20)
+            ),
+            # Tuesday
+            ActivityFactory(
+                type="Run", start_date_local=dt.datetime(2024, 1, 2, 6, 14)
+            ),
+            ActivityFactory(
+                type="Ride", start_date_local=dt.datetime(2024, 1, 7, 23, 59)
+            ),
+        ]
+    )
+
+    counts = histogram_of_activity_time.get_time_of_day_counts(activities)
+
+    assert counts.activity_types == ["Ride", "Run"]
+    assert counts.counts.shape == (2, 7, 96)
+    assert counts.counts[1, 0, 24] == 1
+    assert counts.counts[1, 0, 25] == 1
+    assert counts.counts[1, 1, 24] == 1
+    assert counts.counts[0, 6, 95] == 1
+    assert counts.counts.sum() == 4
+
+    hourly_counts = counts.with_bin_width(60)
+    assert hourly_counts.counts.shape == (2, 7, 24)
+    assert hourly_counts.counts[1, 0, 6] == 2
+
+    fig = histogram_of_activity_time.plot(activities)
+    visible_bars = [bar for bar in fig.data if bar.visible]
+    assert [bar.name for bar in visible_bars] == ["Run", "Ride"]
+    assert visible_bars[0].y.sum() == 3
+
+
+def test_calendar_data() -> None:
+    activities = ActivityFrame.from_activities(
+        [
+            ActivityFactory(start_date_local=dt.datetime(2022, 3, 1, 6), distance=1000),
+            ActivityFactory(
+                start_date_local=dt.datetime(2022, 3, 1, 18), distance=None
+            ),
+            ActivityFactory(
+                start_date_local=dt.datetime(2023, 12, 31, 9), distance=500
+            ),
+        ]
+    )
+
+    counts = github_style_activities.get_calendar_data(
+        activities, github_style_activities.CALENDAR_VALUES["count"]
+    ).set_index("date")["num_activities"]
+    distances = github_style_activities.get_calendar_data(
+        activities, github_style_activities.CALENDAR_VALUES["distance"]
+    ).set_index("date")["distance_km"]
+
+    # Every day of both years.
+    assert len(counts) == 365 * 2
+    assert counts.index[0] == dt.datetime(2022, 1, 1)
+    assert counts.index[-1] == dt.datetime(2023, 12, 31)
+    assert counts[dt.datetime(2022, 3, 1)] == 2
+    assert counts[dt.datetime(2023, 12, 31)] == 1
+    assert counts.sum() == 3
+    assert distances[dt.datetime(2022, 3, 1)] == 1
+    assert distances[dt.datetime(2023, 12, 31)] == 0.5
+
+
+def test_lttb_indices() -> None:
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[500] = 10
+
+    indices = get_lttb_indices(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0
+    assert indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    # The spike is the most important point in its bucket.
+    assert 500 in indices
+    # Nothing to do if there aren't too many points.
+    assert list(get_lttb_indices(x[:50], y[:50], 100)) == list(range(50))
+
+
+def test_density_bins() -> None:
+    rng = np.random.default_rng(0)
+    x = pd.Series(rng.normal(150, 10, 1000))
+    y = pd.Series(rng.normal(5, 1, 1000))
+    y[0] = np.nan
+
+    density_bins = get_density_bins(x, y, num_bins=20)
+
+    assert density_bins.x.shape == (20,)
+    assert density_bins.counts.shape == (20, 20)
+    assert np.nansum(density_bins.counts) == 999
+    assert not np.any(density_bins.counts == 0)
+
+
+def get_lots_of_runs(n: int) -> ActivityFrame:
+    rng = np.random.default_rng(0)
+    return ActivityFrame.from_activities(
+        [
+            ActivityFactory(
+                type="Run",
+                start_date=dt.datetime(2020, 1, 1) + dt.timedelta(days=i),
+                start_date_local=dt.datetime(2020, 1, 1) + dt.timedelta(days=i),
+                average_speed=float(rng.uniform(2, 4)),
+                average_heartrate=float(rng.uniform(120, 180)),
+                moving_time=1800,
+                flagged=False,
+            )
+            for i in range(n)
+        ]
+    )
+
+
+def test_pace_timeline_downsampling() -> None:
+    activities = get_lots_of_runs(100)
+
+    fig = pace_timeline.plot(activities, max_points=20)
+    data_scatter = fig.data[0]
+    assert len(data_scatter.x) == 20
+    assert data_scatter.meta == {"activity_type": "Run", "downsampled": True}
+
+    window = PlotWindow("Run", "2020-01-11", "2020-02-09")
+    window_fig = pace_timeline.plot_window(activities, window, max_points=50)
+    assert len(window_fig.data) == 1
+    assert len(window_fig.data[0].x) == 30
+    assert window_fig.data[0].meta is None
+
+
+def test_average_heartrate_by_average_speed_downsampling() -> None:
+    activities = get_lots_of_runs(100)
+
+    fig = average_heartrate_by_average_speed.plot(activities, max_points=20)
+    assert isinstance(fig.data[0], go.Heatmap)
+    assert np.nansum(np.array(fig.data[0].z, dtype=np.float64)) == 100
+    assert fig.data[0].meta == {"activity_type": "Run", "downsampled": True}
+
+    window = PlotWindow("Run", "150", "160")
+    window_fig = average_heartrate_by_average_speed.plot_window(
+        activities, window, max_points=50
+    )
+    assert isinstance(window_fig.data[0], go.Scatter)
+    assert all(150 <= x <= 160 for x in window_fig.data[0].x)
+
+
+def test_average_heartrate_by_average_speed_skips_activities_without_a_pace() -> None:
+    activities = ActivityFrame.from_activities(
+        [
+            ActivityFactory(
+                type="Run",
+                start_date=dt.datetime(2020, 1, 1) + dt.timedelta(days=i),
+                start_date_local=dt.datetime(2020, 1, 1) + dt.timedelta(days=i),
+                average_speed=average_speed,
+                average_heartrate=150.0,
+                distance=1000.0 * (i + 1),
+                moving_time=1800,
+                flagged=False,
+            )
+            for i, average_speed in enumerate([3.0, 0.0, 3.5])
+        ]
+    )
+
+    scatter = average_heartrate_by_average_speed.plot(activities).data[0]
+
+    assert len(scatter.x) == 2
+    assert len(scatter.y) == 2
+    assert len(scatter.marker.size) == 2
+    assert len(scatter.marker.color) == 2
+    assert [distance for distance, _ in scatter.customdata] == [1.0, 3.0]
+    assert [pd.Timestamp(date) for _, date in scatter.customdata] == [
+        pd.Timestamp(2020, 1, 1),
+        pd.Timestamp(2020, 1, 3),
+    ]
@@ -0,0 +1,66 @@
+import threading
+
+from backend.utils.strava import (
+    ACTIVITIES_PER_PAGE,
+    iter_summary_activity_pages,
+)
+
+
+class FakeProtocol:
+    """
+    Pretends to be Strava's paginated activity list endpoint for an athlete
+    with `num_activities` activities.
+    """
+
+    def __init__(self, num_activities: int) -> None:
+        self.num_activities = num_activities
+        self.requested_pages: list[int] = []
+        self.lock = threading.Lock()
+
+    def get(self, url: str, check_for_errors: bool, page: int, per_page: int, **_):
+        with self.lock:
+            self.requested_pages.append(page)
+        first_id = (page - 1) * per_page
+        last_id = min(page * per_page, self.num_activities)
+        return [
+            {"id": activity_id, "name": f"Activity {activity_id}", "type": "Run"}
+            for activity_id in range(first_id, last_id)
+        ]
+
+
+class FakeClient:
+    def __init__(self, num_activities: int) -> None:
+        self.protocol = FakeProtocol(num_activities)
+
+
+def test_single_page_athlete_only_makes_one_request() -> None:
+    client = FakeClient(num_activities=5)
+    pages = list(iter_summary_activity_pages(client))  # type: ignore
+
+    assert [len(page) for page in pages] == [5]
+    assert client.protocol.requested_pages == [1]
+
+
+def test_no_activities() -> None:
+    client = FakeClient(num_activities=0)
+    assert list(iter_summary_activity_pages(client)) == []  # type: ignore
+
+
+def test_pages_are_returned_in_order() -> None:
+    num_activities = ACTIVITIES_PER_PAGE * 7 + 13
+    client = FakeClient(num_activities=num_activities)
+    pages = list(iter_summary_activity_pages(client, concurrency=3))  # type: ignore
+
+    ids = [activity.id for page in pages for activity in page]
+    assert ids == list(range(num_activities))
+
+    # We shouldn't request more than `concurrency` pages past the last one.
+    assert max(client.protocol.requested_pages) <= 8 + 3
+
+
+def test_exact_multiple_of_page_size() -> None:
+    num_activities = ACTIVITIES_PER_PAGE * 2
+    client = FakeClient(num_activities=num_activities)
+    pages = list(iter_summary_activity_pages(client, concurrency=2))  # type: ignore
+
+    assert [len(page) for page in pages] == [ACTIVITIES_PER_PAGE] * 2
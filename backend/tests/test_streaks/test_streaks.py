@@ -0,0 +1,77 @@
+import datetime as dt
+
+import numpy as np
+from backend.statistics.trivia.summary_trivia import (
+    MostConsecutiveDaysOfActivities,
+    MostConsecutiveWeeksOfActivities,
+)
+from backend.statistics.utils.streaks import (
+    Streak,
+    get_daily_and_weekly_streaks,
+    get_daily_streaks,
+    get_weekly_streaks,
+)
+
+
+def test_daily_streaks() -> None:
+    dates = np.array(
+        [
+            "2024-01-10T07:00",
+            "2024-01-01T10:00",
+            "2024-01-02T06:00",
+            "2024-01-02T18:00",
+            "NaT",
+            "2024-01-05T12:00",
+            "2024-01-06T12:00",
+            "2024-01-07T12:00",
+        ],
+        dtype="datetime64[s]",
+    )
+
+    streaks = get_daily_streaks(dates, today=dt.date(2024, 1, 11), top_n=2)
+
+    assert streaks.longest == Streak(dt.date(2024, 1, 5), dt.date(2024, 1, 7), 3)
+    assert streaks.top == [
+        Streak(dt.date(2024, 1, 5), dt.date(2024, 1, 7), 3),
+        Streak(dt.date(2024, 1, 1), dt.date(2024, 1, 2), 2),
+    ]
+    assert streaks.current == Streak(dt.date(2024, 1, 10), dt.date(2024, 1, 10), 1)
+
+    # A day without an activity breaks the current streak.
+    assert get_daily_streaks(dates, today=dt.date(2024, 1, 12)).current is None
+
+
+def test_weekly_streaks() -> None:
+    # Monday the 1st, Sunday the 14th and Monday the 15th are in three weeks in
+    # a row, then the week of the 22nd is missed.
+    dates = np.array(
+        ["2024-01-01", "2024-01-14", "2024-01-15", "2024-01-29"],
+        dtype="datetime64[D]",
+    )
+
+    streaks = get_weekly_streaks(dates, today=dt.date(2024, 2, 4))
+
+    assert streaks.longest == Streak(dt.date(2024, 1, 1), dt.date(2024, 1, 15), 3)
+    assert streaks.current == Streak(dt.date(2024, 1, 29), dt.date(2024, 1, 29), 1)
+
+
+def test_no_streaks() -> None:
+    daily, weekly = get_daily_and_weekly_streaks(np.array([], dtype="datetime64[s]"))
+
+    assert daily.longest is None and daily.current is None and daily.top == []
+    assert weekly.longest is None
+
+
+def test_streak_tidbits() -> None:
+    days = MostConsecutiveDaysOfActivities()
+    weeks = MostConsecutiveWeeksOfActivities()
+    for tidbit in [days, weeks]:
+        tidbit.dates = [
+            dt.date(2024, 1, 1),
+            dt.date(2024, 1, 2),
+            dt.date(2024, 1, 3),
+            dt.date(2024, 1, 9),
+        ]
+
+    assert days.get_tidbit() == "3 days (2024-01-01 to 2024-01-03)"
+    assert weeks.get_tidbit() == "2 weeks (2024-01-01 to 2024-01-14)"
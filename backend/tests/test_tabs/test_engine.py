@@ -0,0 +1,61 @@
+from typing import Any, Optional
+
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.tabs.engine import TabProcessingEngine
+from backend.tabs.tabs import Tab
+from backend.utils.environment_variables import evm
+
+
+class CountingTab(Tab):
+    """
+    A tab that looks at the whole frame of activities, and remembers how many
+    activities it was given.
+    """
+
+    def __init__(self, name: str, fail: bool = False) -> None:
+        super().__init__(name, detailed=False)
+        self.fail = fail
+        self.result: Optional[float] = None
+
+    def get_type(self) -> str:
+        return "test_tab"
+
+    def retrieve_frontend_data(self, evm: Any, athlete_id: int) -> Any:
+        return self.result
+
+    def backend_processing_hook(
+        self, activities: ActivityFrame, evm: Any, athlete_id: int
+    ) -> None:
+        if self.fail:
+            raise ValueError("Oh no")
+        self.result = len(activities)
+
+
+def test_engine_gives_every_tab_the_same_frame(some_basic_runs_and_rides) -> None:
+    frames: list[ActivityFrame] = []
+
+    class FrameRecordingTab(CountingTab):
+        def backend_processing_hook(
+            self, activities: ActivityFrame, evm: Any, athlete_id: int
+        ) -> None:
+            frames.append(activities)
+            super().backend_processing_hook(activities, evm, athlete_id)
+
+    frame = ActivityFrame.from_activities(some_basic_runs_and_rides)
+    counting_tabs = [FrameRecordingTab("Count 1"), FrameRecordingTab("Count 2")]
+    failures = TabProcessingEngine(counting_tabs).run(frame, evm, 123)
+
+    assert failures == {}
+    assert all(recorded is frame for recorded in frames)
+    assert [tab.result for tab in counting_tabs] == [6, 6]
+
+
+def test_engine_carries_on_after_a_tab_fails(some_basic_runs_and_rides) -> None:
+    failing_tab = CountingTab("Broken", fail=True)
+    working_tab = CountingTab("Working")
+    failures = TabProcessingEngine([failing_tab, working_tab]).run(
+        ActivityFrame.from_activities(some_basic_runs_and_rides), evm, 123
+    )
+
+    assert list(failures) == ["broken"]
+    assert working_tab.result == 6
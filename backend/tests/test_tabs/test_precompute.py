@@ -0,0 +1,63 @@
+import json
+
+import boto3
+import plotly.graph_objects as go
+from backend.statistics.tables.flagged_activities import flagged_activities_table
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.tabs.plot_tabs import PlotTab
+from backend.tabs.table_tab import TableTab
+from backend.utils.environment_variables import evm
+from backend.utils.s3 import BUCKET_NAME
+from moto import mock_aws
+from tests.factories.activity_factories import ActivityFactory
+
+
+def create_bucket() -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+
+@mock_aws
+def test_table_tab_precompute_roundtrip() -> None:
+    create_bucket()
+    activities = [
+        ActivityFactory(type="Run", flagged=True, name="Suspicious Run"),
+        ActivityFactory(type="Run", flagged=False),
+    ]
+    frame = ActivityFrame.from_activities(activities)
+
+    tab = TableTab(
+        name="Flagged Activities",
+        detailed=False,
+        description="",
+        table_function=flagged_activities_table,
+    )
+    tab.backend_processing_hook(frame, evm, 123)
+    table_data = json.loads(tab.retrieve_frontend_data(evm, 123).data)
+
+    assert table_data["table_data"]["Activity Names"] == ["Suspicious Run"]
+    assert table_data["table_data"]["Activity Links"] == [
+        {
+            "url": f"https://www.strava.com/activities/{activities[0].id}",
+            "text": "View on Strava",
+        }
+    ]
+
+
+@mock_aws
+def test_plot_tab_precompute_roundtrip(some_basic_runs_and_rides) -> None:
+    create_bucket()
+    frame = ActivityFrame.from_activities(some_basic_runs_and_rides)
+
+    def plot(activities: ActivityFrame) -> go.Figure:
+        return go.Figure(data=[go.Bar(y=[len(activities)])])
+
+    tab = PlotTab(name="Count", detailed=False, description="", plot_function=plot)
+    tab.backend_processing_hook(frame, evm, 123)
+    chart = json.loads(tab.retrieve_frontend_data(evm, 123).data)
+
+    assert chart["data"][0]["y"] == [6]
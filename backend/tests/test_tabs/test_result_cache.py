@@ -0,0 +1,152 @@
+import json
+from typing import Any
+
+import boto3
+import plotly.graph_objects as go
+from backend.tabs import tabs
+from backend.statistics.utils.activity_frame import ActivityFrame
+from backend.tabs.plot_tabs import PlotTab
+from backend.tabs.result_cache import TabResultCache
+from backend.utils.environment_variables import evm
+from backend.utils.s3 import BUCKET_NAME, get_dataset_version, put_dataset_version
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from moto import mock_aws
+
+
+def create_bucket() -> None:
+    region = "ap-southeast-2"
+    s3_client = boto3.client("s3", region_name=region)
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": region},
+    )
+
+
+class CountingCompute:
+    def __init__(self) -> None:
+        self.num_calls = 0
+
+    def __call__(self) -> bytes:
+        self.num_calls += 1
+        return str(self.num_calls).encode()
+
+
+@mock_aws
+def test_results_are_only_computed_once_per_version() -> None:
+    create_bucket()
+    compute = CountingCompute()
+    cache = TabResultCache()
+
+    assert cache.get_or_compute(123, "tab", "1", compute) == b"1"
+    assert cache.get_or_compute(123, "tab", "1", compute) == b"1"
+
+    # A cold Lambda reads the result back from S3.
+    assert TabResultCache().get_or_compute(123, "tab", "1", compute) == b"1"
+    assert compute.num_calls == 1
+
+    # New data means a new result, in both tiers.
+    assert cache.get_or_compute(123, "tab", "2", compute) == b"2"
+    assert TabResultCache().get_or_compute(123, "tab", "2", compute) == b"2"
+    assert compute.num_calls == 2
+
+
+@mock_aws
+def test_least_recently_used_results_are_dropped_from_memory() -> None:
+    create_bucket()
+    cache = TabResultCache(max_results=2)
+
+    for tab_key in ["a", "b", "a", "c"]:
+        cache.get_or_compute(123, tab_key, "1", lambda: tab_key.encode())
+
+    assert cache.get_from_memory(123, "a", "1") == b"a"
+    assert cache.get_from_memory(123, "b", "1") is None
+    assert cache.get_from_memory(123, "c", "1") == b"c"
+
+    cache.invalidate(123)
+    assert not cache.results
+
+
+@mock_aws
+def test_tab_data_is_cached_until_new_data_is_saved(some_basic_runs_and_rides) -> None:
+    create_bucket()
+    frame = ActivityFrame.from_activities(some_basic_runs_and_rides)
+    num_plots = 0
+
+    def plot(activities: ActivityFrame) -> go.Figure:
+        nonlocal num_plots
+        num_plots += 1
+        return go.Figure(data=[go.Bar(y=[num_plots])])
+
+    tab = PlotTab(name="Count", detailed=False, description="", plot_function=plot)
+    put_dataset_version(123)
+    tab.backend_processing_hook(frame, evm, 123)
+
+    first = tab.get_encoded_frontend_data(evm, 123, get_dataset_version(123))
+    tab.backend_processing_hook(frame, evm, 123)
+    assert tab.get_encoded_frontend_data(evm, 123, get_dataset_version(123)) == first
+
+    put_dataset_version(123)
+    chart = json.loads(
+        tab.get_encoded_frontend_data(evm, 123, get_dataset_version(123))
+    )
+    assert chart["data"][0]["y"] == [2]
+
+
+@mock_aws
+def test_tab_route_answers_if_none_match_with_304(
+    some_basic_runs_and_rides, monkeypatch
+) -> None:
+    create_bucket()
+    monkeypatch.setattr(
+        tabs, "get_athlete_id_from_session_token", lambda session_token: 123
+    )
+    frame = ActivityFrame.from_activities(some_basic_runs_and_rides)
+
+    tab = PlotTab(
+        name="Count",
+        detailed=False,
+        description="",
+        plot_function=lambda activities: go.Figure(data=[go.Bar(y=[1])]),
+    )
+    put_dataset_version(123)
+    tab.backend_processing_hook(frame, evm, 123)
+
+    app = FastAPI()
+    tab.generate_and_register_route(app, evm)
+    client = TestClient(app, cookies={"session_token": "token"})
+
+    response = client.get("/api/data/count")
+    assert response.status_code == 200
+    assert response.json()["status"] == "Success"
+    etag = response.headers["ETag"]
+
+    # Nothing is loaded when the browser already has this version.
+    def fail(*args: Any) -> None:
+        raise AssertionError("Shouldn't load the tab's data.")
+
+    monkeypatch.setattr(tab, "get_encoded_frontend_data", fail)
+    response = client.get("/api/data/count", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+
+    # New data means a new ETag.
+    monkeypatch.undo()
+    monkeypatch.setattr(
+        tabs, "get_athlete_id_from_session_token", lambda session_token: 123
+    )
+    put_dataset_version(123)
+    response = client.get("/api/data/count", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_etag_matches() -> None:
+    etag = tabs.get_etag(123, "count", "1")
+
+    assert tabs.etag_matches(etag, etag)
+    assert tabs.etag_matches(f'"other", W/{etag}', etag)
+    assert tabs.etag_matches("*", etag)
+    assert not tabs.etag_matches(None, etag)
+    assert not tabs.etag_matches(tabs.get_etag(456, "count", "1"), etag)
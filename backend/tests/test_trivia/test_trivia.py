@@ -0,0 +1,159 @@
+import datetime as dt
+from typing import Optional, Sequence
+
+import pytest
+from backend.statistics.trivia import (
+    TriviaProcessor,
+    TriviaReduction,
+    TriviaTidbitBase,
+)
+from backend.statistics.trivia.min_max_summary_trivia import (
+    MaxAttributeTidbit,
+    MinAttributeTidbit,
+    min_and_max_distance_trivia_processor,
+    min_and_max_elevation_trivia_processor,
+)
+from backend.statistics.trivia.summary_trivia import (
+    EarliestActivityTidbit,
+    TotalKudosRecievedTidbit,
+    general_trivia,
+)
+from backend.statistics.trivia.trivia import get_reduction_results
+from backend.statistics.utils.activity_frame import ActivityFrame
+from stravalib.model import DetailedActivity
+from tests.factories.activity_factories import ActivityFactory
+
+
+class SeenActivitiesTidbit(TriviaTidbitBase):
+    def __init__(
+        self, activity_types: Optional[list[str]], required_fields: list[str]
+    ) -> None:
+        self.activity_types = activity_types
+        self.required_fields = required_fields
+        self.seen_ids: list[int] = []
+
+    def reset_tidbit(self) -> None:
+        self.seen_ids = []
+
+    def get_activity_types(self) -> Optional[Sequence[str]]:
+        return self.activity_types
+
+    def get_required_fields(self) -> Sequence[str]:
+        return self.required_fields
+
+    def process_activity(self, activity: DetailedActivity) -> None:
+        self.seen_ids.append(activity.id)
+
+    def get_tidbit(self) -> Optional[str]:
+        return f"{len(self.seen_ids)}"
+
+    def get_description(self) -> str:
+        return "Seen Activities"
+
+
+def test_activities_are_only_routed_to_relevant_tidbits() -> None:
+    activities = [
+        ActivityFactory(type="Run", average_heartrate=150),
+        ActivityFactory(type="Run", average_heartrate=None),
+        ActivityFactory(type="Ride", average_heartrate=140),
+        ActivityFactory(type="Swim", average_heartrate=None),
+    ]
+    every_activity = SeenActivitiesTidbit(None, [])
+    runs = SeenActivitiesTidbit(["Run"], [])
+    rides_and_runs_with_heartrate = SeenActivitiesTidbit(
+        ["Run", "Ride"], ["average_heartrate"]
+    )
+    with_heartrate = SeenActivitiesTidbit(None, ["average_heartrate"])
+
+    processor = TriviaProcessor()
+    for tidbit in [every_activity, runs, rides_and_runs_with_heartrate, with_heartrate]:
+        processor.register_tidbit(tidbit)
+    processor.get_data(ActivityFrame.from_activities(activities).iter_activities())
+
+    ids = [activity.id for activity in activities]
+    assert every_activity.seen_ids == ids
+    assert runs.seen_ids == ids[:2]
+    assert rides_and_runs_with_heartrate.seen_ids == [ids[0], ids[2]]
+    assert with_heartrate.seen_ids == [ids[0], ids[2]]
+
+
+def test_min_max_tidbits_only_see_their_activity_type() -> None:
+    activities = [
+        ActivityFactory(type="Run", distance=5000),
+        ActivityFactory(type="Run", distance=10000),
+        ActivityFactory(type="Run", distance=None),
+        ActivityFactory(type="Ride", distance=40000),
+        ActivityFactory(type="Ride", distance=1000),
+    ]
+    processor = TriviaProcessor()
+    processor.register_tidbit(MinAttributeTidbit("Run", "distance"))
+    processor.register_tidbit(MaxAttributeTidbit("Run", "distance"))
+    processor.register_tidbit(MaxAttributeTidbit("Swim", "distance"))
+
+    trivia = processor.get_data(
+        ActivityFrame.from_activities(activities).iter_activities()
+    )
+
+    assert [(description, tidbit) for description, tidbit, _ in trivia] == [
+        ("Run with Minimum Distance", "5000 meters"),
+        ("Run with Maximum Distance", "10000 meters"),
+    ]
+    assert trivia[1][2].url.endswith(str(activities[1].id))
+
+
+@pytest.mark.parametrize(
+    "trivia_processor",
+    [
+        min_and_max_distance_trivia_processor,
+        min_and_max_elevation_trivia_processor,
+        general_trivia,
+    ],
+)
+def test_frame_trivia_matches_activity_trivia(trivia_processor) -> None:
+    activities = [
+        ActivityFactory(type="Run"),
+        ActivityFactory(type="Run", distance=None, kudos_count=None),
+        ActivityFactory(type="Ride"),
+        ActivityFactory(type="Workout", distance=0, total_elevation_gain=0),
+        ActivityFactory(type="Swim", average_heartrate=None, max_heartrate=None),
+    ]
+    frame = ActivityFrame.from_activities(activities)
+
+    def get_comparable(trivia):
+        return [
+            (description, tidbit, link.url if link else None)
+            for description, tidbit, link in trivia
+        ]
+
+    assert get_comparable(
+        trivia_processor.get_data_from_frame(frame)
+    ) == get_comparable(trivia_processor.get_data(frame.iter_activities()))
+
+
+def test_frame_trivia_reductions() -> None:
+    activities = [
+        ActivityFactory(kudos_count=3, start_date_local=dt.datetime(2024, 1, 1, 6, 30)),
+        ActivityFactory(
+            kudos_count=None, start_date_local=dt.datetime(2024, 1, 2, 6, 30)
+        ),
+        ActivityFactory(kudos_count=4, start_date_local=dt.datetime(2024, 1, 3, 8, 0)),
+    ]
+    processor = TriviaProcessor()
+    processor.register_tidbit(EarliestActivityTidbit())
+    processor.register_tidbit(TotalKudosRecievedTidbit())
+
+    trivia = processor.get_data_from_frame(ActivityFrame.from_activities(activities))
+
+    assert [(description, tidbit) for description, tidbit, _ in trivia] == [
+        ("Earliest Activity", "06:30:00"),
+        ("Total Kudos Recieved", "7"),
+    ]
+    # Ties go to the later activity.
+    assert trivia[0][2].url.endswith(str(activities[1].id))
+
+
+def test_reducing_over_an_unknown_column_raises() -> None:
+    activities = ActivityFrame.from_activities([ActivityFactory()])
+
+    with pytest.raises(ValueError, match="average_temp"):
+        get_reduction_results(activities, [TriviaReduction("average_temp", "max")])
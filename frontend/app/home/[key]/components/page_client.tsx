@@ -46,20 +46,7 @@ function PageContentComponent({ params, data }: { params: { key: string }; data:
     console.log(params);
     console.log(data);
     if (data.type == "PlotTab") {
-        return (
-            <Plot
-                className="grow"
-                data={data.tab_data.data}
-                layout={data.tab_data.layout}
-                config={{
-                    responsive: false,
-                    displayModeBar: false,
-                    displaylogo: false,
-                    showTips: true,
-                }}
-                useResizeHandler
-            />
-        );
+        return <PlotTabContent tabKey={params.key} tabData={data.tab_data} />;
     }
 
     if (data.type == "TriviaTab" || data.type == "TableTab") {
@@ -87,6 +74,82 @@ function PageContentComponent({ params, data }: { params: { key: string }; data:
     );
 }
 
+/*
+Plots with lots of points are downsampled by the backend, and those traces are
+marked with `meta.downsampled`. When the plot is zoomed in, they're swapped for
+every point in the zoomed in window, and swapped back when it's zoomed out.
+*/
+function PlotTabContent({ tabKey, tabData }: { tabKey: string; tabData: any }) {
+    const [traces, setTraces] = useState<any[]>(tabData.data);
+    const router = useRouter();
+
+    useEffect(() => {
+        setTraces(tabData.data);
+    }, [tabData]);
+
+    function onRelayout(event: any) {
+        if (event["xaxis.autorange"]) {
+            // Plotly changes the visibility of the traces it's given in place,
+            // so keep whatever is currently shown.
+            setTraces((current) =>
+                tabData.data.map((trace: any, i: number) => ({ ...trace, visible: current[i].visible }))
+            );
+            return;
+        }
+
+        const xMin = event["xaxis.range[0]"];
+        const xMax = event["xaxis.range[1]"];
+        if (xMin === undefined || xMax === undefined) {
+            return;
+        }
+
+        tabData.data.forEach((trace: any, i: number) => {
+            if (!trace.meta?.downsampled || traces[i].visible === false) {
+                return;
+            }
+            const query = new URLSearchParams({
+                activity_type: trace.meta.activity_type,
+                x_min: String(xMin),
+                x_max: String(xMax),
+            });
+            wrappedFetch(
+                `/api/data/${tabKey}/window?${query}`,
+                (data) => {
+                    if (data.status != "Success") {
+                        return;
+                    }
+                    setTraces((current) =>
+                        current.map((currentTrace, j) =>
+                            j == i
+                                ? { ...data.tab_data.data[0], name: currentTrace.name, visible: currentTrace.visible }
+                                : currentTrace
+                        )
+                    );
+                },
+                // Just leave the downsampled trace there if this fails.
+                () => {},
+                router
+            );
+        });
+    }
+
+    return (
+        <Plot
+            className="grow"
+            data={traces}
+            layout={tabData.layout}
+            config={{
+                responsive: false,
+                displayModeBar: false,
+                displaylogo: false,
+                showTips: true,
+            }}
+            onRelayout={onRelayout}
+            useResizeHandler
+        />
+    );
+}
+
 function Error() {
     return (
         <div className="h-full items-center text-center max-w-1/2 pt-[33vh]">